@@ -1,107 +1,217 @@
-import pdfplumber
 import re
 # from PyPDF2 import PdfReader  # noqa: F401
 import os
-import queue
-from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn
-from rich.console import Console
 import glob
+import itertools
+from collections import namedtuple
+from utils.pdf_session import session_for
+from utils.text_backends import get_backend
+from utils.progress import ProgressBoard
+from utils.toc_quality import FILTER_MAX_TOC_LINES, text_quality
+from utils.extracted_text import write_extracted_text, head_lines
+from utils.toc_anchor import TOC_PHRASES, best_anchor, qualifies
+from utils.toc_locator import locate_toc_pages
+from utils.metrics import MetricsRecorder, line_count
+from utils.final_manifest import replacing
+
+# Only the first TOC_LINE_BUDGET lines of a document are ever searched for its TOC
+TOC_LINE_BUDGET = 700
+
+# Result of extract_text_from_pdf; it unpacks like the old (success, filename) plus page counts
+# and the StageMetrics of the extraction
+ExtractionResult = namedtuple('ExtractionResult', ['success', 'filename', 'pages_extracted', 'total_pages', 'metrics'])
+# Result of extract_toc_pages: the texts of the pages extracted, from 0-based page first_page on
+ExtractedPages = namedtuple('ExtractedPages', ['texts', 'first_page', 'pages_extracted', 'total_pages'])
+
+class TOCScanner:
+    """
+    Collects page texts for extract_toc_entries and tells the extractor when more pages
+    can no longer change its result or Filter_from_2nd_method_1's: either the line budget
+    is reached, or the TOC anchor is final (see utils.toc_anchor) and the parse that started
+    there has ended and found more entries than the filter would re-read.
+    """
+
+    def __init__(self, line_budget=TOC_LINE_BUDGET):
+        self.line_budget = line_budget
+        self.text_chunks = []
+        # Lines of the pages joined by newlines, kept up to date page by page: the lines ended
+        # by a line break, and the partial last line
+        self.complete_lines = 0
+        self.partial_line = ''
+
+    @property
+    def line_count(self):
+        """len(text.splitlines()) of the pages fed so far, joined by newlines."""
+        return self.complete_lines + bool(self.partial_line)
+
+    def _count_lines(self, page_text):
+        joined = '\n' + page_text if self.text_chunks else page_text
+        parts = (self.partial_line + joined).splitlines(keepends=True)
+        self.partial_line = ''
+        # A trailing '\r' still pairs with the newline joining the next page, so it stays partial
+        if parts and (parts[-1].endswith('\r') or parts[-1].splitlines() == [parts[-1]]):
+            self.partial_line = parts.pop()
+        self.complete_lines += len(parts)
+
+    def feed(self, page_text):
+        """Add the text of the next page; returns True once extraction can stop."""
+        self._count_lines(page_text)
+        self.text_chunks.append(page_text)
+        if self.line_count >= self.line_budget:
+            return True
+
+        # Parse the text the way process_txt_files_in_directory will read it back
+        text = '\n'.join('\n'.join(self.text_chunks).splitlines())
+        # Only a qualifying anchor is final: a later page cannot add an earlier one
+        anchor = best_anchor(text)
+        if anchor is None or not qualifies(anchor):
+            return False
+        toc_entries, parse_finished = _parse_toc_entries(text, anchor)
+        return parse_finished and len(toc_entries) > FILTER_MAX_TOC_LINES
+
+def extract_pages(pdf_file, lazy=False, engine="pdfplumber", on_progress=None, pages=None):
+    """
+    Extract the text of a PDF (a path or an open PDFSession) page by page with the given
+    text backend ("pdfplumber" or "fitz"); only the given 0-based page numbers when pages is set.
+    With lazy=True a TOCScanner stops the extraction as soon as the remaining pages cannot
+    change the TOC. on_progress(pages_extracted, pages_to_extract) is called after every page.
+    Returns (page_texts, pages_extracted, total_pages), total_pages being the document's.
+    """
+    backend = get_backend(engine)
+    # Without lazy the scanner's answer is never used, so the pages are only collected
+    scanner = TOCScanner() if lazy else None
+    page_texts = []
+    with session_for(pdf_file) as session:
+        total_pages = backend.page_count(session)
+        pages_to_extract = total_pages if pages is None else len(pages)
+
+        for text in backend.page_texts(session, pages):
+            page_texts.append(text)
+            done = scanner.feed(text) if scanner else False
+
+            if on_progress:
+                on_progress(len(page_texts), pages_to_extract)
+
+            if done:
+                break
+    return page_texts, len(page_texts), total_pages
 
-def extract_text_from_pdf(pdf_file, extracted_output_folder, progress_queue):
+def extract_toc_pages(pdf_file, lazy=False, engine="pdfplumber", on_progress=None, locate=False):
+    """
+    extract_pages for the text fallback. With locate=True only the TOC pages found by
+    utils.toc_locator on the fitz document are extracted; the whole document is extracted as
+    before when it finds none, or when their text has no TOC title. Returns ExtractedPages.
+    """
+    with session_for(pdf_file) as session:
+        toc_pages = locate_toc_pages(session.doc) if locate else None
+        if toc_pages is not None:
+            first, last = toc_pages
+            texts, pages_extracted, total_pages = extract_pages(session, lazy, engine, on_progress,
+                                                                pages=range(first, last + 1))
+            if best_anchor('\n'.join(texts)) is not None:
+                return ExtractedPages(texts, first, pages_extracted, total_pages)
+        texts, pages_extracted, total_pages = extract_pages(session, lazy, engine, on_progress)
+        return ExtractedPages(texts, 0, pages_extracted, total_pages)
+
+def extract_text_from_pdf(pdf_file, extracted_output_folder, progress=None, lazy=False, engine="pdfplumber", locate=False):
+    """
+    Extract the text of a PDF with extract_toc_pages and save it to extracted_output_folder.
+    progress is an optional utils.progress.ProgressSlot the page counts are written to.
+    Returns an ExtractionResult.
+    """
+    pdf_filename = os.path.basename(getattr(pdf_file, 'pdf_path', pdf_file))
+    filename = os.path.splitext(pdf_filename)[0]
+    metrics = MetricsRecorder(pdf_filename)
+    pages_extracted = total_pages = 0
     try:
-        filename = os.path.splitext(os.path.basename(pdf_file))[0]
-        text_output_path = os.path.join(extracted_output_folder, f'{filename}.txt')
-        
-        # Initialize variables for progress tracking
-        progress_queue.put(('start', filename))
+        with metrics.stage('extract_text_from_pdf') as counters:
+            text_output_path = os.path.join(extracted_output_folder, f'{filename}.txt')
+
+            if progress:
+                progress.start()
+
+            text_chunks, first_page, pages_extracted, total_pages = extract_toc_pages(
+                pdf_file, lazy, engine,
+                on_progress=progress.update if progress else None,
+                locate=locate
+            )
+            counters.pages = pages_extracted
+            counters.lines = line_count('\n'.join(text_chunks))
+
+            # Write all text at once, with its page index for bounded reads
+            write_extracted_text(text_output_path, text_chunks, first_page)
         
-        text_chunks = []
-        with pdfplumber.open(pdf_file) as pdf:
-            total_pages = len(pdf.pages)
-            
-            # Process pages in batches for better performance
-            batch_size = 5  # Adjust batch size based on your needs
-            for batch_start in range(0, total_pages, batch_size):
-                batch_end = min(batch_start + batch_size, total_pages)
-                batch_pages = pdf.pages[batch_start:batch_end]
-                
-                # Process batch of pages
-                batch_texts = []
-                for page in batch_pages:
-                    # Optimize text extraction settings
-                    text = page.extract_text(x_tolerance=3, y_tolerance=3)
-                    batch_texts.append(text)
-                
-                text_chunks.extend(batch_texts)
-                
-                # Report progress
-                progress = (batch_end / total_pages) * 100
-                progress_queue.put(('progress', filename, progress))
+        if progress:
+            progress.finish(pages_done=pages_extracted)
+        return ExtractionResult(True, filename, pages_extracted, total_pages, metrics.records)
         
-        # Write all text at once
-        with open(text_output_path, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(text_chunks))
-        
-        progress_queue.put(('complete', filename))
-        return True, filename
-        
-    except Exception as e:
-        progress_queue.put(('error', filename, str(e)))
-        return False, filename
-
-def progress_monitor(progress_queue, total_pdfs):
-    console = Console()
-
-    with Progress(
-        TextColumn("[progress.description]{task.description}"),
-        BarColumn(),
-        TaskProgressColumn(),
-        TimeRemainingColumn(),
-        expand=True,
-        console=console
-    ) as progress:
-        # Initialize progress bars
-        tasks = {}
-        completed = set()
-        errors = set()
-
-        while len(completed) + len(errors) < total_pdfs:
-            try:
-                msg = progress_queue.get(timeout=1)
-                msg_type = msg[0]
-                filename = msg[1]
-
-                if msg_type == 'start':
-                    tasks[filename] = progress.add_task(f"[cyan]{filename}", total=100)
-                elif msg_type == 'progress':
-                    progress.update(tasks[filename], completed=msg[2])
-                elif msg_type == 'complete':
-                    progress.update(tasks[filename], completed=100)
-                    completed.add(filename)
-                elif msg_type == 'error':
-                    progress.update(tasks[filename], description=f"[red]{filename} - Error!")
-                    errors.add(filename)
-            except queue.Empty:
-                continue
-
-# Function to parse TOC line using regular expressions
-def parse_toc_line(line, next_line=None):
-    toc_patterns = [
-        r'^\s*(?P<numbering>[IVXLC]+\.*|\d+\.\d*|\d+)\s+(?P<heading>.*?)\s+\.{2,}\s+(?P<page>\d+)$',
-        r'^\s*(?P<numbering>[IVXLC]+\.*|\d+\.\d*|\d+)\s+(?P<heading>.*?)\s+(?P<page>\d+)$',
-        r'^\s*(?P<numbering>[IVXLC]+\.*|\d+\.\d*|\d+)\s+(?P<heading>.*)$',
-        r'^\s*(?P<heading>.*?)\s+\.{2,}\s+(?P<page>\d+)$',
-        r'^\s*(?P<heading>.*?)\s+(?P<page>\d+)$',
-        r'^\s*(?P<heading>.+?)\s*\.{2,}\s*(?P<page>\d+)\s*(Chapter\s+\d+)?$',
-        r'^\s*(?P<heading>.+?)\s*(?P<page>\d+)\s*$',
-        r'^\s*(?P<chapter>Chapter\s+\d+)\s*\.{2,}\s*(?P<page>\d+)$',
-        r'^\s*(PART\s+\d+:\s+)?(?P<heading>.+?)(\.{2,}|\s+)(?P<page>\d+)$',
-        r'^\s*(?P<numbering>\d+|\d+\.\d+|PART \d+)\s+(?P<heading>.+?)(\.{2,}|\s+)(?P<page>\d+)$',
-        r'^\s*(?P<heading>.+?)\s+(\.{2,})\s*(?P<page>\d+)$',
-    ]
-
-    for pattern in toc_patterns:
-        match = re.match(pattern, line)
+    except Exception:
+        if progress:
+            progress.finish(ok=False, pages_done=pages_extracted)
+        return ExtractionResult(False, filename, pages_extracted, total_pages, metrics.records)
+
+# TOC line patterns, tried in order: the first match wins
+TOC_LINE_PATTERNS = [
+    r'^\s*(?P<numbering>[IVXLC]+\.*|\d+\.\d*|\d+)\s+(?P<heading>.*?)\s+\.{2,}\s+(?P<page>\d+)$',
+    r'^\s*(?P<numbering>[IVXLC]+\.*|\d+\.\d*|\d+)\s+(?P<heading>.*?)\s+(?P<page>\d+)$',
+    r'^\s*(?P<numbering>[IVXLC]+\.*|\d+\.\d*|\d+)\s+(?P<heading>.*)$',
+    r'^\s*(?P<heading>.*?)\s+\.{2,}\s+(?P<page>\d+)$',
+    r'^\s*(?P<heading>.*?)\s+(?P<page>\d+)$',
+    r'^\s*(?P<heading>.+?)\s*\.{2,}\s*(?P<page>\d+)\s*(Chapter\s+\d+)?$',
+    r'^\s*(?P<heading>.+?)\s*(?P<page>\d+)\s*$',
+    r'^\s*(?P<chapter>Chapter\s+\d+)\s*\.{2,}\s*(?P<page>\d+)$',
+    r'^\s*(PART\s+\d+:\s+)?(?P<heading>.+?)(\.{2,}|\s+)(?P<page>\d+)$',
+    r'^\s*(?P<numbering>\d+|\d+\.\d+|PART \d+)\s+(?P<heading>.+?)(\.{2,}|\s+)(?P<page>\d+)$',
+    r'^\s*(?P<heading>.+?)\s+(\.{2,})\s*(?P<page>\d+)$',
+]
+
+# What a line must have for each pattern to be able to match:
+# (ends with a page number, starts with a Roman or Arabic numbering, contains a dot leader)
+_TOC_PATTERN_REQUIREMENTS = [
+    (True, True, True),
+    (True, True, False),
+    (False, True, False),
+    (True, False, True),
+    (True, False, False),
+    (True, False, True),
+    (True, False, False),
+    (True, False, True),
+    (True, False, False),
+    (True, False, False),
+    (True, False, True),
+]
+
+def _build_toc_matchers():
+    """Compiled patterns per line class, in their original order, keyed by classify_toc_line()."""
+    compiled = [re.compile(pattern) for pattern in TOC_LINE_PATTERNS]
+    matchers = {}
+    for line_class in itertools.product((False, True), repeat=3):
+        matchers[line_class] = tuple(
+            pattern for pattern, requirements in zip(compiled, _TOC_PATTERN_REQUIREMENTS)
+            if all(has or not needs for has, needs in zip(line_class, requirements))
+        )
+    return matchers
+
+_TOC_MATCHERS = _build_toc_matchers()
+
+def classify_toc_line(line):
+    """
+    Cheap features that rule patterns out: whether the line ends with a digit (ignoring
+    trailing whitespace), starts with a digit or a Roman numeral letter (ignoring leading
+    whitespace), and contains a dot leader. The checks are loose, so a pattern is only
+    skipped when it cannot match.
+    """
+    last_char = line.rstrip()[-1:]
+    first_char = line.lstrip()[:1]
+    return (
+        last_char.isdecimal(),
+        first_char.isdecimal() or (first_char != '' and first_char in 'IVXLC'),
+        '..' in line,
+    )
+
+def _match_toc_line(line):
+    for pattern in _TOC_MATCHERS[classify_toc_line(line)]:
+        match = pattern.match(line)
         if match:
             numbering = match.groupdict().get('numbering', '').strip()
             heading = match.group('heading').strip()
@@ -113,38 +223,39 @@ def parse_toc_line(line, next_line=None):
             else:
                 entry['page_number'] = None
             return entry
+    return None
+
+# Function to parse TOC line using regular expressions
+def parse_toc_line(line, next_line=None):
+    entry = _match_toc_line(line)
+    if entry:
+        return entry
 
     if next_line:
         combined_line = line + ' ' + next_line.strip()
-        for pattern in toc_patterns:
-            match = re.match(pattern, combined_line)
-            if match:
-                numbering = match.groupdict().get('numbering', '').strip()
-                heading = match.group('heading').strip()
-                page = match.groupdict().get('page')
-                full_heading = f"{numbering} {heading}".strip() if numbering else heading
-                entry = {'heading': full_heading}
-                if page:
-                    entry['page_number'] = int(page)
-                else:
-                    entry['page_number'] = None
-                return entry
+        return _match_toc_line(combined_line)
 
     return None
 
 # Extract TOC entries from the PDF
 def extract_toc_entries(text_content):
-    toc_phrases = ["Table of Contents", "Contents", "Index", "CONTENTS"]
-    toc_start_index = None
-    for phrase in toc_phrases:
-        toc_start_index = text_content.find(phrase)
-        if toc_start_index != -1:
-            break
+    toc_entries, _ = _parse_toc_entries(text_content)
+    return toc_entries
 
-    if toc_start_index == -1:
-        return []
+def _parse_toc_entries(text_content, anchor=None):
+    """
+    Returns (toc_entries, parse_finished). parse_finished is True when the parse stopped on
+    too many non-matching lines with a real next line available, i.e. appending more text
+    to text_content cannot change the entries (as long as the TOC start stays the same).
+    The TOC starts at anchor, by default best_anchor(text_content).
+    """
+    toc_phrases = TOC_PHRASES
+    if anchor is None:
+        anchor = best_anchor(text_content)
+    if anchor is None:
+        return [], False
 
-    toc_text = text_content[toc_start_index:]
+    toc_text = text_content[anchor.start:]
     lines = toc_text.split('\n')
 
     lines = lines[:700]
@@ -184,10 +295,10 @@ def extract_toc_entries(text_content):
         else:
             non_match_count += 1
             if non_match_count >= max_non_match:
-                break
+                return toc_entries, next_line is not None
             i += 1
 
-    return toc_entries
+    return toc_entries, False
 
 # Extract bookmarks from the PDF (if available)
 # def extract_bookmarks(pdf_path):
@@ -230,10 +341,10 @@ def extract_headings_from_text(text_pages):
     return headings
 
 # Main function to extract TOC and text from PDFs
-def extract_pdf_toc(pdf_path, extracted_output_folder, progress_queue):
+def extract_pdf_toc(pdf_path, extracted_output_folder, progress=None):
     text_pages = []
     # Call extract_text_from_pdf for text extraction
-    success, filename = extract_text_from_pdf(pdf_path, extracted_output_folder, progress_queue)
+    success, filename, _, _, _ = extract_text_from_pdf(pdf_path, extracted_output_folder, progress)
     
     if success:
         text_output_path = os.path.join(extracted_output_folder, f'{filename}.txt')
@@ -252,29 +363,51 @@ def extract_pdf_toc(pdf_path, extracted_output_folder, progress_queue):
 
     return toc_entries, text_pages
 
+def format_toc_entries(toc_entries):
+    """Return TOC entries as the text saved in the 02 folder."""
+    formatted_lines = []
+    for entry in toc_entries:
+        page_number = entry['page_number'] if entry['page_number'] is not None else ''
+        formatted_lines.append(f"{entry['heading']} ...... {page_number}\n")
+    return ''.join(formatted_lines)
+
+def build_toc_text(text_content):
+    """TOC text for the extracted text of a document, as process_txt_files_in_directory saves it."""
+    return build_toc_text_with_quality(text_content)[0]
+
+def build_toc_text_with_quality(text_content):
+    """(TOC text, TOCQuality) for the extracted text of a document; one line per entry."""
+    return toc_text_from_lines(text_content.splitlines()[:TOC_LINE_BUDGET])
+
+def toc_text_from_lines(lines):
+    """build_toc_text_with_quality for the first TOC_LINE_BUDGET lines of the extracted text."""
+    toc_text = format_toc_entries(extract_toc_entries('\n'.join(lines)))
+    return toc_text, text_quality(toc_text)
+
 # Process all PDFs in the directory and save TOC and content
-def process_txt_files_in_directory(directory):
-    output_dir_toc = './output/02'
+def process_txt_files_in_directory(directory, output_dir_toc='./output/02', metrics=None):
+    """
+    Save the TOC of every extracted text file; returns {file name without extension: TOCQuality}.
+    The StageMetrics of every file, named after its PDF, are appended to the metrics list when given.
+    """
     os.makedirs(output_dir_toc, exist_ok=True)
 
     txt_files = glob.glob(os.path.join(directory, '*.txt'))
+    qualities = {}
 
     for txt_file in txt_files:
         filename = os.path.splitext(os.path.basename(txt_file))[0]
 
-        with open(txt_file, 'r', encoding='utf-8') as f:
-            text_content = f.read()
-
-        text_content = '\n'.join(text_content.splitlines()[:700])
-
-        toc_entries = extract_toc_entries(text_content)
-
+        # Only the lines the TOC can come from are read
+        with MetricsRecorder(f"{filename}.pdf", metrics).stage('extract_toc_entries') as counters:
+            lines = head_lines(txt_file, TOC_LINE_BUDGET)
+            toc_text, qualities[filename] = toc_text_from_lines(lines)
+            counters.lines = len(lines)
         toc_output_path = os.path.join(output_dir_toc, f'{filename}.txt')
-        with open(toc_output_path, 'w', encoding='utf-8') as toc_file:
-            for entry in toc_entries:
-                page_number = entry['page_number'] if entry['page_number'] is not None else ''
-                toc_file.write(f"{entry['heading']} ...... {page_number}\n")
+        with replacing(toc_output_path) as temp_path, open(temp_path, 'w', encoding='utf-8') as toc_file:
+            toc_file.write(toc_text)
     print("#"*100)
+    return qualities
 
 # New function to process custom PDFs directly, without altering the existing file-based workflow
 def process_custom_pdfs_directly(pdf_paths, output_base_dir='./output'):
@@ -288,18 +421,13 @@ def process_custom_pdfs_directly(pdf_paths, output_base_dir='./output'):
     os.makedirs(output_dir_toc, exist_ok=True)
     os.makedirs(extracted_output_folder, exist_ok=True)
 
-    progress_queue = queue.Queue()
-    total_pdfs = len(pdf_paths)
-    from threading import Thread
-    progress_thread = Thread(target=progress_monitor, args=(progress_queue, total_pdfs))
-    progress_thread.start()
-
-    for pdf_path in pdf_paths:
-        filename = os.path.splitext(os.path.basename(pdf_path))[0]
-
-        # Extract text using the updated extract_text_from_pdf function
-        extract_text_from_pdf(pdf_path, extracted_output_folder, progress_queue)
+    names = [os.path.splitext(os.path.basename(pdf_path))[0] for pdf_path in pdf_paths]
+    with ProgressBoard(names) as board:
+        for pdf_path, slot in zip(pdf_paths, board.slots):
+            # Extract text using the updated extract_text_from_pdf function
+            extract_text_from_pdf(pdf_path, extracted_output_folder, slot)
 
+    for filename in names:
         # Extract TOC entries
         text_output_path = os.path.join(extracted_output_folder, f'{filename}.txt')
         with open(text_output_path, 'r', encoding='utf-8') as content_file:
@@ -309,14 +437,11 @@ def process_custom_pdfs_directly(pdf_paths, output_base_dir='./output'):
 
         # Save the TOC entries
         toc_output_path = os.path.join(output_dir_toc, f'{filename}.txt')
-        with open(toc_output_path, 'w', encoding='utf-8') as toc_file:
+        with replacing(toc_output_path) as temp_path, open(temp_path, 'w', encoding='utf-8') as toc_file:
             for entry in toc_entries:
                 page_number = entry['page_number'] if entry['page_number'] is not None else ''
                 toc_file.write(f"{entry['heading']} ...... {page_number}\n")
 
-    # Wait for progress monitoring to complete
-    progress_thread.join()
-
 
 # Example usage of the new custom PDF processing function without affecting the main workflow
 if __name__ == "__main__":
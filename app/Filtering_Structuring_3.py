@@ -1,10 +1,15 @@
 import subprocess
 import os
+import time
+from functools import partial
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.progress import Progress, SpinnerColumn, TextColumn
 from rich.traceback import install
+from utils.Filters_03 import Filter_from_2nd_method_1 as filter_1
+from utils.Filters_03 import Filter_Two_Points_2 as filter_2
+from utils.Filters_03 import Filter_Remove_Extra_Text_3 as filter_3
 
 # Install rich traceback handler for better error display
 install()
@@ -19,16 +24,58 @@ SCRIPT_2 = "Filter_Two_Points_2.py"
 SCRIPT_3 = "Filter_Remove_Extra_Text_3.py"
 SCRIPT_4 = "Filter_Structure_TOC_4.py"
 
+def filter_folders(output_folder):
+    """Input, output and log folders of every Filters_03 stage for the given output folder."""
+    filters_folder = os.path.join(output_folder, 'Filters_03')
+    return {
+        'txt': os.path.join(output_folder, '02'),
+        'extracted': os.path.join(output_folder, 'extracted_content'),
+        '01': os.path.join(filters_folder, '01'),
+        '02': os.path.join(filters_folder, '02'),
+        '02_logs': os.path.join(filters_folder, '02_logs'),
+        '03': os.path.join(filters_folder, '03'),
+        '03_logs': os.path.join(filters_folder, '03_logs'),
+    }
+
+# With trace=True the filters write their per-line decisions to their log files,
+# with a metrics list they append the StageMetrics of every file to it
+def run_filter_1(folders, trace=False, file_names=None, metrics=None):
+    processed_files = filter_1.process_folder(folders['txt'], folders['extracted'], folders['01'], trace=trace,
+                                              file_names=file_names, metrics=metrics)
+    return filter_1.format_summary(processed_files)
+
+def run_filter_2(folders, trace=False, metrics=None):
+    processed_files = filter_2.process_folder(folders['01'], folders['02'], folders['02_logs'], trace=trace,
+                                              metrics=metrics)
+    return filter_2.format_summary(processed_files)
+
+def run_filter_3(folders, trace=False, metrics=None):
+    processed_files = filter_3.process_folder(folders['02'], folders['03'], folders['03_logs'], trace=trace,
+                                              metrics=metrics)
+    return filter_3.format_summary(processed_files, folders['03'], folders['03_logs'] if trace else None)
+
+# (step label, console message, script name, in-process runner)
+FILTER_STAGES = [
+    ("Step 1: Filter_from_2nd_method_1.py", "Step 1: Running first filter... (Filter_from_2nd_method_1)", SCRIPT_1, run_filter_1),
+    ("Step 2: Filter_Two_Points_2.py", "Step 2: Running second filter... (Filter_Two_Points_2)", SCRIPT_2, run_filter_2),
+    ("Step 3: Filter_Remove_Extra_Text_3.py", "Step 3: Running third filter... (Filter_Remove_Extra_Text_3)", SCRIPT_3, run_filter_3),
+    # Step 4 is commented out as in original code
+    # ("Step 4: Filter_Structure_TOC_4.py", "Step 4: Running fourth filter... (Filter_Structure_TOC_4)", SCRIPT_4, None),
+]
+
 def run_script(script_name, progress):
-    """Function to change to SCRIPT_DIR and run a script by name"""
+    """
+    Compatibility mode: change to SCRIPT_DIR and run a script by name in a new interpreter.
+    The scripts use their own module-level paths, so this is not safe to call from threads.
+    """
     original_dir = os.getcwd()  # Save the current working directory
     try:
         os.chdir(SCRIPT_DIR)  # Change to the directory with our scripts
         task_id = progress.add_task(f"[cyan]Running {script_name}...", total=None)
-        
+
         result = subprocess.run(["python", script_name], capture_output=True, text=True, encoding='utf-8')
         progress.remove_task(task_id)
-        
+
         if result.returncode != 0:
             output = f"[red]Error:[/red]\n{result.stderr}"
         else:
@@ -37,11 +84,35 @@ def run_script(script_name, progress):
     finally:
         os.chdir(original_dir)  # Change back to the original directory
 
-def filtering_main_3():
+def run_in_process(runner, folders, script_name, progress, trace=False):
+    """Run a filter stage inside the calling process; errors are reported like a failed script."""
+    task_id = progress.add_task(f"[cyan]Running {script_name}...", total=None)
+    try:
+        return runner(folders, trace)
+    except Exception as e:
+        return f"[red]Error:[/red]\n{type(e).__name__}: {e}"
+    finally:
+        progress.remove_task(task_id)
+
+def filtering_main_3(output_folder="./output", use_subprocess=False, trace=False, short_tocs=None, metrics=None):
+    """
+    Run the Filters_03 stages over the given output folder and return the wall time of each stage.
+    With use_subprocess=True every filter is run as a separate script (the scripts then use
+    their own hard-coded paths and output_folder is ignored). With trace=True the filters write
+    their decisions to the log files in Filters_03 (the scripts run in a subprocess never do).
+    short_tocs lists the 02 TOC file names that are short enough for the filters, when the
+    caller already knows them; otherwise the first filter counts the lines of every 02 file.
+    The per-document StageMetrics of the filters are appended to the metrics list when given
+    (not with use_subprocess).
+    """
+    folders = filter_folders(output_folder)
+    timings = {}
+
     # Create a rich table
     table = Table(title="Filtering Process Results", show_header=True, header_style="bold magenta")
     table.add_column("Step", style="cyan", width=40)
     table.add_column("Output", style="green")
+    table.add_column("Time", justify="right", style="yellow", width=10)
 
     # Create progress context
     with Progress(
@@ -52,31 +123,26 @@ def filtering_main_3():
         # Display welcome message
         console.print(Panel("Starting Filtering Process", style="bold blue"))
 
-        # Step 1: Run Filter_from_2nd_method_1.py
-        console.print("\n[yellow]Step 1: Running first filter... (Filter_from_2nd_method_1)[/yellow]")
-        output_script_1 = run_script(SCRIPT_1, progress)
-        table.add_row("Step 1: Filter_from_2nd_method_1.py", output_script_1)
-
-        # Step 2: Run Filter_Two_Points_2.py
-        console.print("\n[yellow]Step 2: Running second filter... (Filter_Two_Points_2)[/yellow]")
-        output_script_2 = run_script(SCRIPT_2, progress)
-        table.add_row("Step 2: Filter_Two_Points_2.py", output_script_2)
-
-        # Step 3: Run Filter_Structure_TOC_3.py
-        console.print("\n[yellow]Step 3: Running third filter... (Filter_Remove_Extra_Text_3)[/yellow]")
-        output_script_3 = run_script(SCRIPT_3, progress)
-        table.add_row("Step 3: Filter_Remove_Extra_Text_3.py", output_script_3)
-
-        # Step 4 is commented out as in original code
-        # output_script_4 = run_script(SCRIPT_4, progress)
-        # table.add_row("Step 4: Filter_Structure_TOC_4.py", output_script_4)
+        for step, message, script_name, runner in FILTER_STAGES:
+            if runner is run_filter_1 and short_tocs is not None:
+                runner = partial(run_filter_1, file_names=short_tocs)
+            runner = partial(runner, metrics=metrics)
+            console.print(f"\n[yellow]{message}[/yellow]")
+            start = time.perf_counter()
+            if use_subprocess:
+                output = run_script(script_name, progress)
+            else:
+                output = run_in_process(runner, folders, script_name, progress, trace)
+            timings[script_name] = time.perf_counter() - start
+            table.add_row(step, output, f"{timings[script_name]:.2f}s")
 
     # Print the final results table
     console.print("\n")
     console.print(table)
-    console.print(Panel("All scripts have been run successfully!", 
-                       style="bold green", 
+    console.print(Panel("All scripts have been run successfully!",
+                       style="bold green",
                        subtitle="Process Complete"))
+    return timings
 
 if __name__ == "__main__":
-    filtering_main_3()
\ No newline at end of file
+    filtering_main_3()
@@ -1,74 +1,350 @@
 import fitz  # PyMuPDF
+import bisect
 import os
 import re
+import math
+from functools import partial
+from collections import Counter, namedtuple
 from rich.console import Console
 from rich.table import Table
 from rich import box
+from utils.pdf_session import session_for
+from utils.worker_pool import pool_for
+from utils.toc_quality import toc_quality, text_quality
+from utils.metrics import MetricsRecorder
+from utils.final_manifest import replacing
 
-def extract_pdf_toc(pdf_path):
-    doc = fitz.open(pdf_path)
-    toc = doc.get_toc()
-    doc.close()
-    return toc
+# Result of estimate_offset: the winning offset (or None), its confidence, and how many pages were read;
+# segments is the piecewise offset map found by mode="segments" (None in the other modes)
+OffsetEstimate = namedtuple('OffsetEstimate', ['offset', 'confidence', 'pages_inspected', 'mode', 'segments'],
+                            defaults=[None])
+# One piece of an offset map: from the 1-based PDF page start on, a bookmark to page p is printed
+# as page p - shift, in Roman numerals when roman is set (front matter)
+OffsetSegment = namedtuple('OffsetSegment', ['start', 'shift', 'roman'])
+
+OFFSET_MODES = ("sample", "full", "segments")
+# Votes a front matter offset needs, from pages before the body offset starts, to get its own segment
+MIN_SEGMENT_VOTES = 3
+
+def extract_pdf_toc(pdf):
+    """Return the bookmark TOC of a PDF path or an open PDFSession."""
+    with session_for(pdf) as session:
+        return session.doc.get_toc()
+
+def format_toc(toc):
+    """Return the TOC as the text write_toc_to_file saves."""
+    formatted_lines = []
+    for level, title, page_number in toc:
+        indent = '    ' * (level - 1)
+        formatted_line = f"{indent}{title}{'.' * (80 - len(indent + title) - len(str(page_number)))}{page_number}"
+        formatted_lines.append(formatted_line + '\n')
+    return ''.join(formatted_lines)
 
 def write_toc_to_file(toc, output_file):
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for level, title, page_number in toc:
-            indent = '    ' * (level - 1)
-            formatted_line = f"{indent}{title}{'.' * (80 - len(indent + title) - len(str(page_number)))}{page_number}"
-            f.write(formatted_line + '\n')
+    with replacing(output_file) as temp_path, open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(format_toc(toc))
+
+def has_numbered_lines(lines, min_consecutive=50):
+    """Check if there are at least min_consecutive consecutive lines that contain numbers and not words."""
+    return toc_quality(lines).longest_numeric_run >= min_consecutive
+
+_PAGE_NUMBER = re.compile(r'\b\d+\b')
 
 def extract_printed_page_number(text):
     """
     Extract the printed page number from the given text.
     This function looks for the first numeric value in the text.
     """
-    numbers = re.findall(r'\b\d+\b', text)
-    if numbers:
-        return int(numbers[0])
+    number = _PAGE_NUMBER.search(text)
+    if number:
+        return int(number.group(0))
+    return None
+
+# Lowercase only: an uppercase "I" or "V" in a running header is far more often a word than a page number
+_ROMAN_NUMERAL = re.compile(r'\b(?=[ivxl])(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})(?!\w)')
+_ROMAN_VALUES = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100}
+
+def roman_to_int(numeral):
+    values = [_ROMAN_VALUES[char] for char in numeral]
+    return sum(-value if value < following else value for value, following in zip(values, values[1:] + [0]))
+
+def int_to_roman(number):
+    numeral = ''
+    for value, symbol in ((100, 'c'), (90, 'xc'), (50, 'l'), (40, 'xl'), (10, 'x'), (9, 'ix'), (5, 'v'), (4, 'iv'), (1, 'i')):
+        count, number = divmod(number, value)
+        numeral += symbol * count
+    return numeral
+
+def extract_printed_roman_numeral(text):
+    """Value of the first lowercase Roman numeral standing on its own in the text, or None."""
+    match = _ROMAN_NUMERAL.search(text)
+    return roman_to_int(match.group(0)) if match else None
+
+def band_texts(page, header_height=70, footer_height=50):
+    """
+    Text of the header band (header_height points from the top of the page), then of the
+    footer band (footer_height points from the bottom). Each band is only extracted when the
+    caller asks for it, so a number found in the header saves the footer extraction.
+    """
+    rect = page.rect
+    yield page.get_text("text", clip=fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + header_height))
+    yield page.get_text("text", clip=fitz.Rect(rect.x0, rect.y1 - footer_height, rect.x1, rect.y1))
+
+def printed_page_number(page, header_height=70, footer_height=50, roman=False):
+    """
+    (number, is_roman) of the page number printed in the header or footer of a page, or
+    None. Arabic numbers are looked for in the header, then the footer; with roman=True a
+    lowercase Roman numeral is accepted when neither holds one.
+    """
+    # Try to extract the printed page number from the header, then the footer
+    texts = []
+    for text in band_texts(page, header_height, footer_height):
+        number = extract_printed_page_number(text)
+        if number is not None:
+            return number, False
+        texts.append(text)
+    if roman:
+        for text in texts:
+            number = extract_printed_roman_numeral(text)
+            if number is not None:
+                return number, True
     return None
 
-def calculate_offset(pdf_path, header_height=70, footer_height=50):
+def page_offset(page, header_height=70, footer_height=50):
     """
-    Calculate the most common offset for the printed page numbers in the given PDF file.
+    Offset between the printed page number found in the header or footer of a page
+    and its actual PDF page number (1-based), or None if no number is printed.
     """
-    doc = fitz.open(pdf_path)
-    offsets = []
-    for page_num in range(len(doc)):
-        page = doc[page_num]
-        rect = page.rect
-        
-        # Define the header and footer rectangles
-        header_rect = fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + header_height)
-        footer_rect = fitz.Rect(rect.x0, rect.y1 - footer_height, rect.x1, rect.y1)
+    printed = printed_page_number(page, header_height, footer_height)
+    if printed is None:
+        return None
+    # Calculate offset: printed page number - actual PDF page number (1-based)
+    return printed[0] - (page.number + 1)
 
-        # Extract text from the header and footer
-        header_text = page.get_text("text", clip=header_rect)
-        footer_text = page.get_text("text", clip=footer_rect)
+def sample_page_order(page_count, body_start=0.1, body_end=0.95, min_body_pages=30):
+    """
+    Stratified order in which to inspect the pages of a document for printed numbers.
+    Pages are taken from the body of the book (skipping front and back matter) in
+    bit-reversed order, so every prefix of the order is spread evenly across the body.
+    Short documents use all of their pages.
+    """
+    start, end = int(page_count * body_start), int(page_count * body_end)
+    if end - start < min_body_pages:
+        start, end = 0, page_count
+    body_pages = end - start
 
-        # Try to extract the printed page number from the header or footer
-        header_number = extract_printed_page_number(header_text)
-        footer_number = extract_printed_page_number(footer_text)
+    order = [start] if body_pages > 0 else []
+    seen = set(order)
+    denominator = 2
+    while len(order) < body_pages:
+        for numerator in range(1, denominator, 2):
+            page_num = start + numerator * body_pages // denominator
+            if page_num not in seen:
+                seen.add(page_num)
+                order.append(page_num)
+        denominator *= 2
+    return order
 
-        # Determine which number to use
-        printed_page_number = header_number if header_number is not None else footer_number
+def majority_lower_bound(count, total, z=2.576):
+    """Lower bound of the Wilson score interval (99% by default) for the share count/total."""
+    if total == 0:
+        return 0.0
+    share = count / total
+    denominator = 1 + z * z / total
+    centre = share + z * z / (2 * total)
+    margin = z * math.sqrt(share * (1 - share) / total + z * z / (4 * total * total))
+    return (centre - margin) / denominator
 
-        if printed_page_number is not None:
-            # Calculate offset: printed page number - actual PDF page number (1-based)
-            offset = printed_page_number - (page_num + 1)
-            offsets.append(offset)
+def estimate_offset(pdf, header_height=70, footer_height=50, mode="sample", min_samples=10):
+    """
+    Estimate the most common offset for the printed page numbers in the given PDF file
+    (a path or an open PDFSession) and return an OffsetEstimate.
 
-    doc.close()
+    mode="full" inspects every page. mode="sample" inspects pages in stratified order
+    and stops as soon as one offset holds a clear majority: the lower bound of its
+    99% confidence interval is above one half, after at least min_samples votes. When no
+    offset gets there, the remaining pages are read too and the result is the one of
+    mode="full", so sampling never returns a guess the full scan would not.
+    The confidence reported is that lower bound for the winning offset.
+    mode="segments" inspects every page like "full", also reading Roman page numbers, and
+    adds the piecewise offset map of offset_segments (front matter and body).
+    """
+    if mode not in OFFSET_MODES:
+        raise ValueError(f"Unknown offset mode {mode!r}, expected one of {OFFSET_MODES}")
+    with session_for(pdf) as session:
+        doc = session.doc
+        page_order = sample_page_order(len(doc)) if mode == "sample" else range(len(doc))
+
+        page_offsets = {}  # Arabic offset of every inspected page that has one
+        counts = Counter()
+        votes = []
+        inspected = set()
+        for page_num in page_order:
+            inspected.add(page_num)
+            printed = printed_page_number(doc[page_num], header_height, footer_height, roman=mode == "segments")
+            if printed is None:
+                continue
+            number, is_roman = printed
+            # Offset: printed page number - actual PDF page number (1-based)
+            offset = number - (page_num + 1)
+            votes.append((page_num + 1, offset, is_roman))
+            if is_roman:
+                continue
+            page_offsets[page_num] = offset
+            counts[offset] += 1
+
+            if mode == "sample" and len(page_offsets) >= min_samples:
+                leader_count = counts.most_common(1)[0][1]
+                if majority_lower_bound(leader_count, len(page_offsets)) > 0.5:
+                    break
+        else:
+            if mode == "sample":
+                # No clear majority in the sample: finish the scan and decide as mode="full"
+                for page_num in range(len(doc)):
+                    if page_num not in inspected:
+                        inspected.add(page_num)
+                        offset = page_offset(doc[page_num], header_height, footer_height)
+                        if offset is not None:
+                            page_offsets[page_num] = offset
+                page_offsets = dict(sorted(page_offsets.items()))
 
-    if offsets:
-        most_common_offset = max(set(offsets), key=offsets.count)
-        return abs(most_common_offset)  # Convert to positive
+    pages_inspected = len(inspected)
+    if not page_offsets:
+        return OffsetEstimate(None, 0.0, pages_inspected, mode)
+
+    # Same tie-breaking as the original max(set(offsets), key=offsets.count), in linear time
+    offsets = list(page_offsets.values())
+    counts = Counter(offsets)
+    most_common_offset = max(set(offsets), key=counts.__getitem__)
+    confidence = majority_lower_bound(counts[most_common_offset], len(offsets))
+    segments = offset_segments(votes, most_common_offset) if mode == "segments" else None
+    return OffsetEstimate(most_common_offset, confidence, pages_inspected, mode, segments)
+
+def offset_segments(votes, body_offset):
+    """
+    Piecewise offset map (a tuple of OffsetSegments) from the (page, offset, is_roman) votes
+    of every page, in page order, and the most common Arabic offset. The body's first vote
+    is the first page voting for that offset. The pages before it get a front matter segment
+    of their own when one offset (Roman or Arabic) has at least MIN_SEGMENT_VOTES of their
+    votes and a majority of them; otherwise the body offset applies to the whole document.
+    Shifts are absolute offsets, as calculate_offset returns them.
+    """
+    first_body_vote = next(page for page, offset, is_roman in votes if not is_roman and offset == body_offset)
+    front_votes = Counter((offset, is_roman) for page, offset, is_roman in votes if page < first_body_vote)
+    if front_votes:
+        (front_offset, is_roman), count = front_votes.most_common(1)[0]
+        if count >= MIN_SEGMENT_VOTES and count * 2 > sum(front_votes.values()):
+            # A chapter's opening page often has no printed number: the body starts at its
+            # page 1 unless a front matter page number comes after that
+            last_front_vote = max(page for page, offset, roman in votes
+                                  if page < first_body_vote and (offset, roman) == (front_offset, is_roman))
+            body_start = max(last_front_vote + 1, min(first_body_vote, 1 - body_offset))
+            return (OffsetSegment(1, abs(front_offset), is_roman), OffsetSegment(body_start, abs(body_offset), False))
+    return (OffsetSegment(1, abs(body_offset), False),)
+
+def offset_map(estimate):
+    """The offset map of an OffsetEstimate: its segments, or one segment for its offset (None without one)."""
+    if estimate.offset is None:
+        return None
+    return estimate.segments or (OffsetSegment(1, abs(estimate.offset), False),)
+
+def apply_offset_map(toc, segments, remove_negative_pages=False):
+    """
+    The TOC with every bookmark page replaced by its printed page under the offset map,
+    in one pass; entries printed before page 0 are dropped with remove_negative_pages.
+    Bookmark pages mostly go up, so the current segment is walked forward along the TOC;
+    it is only searched for again when an entry goes back before it.
+    """
+    starts = [segment.start for segment in segments]
+    last = len(starts) - 1
+    index = 0
+    adjusted_toc = []
+    for level, title, page_number in toc:
+        if page_number < starts[index]:
+            index = max(bisect.bisect_right(starts, page_number) - 1, 0)
+        else:
+            while index < last and starts[index + 1] <= page_number:
+                index += 1
+        segment = segments[index]
+        adjusted_page_number = page_number - segment.shift
+        if remove_negative_pages and adjusted_page_number < 0:
+            continue
+        if segment.roman and adjusted_page_number > 0:
+            adjusted_page_number = int_to_roman(adjusted_page_number)
+        adjusted_toc.append((level, title, adjusted_page_number))
+    return adjusted_toc
+
+def calculate_offset(pdf, header_height=70, footer_height=50, mode="sample"):
+    """
+    Calculate the most common offset for the printed page numbers in the given PDF file
+    (a path or an open PDFSession). See estimate_offset for the modes.
+    """
+    estimate = estimate_offset(pdf, header_height, footer_height, mode)
+    if estimate.offset is not None:
+        return abs(estimate.offset)  # Convert to positive
     else:
         return None
 
-def process_pdfs(data_folder, output_folder, header_height, footer_height, remove_negative_pages=False, callback=None):
+def build_toc(pdf, header_height, footer_height, remove_negative_pages=False, offset_mode="sample", metrics=None):
     """
-    Process all PDFs in the data folder, adjust TOC page numbers, and save to output folder.
+    Extract the TOC of a single PDF (a path or an open PDFSession) and adjust its page numbers.
+    Returns (toc_status, offset, toc); offset is None when no printed page numbers were found.
+    With a utils.metrics.MetricsRecorder, the TOC and offset steps are recorded as stages.
+    """
+    # Open the document once and share it between the TOC and offset steps
+    with session_for(pdf) as session:
+        if metrics is None:
+            toc = extract_pdf_toc(session)
+            estimate = estimate_offset(session, header_height, footer_height, offset_mode) if toc else None
+        else:
+            with metrics.stage('extract_pdf_toc') as counters:
+                toc = extract_pdf_toc(session)
+                counters.lines = len(toc)
+            estimate = None
+            if toc:
+                with metrics.stage('calculate_offset') as counters:
+                    estimate = estimate_offset(session, header_height, footer_height, offset_mode)
+                    counters.pages = estimate.pages_inspected
+
+    if not toc:
+        return "No TOC", None, toc
+
+    segments = offset_map(estimate)
+    if segments is None:
+        return "TOC found", None, toc
+    # The body offset is the one reported; with mode="segments" the front matter may have its own
+    offset = abs(estimate.offset)
+    return "TOC found", offset, apply_offset_map(toc, segments, remove_negative_pages)
+
+def process_pdf(pdf_path, output_file, header_height, footer_height, remove_negative_pages=False, offset_mode="sample", metrics=None):
+    """
+    Extract, adjust and save the TOC of a single PDF.
+    Returns (toc_status, offset, quality); offset is None when no printed page numbers were found,
+    quality the TOCQuality of the saved TOC (None without a TOC). metrics is passed to build_toc.
+    """
+    toc_status, offset, toc = build_toc(pdf_path, header_height, footer_height, remove_negative_pages, offset_mode, metrics)
+    quality = None
+    if toc_status == "TOC found":
+        toc_text = format_toc(toc)
+        with replacing(output_file) as temp_path, open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(toc_text)
+        quality = text_quality(toc_text)
+    return toc_status, offset, quality
+
+def _process_pdf_measured(pdf_path, output_file, **options):
+    """process_pdf in a worker: (its result, the StageMetrics of its steps)."""
+    metrics = MetricsRecorder(os.path.basename(pdf_path))
+    return process_pdf(pdf_path, output_file, metrics=metrics, **options), metrics.records
+
+def process_pdfs(data_folder, output_folder, header_height, footer_height, remove_negative_pages=False, callback=None, offset_mode="sample", workers=None, filenames=None, pool=None, metrics=None, recycle_after=None):
+    """
+    Process all PDFs in the data folder (or only the given filenames), adjust TOC page numbers, and save to output folder.
+    offset_mode is passed to calculate_offset ("sample", "full" or "segments").
+    The PDFs are processed on the given WorkerPool, or on a new pool of `workers` processes
+    (default: one per CPU, 1 runs in this process) recycled after recycle_after PDFs when set;
+    the results table and callbacks are still produced in listing order. callback(filename, toc_status, offset, quality) gets the
+    TOCQuality of the saved TOC, so callers can route the PDF without reading the file back.
+    The StageMetrics of every PDF are appended to the metrics list when given.
     """
     os.makedirs(output_folder, exist_ok=True)
     console = Console()
@@ -89,53 +365,33 @@ def process_pdfs(data_folder, output_folder, header_height, footer_height, remov
 
     # Print initial separator
     console.print("\n")
-    
-    index = 1
-    for filename in os.listdir(data_folder):
-        if filename.endswith(".pdf"):
-            pdf_path = os.path.join(data_folder, filename)
-            output_file = os.path.join(output_folder, f"{os.path.splitext(filename)[0]}.txt")
-            
-            toc = extract_pdf_toc(pdf_path)
-            if toc:
-                offset = calculate_offset(pdf_path, header_height, footer_height)
-                if offset is not None:
-                    adjusted_toc = []
-                    for level, title, page_number in toc:
-                        adjusted_page_number = page_number - offset
-                        if remove_negative_pages and adjusted_page_number < 0:
-                            continue
-                        adjusted_toc.append((level, title, adjusted_page_number))
-                    
-                    write_toc_to_file(adjusted_toc, output_file)
-                    table.add_row(
-                        str(index),
-                        filename,
-                        f"[green]Offset: {offset}[/]"
-                    )
-
-                    if callback:
-                        callback(filename, "TOC found", offset)
-                else:
-                    write_toc_to_file(toc, output_file)
-                    table.add_row(
-                        str(index),
-                        filename,
-                        "[blue]Offset: 0[/]"
-                    )
-
-                    if callback:
-                        callback(filename, "TOC found", 0)
+
+    if filenames is None:
+        filenames = [filename for filename in os.listdir(data_folder) if filename.endswith(".pdf")]
+    pdf_paths = [os.path.join(data_folder, filename) for filename in filenames]
+    output_files = [os.path.join(output_folder, f"{os.path.splitext(filename)[0]}.txt") for filename in filenames]
+    worker = partial(_process_pdf_measured, header_height=header_height, footer_height=footer_height,
+                     remove_negative_pages=remove_negative_pages, offset_mode=offset_mode)
+
+    # Results come back in submission order, so the table and callbacks match a serial run
+    with pool_for(pool, workers, len(filenames), recycle_after) as executor:
+        if executor:
+            results = executor.map(worker, pdf_paths, output_files)
+        else:
+            results = map(worker, pdf_paths, output_files)
+
+        for index, (filename, ((toc_status, offset, quality), records)) in enumerate(zip(filenames, results), start=1):
+            if metrics is not None:
+                metrics.extend(records)
+            if toc_status == "No TOC":
+                table.add_row(str(index), filename, "[yellow]No TOC[/]")
+            elif offset is not None:
+                table.add_row(str(index), filename, f"[green]Offset: {offset}[/]")
             else:
-                table.add_row(
-                    str(index),
-                    filename,
-                    "[yellow]No TOC[/]"
-                )
-                if callback:
-                    callback(filename, "No TOC", 0)
-
-            index += 1
+                table.add_row(str(index), filename, "[blue]Offset: 0[/]")
+
+            if callback:
+                callback(filename, toc_status, offset or 0, quality)
 
     # Print the final table
     console.print(table)
@@ -0,0 +1,65 @@
+"""
+Bounded reads of extracted_content files versus reading the whole file.
+
+Writes a generated book-sized extracted text (2,000 pages by default) with
+write_extracted_text, checks that head_lines returns exactly the original
+`f.read().splitlines()[:700]` and read_pages the original page texts, then times the first
+700 lines and a 10-page range both ways. The page range is timed with the page records
+loaded for the call (read_pages) and with an ExtractedText already open. Run from the app folder:
+
+    python -m benchmarks.bench_extracted_reads [--pages N]
+"""
+import argparse
+import os
+import random
+import tempfile
+import timeit
+from utils.extracted_text import ExtractedText, write_extracted_text, head_lines, read_pages
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "Chapter", "Section", "the", "of", "1.2", "42", "é"]
+
+def generate_pages(count, lines_per_page=45, seed=0):
+    rng = random.Random(seed)
+    return ['\n'.join(' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 14))) for _ in range(lines_per_page))
+            for _ in range(count)]
+
+def full_head(text_path, count):
+    with open(text_path, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()[:count]
+
+def best_of(function, repeat=5, number=10):
+    return min(timeit.repeat(function, number=number, repeat=repeat)) / number
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--pages', type=int, default=2000)
+    args = parser.parse_args()
+
+    pages = generate_pages(args.pages)
+    with tempfile.TemporaryDirectory() as folder:
+        text_path = os.path.join(folder, 'book.txt')
+        write_extracted_text(text_path, pages)
+        size_mb = os.path.getsize(text_path) / (1024 * 1024)
+        print(f"{args.pages} pages, {size_mb:.1f} MB")
+
+        assert head_lines(text_path, 700) == full_head(text_path, 700)
+        first, last = args.pages // 2, args.pages // 2 + 9
+        assert read_pages(text_path, first, last) == '\n'.join(pages[first:last + 1])
+        print("head_lines and read_pages match the full reads")
+
+        # Without an index, a page range needs the whole text and the page lengths in lines
+        lines_per_page = [page.count('\n') + 1 for page in pages]
+        start = sum(lines_per_page[:first])
+        stop = start + sum(lines_per_page[first:last + 1])
+
+        def full_page_range():
+            with open(text_path, 'r', encoding='utf-8') as f:
+                return '\n'.join(f.read().split('\n')[start:stop])
+
+        extracted = ExtractedText(text_path)
+        for name, bounded, full in (("first 700 lines", lambda: head_lines(text_path, 700), lambda: full_head(text_path, 700)),
+                                    ("10-page range", lambda: read_pages(text_path, first, last), full_page_range),
+                                    ("10 pages, open", lambda: extracted.read_pages(first, last), full_page_range)):
+            bounded_seconds, full_seconds = best_of(bounded), best_of(full)
+            print(f"{name:>16}: full read {full_seconds * 1000:.2f} ms, bounded {bounded_seconds * 1000:.2f} ms "
+                  f"({full_seconds / bounded_seconds:.1f}x)")
@@ -0,0 +1,98 @@
+"""
+Equivalence check and microbenchmark for the long-line window of Filter_from_2nd_method_1.
+
+take_toc_entries counts the words of every line once and keeps a rolling count of the long
+lines in the 5-line window. This script checks it returns exactly what the original loop
+returned (a fresh 5-line slice per line, every line of it re-counted, with the debug logging
+of the original formatted for every line) on generated 700-line TOC inputs (plus any
+extracted_content files), then times both on the full extract_toc_entries_clean input size.
+Run from the app folder:
+
+    python -m benchmarks.bench_filter_window
+"""
+import glob
+import logging
+import os
+import random
+import re
+import timeit
+from utils.Filters_03.Filter_from_2nd_method_1 import take_toc_entries
+
+logger = logging.getLogger("bench_filter_window.legacy")
+logger.addHandler(logging.NullHandler())
+logger.propagate = False
+
+def legacy_take_toc_entries(toc_lines, log=True):
+    """The original loop; with log=True it formats its per-line debug messages like the original did."""
+    toc_entries = []
+
+    def count_valid_words(line):
+        valid_words = [token for token in line.split() if token.isalnum() or re.match(r'^\d+(\.\d+)*$', token)]
+        if log:
+            logger.debug(f"Counted {len(valid_words)} valid words in line: {line}")
+        return len(valid_words)
+
+    for i in range(len(toc_lines)):
+        line = toc_lines[i].strip()
+        if log:
+            logger.debug(f"Processing line {i}: '{line}'")
+
+        next_five_lines = toc_lines[i:i + 5]
+        long_lines_count = sum(1 for l in next_five_lines if count_valid_words(l) > 10)  # noqa: E741
+        if log:
+            logger.debug(f"Next 5 lines from line {i}: {[l.strip() for l in next_five_lines]}")
+            logger.debug(f"Number of 'long' lines in the next 5: {long_lines_count}")
+
+        if long_lines_count >= 3:
+            toc_entries.extend({'heading': l, 'page_number': None} for l in next_five_lines if l.strip())
+            break
+
+        if line:
+            toc_entries.append({'heading': line, 'page_number': None})
+            if log:
+                logger.info(f"Added TOC entry: {line}")
+    return toc_entries
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "1.2", "3.4.5", "Chapter", "Part", "the", "of", "-", "(a)", "42"]
+
+def generate_toc_lines(count=700, long_share=0.1, seed=0):
+    """A TOC title followed by lines of 1-16 words, with about long_share of them long."""
+    rng = random.Random(seed)
+    lines = ["Contents"]
+    for _ in range(count - 1):
+        words = rng.randint(11, 16) if rng.random() < long_share else rng.randint(0, 10)
+        lines.append(' '.join(rng.choice(WORDS) for _ in range(words)))
+    return lines
+
+def extracted_inputs(folder=os.path.join('output', 'extracted_content'), limit=700):
+    inputs = []
+    for text_file in glob.glob(os.path.join(folder, '*.txt')):
+        with open(text_file, 'r', encoding='utf-8') as f:
+            inputs.append(f.read().splitlines()[:limit])
+    return inputs
+
+def check_equivalence(inputs):
+    return [lines for lines in inputs if legacy_take_toc_entries(lines, log=False) != take_toc_entries(lines)]
+
+def benchmark(lines, repeat=5, number=20):
+    results = {}
+    for name, function in (('legacy', legacy_take_toc_entries),
+                           ('legacy, no logging', lambda toc_lines: legacy_take_toc_entries(toc_lines, log=False)),
+                           ('rolling', take_toc_entries)):
+        results[name] = min(timeit.repeat(lambda: function(lines), number=number, repeat=repeat)) / number
+    return results
+
+if __name__ == "__main__":
+    inputs = [generate_toc_lines(seed=seed, long_share=share) for seed in range(200) for share in (0.0, 0.05, 0.2, 0.5)]
+    inputs += extracted_inputs()
+    print(f"Checking {len(inputs)} inputs...")
+    mismatches = check_equivalence(inputs)
+    print(f"{len(mismatches)} mismatches")
+
+    # No long lines: the whole 700-line input is scanned, the worst case for the original loop
+    lines = generate_toc_lines(long_share=0.0)
+    timings = benchmark(lines)
+    for name, seconds in timings.items():
+        print(f"{name:>18}: {seconds * 1000:.2f} ms per 700-line input")
+    for name in ('legacy', 'legacy, no logging'):
+        print(f"speedup vs {name}: {timings[name] / timings['rolling']:.2f}x")
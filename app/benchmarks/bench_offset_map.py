@@ -0,0 +1,72 @@
+"""
+Equivalence check and microbenchmark for Fitz_TOC_Extractor_1.apply_offset_map.
+
+apply_offset_map walks the current offset segment forward along the TOC and only searches
+for it again when a bookmark goes back before it; the original looked every bookmark's
+segment up with a bisect. This script checks both give the same TOC on generated TOCs
+(mostly ascending pages, some going back, front matter segments in Roman numerals), then
+times both (tests/test_offset_map.py runs the same check on smaller TOCs). Run from the
+app folder:
+
+    python -m benchmarks.bench_offset_map [--entries N] [--segments N] [--repeat N]
+"""
+import argparse
+import bisect
+import random
+import timeit
+from Fitz_TOC_Extractor_1 import OffsetSegment, apply_offset_map, int_to_roman
+
+def legacy_apply_offset_map(toc, segments, remove_negative_pages=False):
+    """The original implementation: a bisect over the segment starts for every bookmark."""
+    starts = [segment.start for segment in segments]
+    adjusted_toc = []
+    for level, title, page_number in toc:
+        segment = segments[max(bisect.bisect_right(starts, page_number) - 1, 0)]
+        adjusted_page_number = page_number - segment.shift
+        if remove_negative_pages and adjusted_page_number < 0:
+            continue
+        if segment.roman and adjusted_page_number > 0:
+            adjusted_page_number = int_to_roman(adjusted_page_number)
+        adjusted_toc.append((level, title, adjusted_page_number))
+    return adjusted_toc
+
+def generate_toc(entries, seed=0, backwards=0.02):
+    """A TOC of ascending bookmark pages where a share `backwards` of the entries jump back."""
+    rng = random.Random(seed)
+    toc, page = [], 1
+    for index in range(entries):
+        if rng.random() < backwards:
+            page = rng.randrange(-3, page + 1)
+        else:
+            page += rng.choice((0, 1, 1, 2, 5))
+        toc.append((rng.randrange(1, 4), f"Section {index}", page))
+    return toc
+
+def generate_segments(count, pages, seed=0):
+    """An offset map of count segments over pages, the first one for Roman numbered front matter."""
+    rng = random.Random(seed)
+    starts = sorted(rng.sample(range(2, max(pages, count + 1)), count - 1)) if count > 1 else []
+    return [OffsetSegment(1, 0, True)] + [OffsetSegment(start, rng.randrange(0, 30), False) for start in starts]
+
+def benchmark(toc, segments, repeat):
+    results = {}
+    for name, function in (('bisect', legacy_apply_offset_map), ('single pass', apply_offset_map)):
+        results[name] = min(timeit.repeat(lambda: function(toc, segments, True), number=1, repeat=repeat))
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--entries', type=int, default=200_000)
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    toc = generate_toc(args.entries)
+    segments = generate_segments(args.segments, toc[-1][2])
+    same = legacy_apply_offset_map(toc, segments, True) == apply_offset_map(toc, segments, True)
+    print(f"{args.entries} entries, {len(segments)} segments: {'same TOC' if same else 'TOC DIFFERS'}")
+
+    timings = benchmark(toc, segments, args.repeat)
+    for name, seconds in timings.items():
+        print(f"{name:>12}: {seconds * 1000:.1f} ms  ({args.entries / seconds:,.0f} entries/sec)")
+    print(f"speedup: {timings['bisect'] / timings['single pass']:.2f}x")
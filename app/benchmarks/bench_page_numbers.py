@@ -0,0 +1,94 @@
+"""
+Printed page number detection per page (what estimate_offset spends its time on):
+- two clips: the original, a clipped get_text("text") of the header and of the footer band;
+- header first: printed_page_number, which only extracts the footer when the header holds no number;
+- words pass: a single get_text("words") per page, its words bucketed into the two bands by
+  the vertical centre of their boxes.
+
+Times each on the largest synthetic document (benchmarks.synthetic_corpus, generated once
+and reused) or on the PDFs below --folder, alternating the methods over --repeat runs and
+keeping the best run of each, and counts the pages where a method finds another number
+than the two clips. Run from the app folder:
+
+    python -m benchmarks.bench_page_numbers [--folder pdfs] [--pages N] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import time
+import fitz  # PyMuPDF
+from benchmarks.synthetic_corpus import DEFAULT_CORPUS, generate_corpus
+from Fitz_TOC_Extractor_1 import extract_printed_page_number, printed_page_number
+
+def first_number(texts):
+    for text in texts:
+        number = extract_printed_page_number(text)
+        if number is not None:
+            return number, False
+    return None
+
+def two_clips(page, header_height=70, footer_height=50):
+    rect = page.rect
+    header_text = page.get_text("text", clip=fitz.Rect(rect.x0, rect.y0, rect.x1, rect.y0 + header_height))
+    footer_text = page.get_text("text", clip=fitz.Rect(rect.x0, rect.y1 - footer_height, rect.x1, rect.y1))
+    return first_number((header_text, footer_text))
+
+def words_pass(page, header_height=70, footer_height=50):
+    rect = page.rect
+    header_words, footer_words = [], []
+    for _, y0, _, y1, word, *_ in page.get_text("words"):
+        centre = (y0 + y1) / 2
+        if centre <= rect.y0 + header_height:
+            header_words.append(word)
+        if centre >= rect.y1 - footer_height:
+            footer_words.append(word)
+    return first_number((' '.join(header_words), ' '.join(footer_words)))
+
+METHODS = {'two clips': two_clips, 'header first': printed_page_number, 'words pass': words_pass}
+
+def benchmark(path, pages, repeat):
+    """(pages timed, {method: best seconds}, {method: pages differing from two clips})."""
+    with fitz.open(path) as doc:
+        page_numbers = range(0, len(doc), max(len(doc) // pages, 1) if pages else 1)
+        best, results = {}, {}
+        for _ in range(repeat):
+            for name, method in METHODS.items():
+                start = time.perf_counter()
+                results[name] = [method(doc[page_number]) for page_number in page_numbers]
+                seconds = time.perf_counter() - start
+                best[name] = min(best.get(name, seconds), seconds)
+    differing = {name: sum(a != b for a, b in zip(results['two clips'], numbers)) for name, numbers in results.items()}
+    return len(page_numbers), best, differing
+
+def report(label, page_count, seconds, differing):
+    print(f"{label[:45]:>45}: {page_count} pages, " + ", ".join(
+        f"{name} {seconds[name] / page_count * 1000:.3f} ms/page"
+        + ("" if name == 'two clips' else f" ({seconds['two clips'] / seconds[name]:.2f}x, {differing[name]} differ)")
+        for name in METHODS))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--folder', help="PDFs to use instead of the largest synthetic document")
+    parser.add_argument('--pages', type=int, default=0, help="pages per document, spread evenly (default: all)")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.folder:
+        paths = sorted(glob.glob(os.path.join(args.folder, '**', '*.pdf'), recursive=True))
+    else:
+        largest = max(DEFAULT_CORPUS, key=lambda document: document.pages)
+        paths = generate_corpus(os.path.join('output', 'benchmark_corpus'), [largest])
+
+    total_pages = 0
+    total_seconds = dict.fromkeys(METHODS, 0.0)
+    total_differing = dict.fromkeys(METHODS, 0)
+    for path in paths:
+        page_count, seconds, differing = benchmark(path, args.pages, args.repeat)
+        report(os.path.basename(path), page_count, seconds, differing)
+        total_pages += page_count
+        for name in METHODS:
+            total_seconds[name] += seconds[name]
+            total_differing[name] += differing[name]
+    if len(paths) > 1:
+        print()
+        report(f"{len(paths)} documents", total_pages, total_seconds, total_differing)
@@ -0,0 +1,104 @@
+"""
+Equivalence check and microbenchmark for Custom_TOC_Extractor_2.parse_toc_line.
+
+The current parser classifies each line and only tries the patterns that can match it.
+This script checks it returns exactly what the original first-match-wins loop over all
+patterns returned, on a large generated line corpus (plus any extracted_content files),
+then times both (tests/test_parse_toc_line.py runs the same check on a smaller set of lines).
+Run from the app folder:
+
+    python -m benchmarks.bench_parse_toc_line
+"""
+import glob
+import os
+import random
+import re
+import timeit
+from Custom_TOC_Extractor_2 import TOC_LINE_PATTERNS, parse_toc_line
+
+def legacy_parse_toc_line(line, next_line=None):
+    """The original implementation: every uncompiled pattern in turn, then again on line + next_line."""
+    for candidate in ([line, line + ' ' + next_line.strip()] if next_line else [line]):
+        for pattern in TOC_LINE_PATTERNS:
+            match = re.match(pattern, candidate)
+            if match:
+                numbering = match.groupdict().get('numbering', '').strip()
+                heading = match.group('heading').strip()
+                page = match.groupdict().get('page')
+                full_heading = f"{numbering} {heading}".strip() if numbering else heading
+                entry = {'heading': full_heading}
+                if page:
+                    entry['page_number'] = int(page)
+                else:
+                    entry['page_number'] = None
+                return entry
+    return None
+
+NUMBERINGS = ['', '1', '12', '3.', '4.2', '10.11', 'IV', 'XII.', 'C', 'PART 2', 'PART 3:', 'Chapter 7', 'A.', '(a)', '٣']
+HEADINGS = ['Introduction', 'Getting Started', 'The Art of War', 'Index', 'Contents', 'Lorem ipsum dolor sit amet',
+            'Appendix B', 'ch. 3', 'Notes on 1984', 'Vol. 2', 'C', 'I', 'X', '', 'Part One: Beginnings', 'Glossary']
+LEADERS = ['', ' ', '  ', ' .. ', ' ....... ', '.....', ' . . . ', '\t', ' ... ']
+PAGES = ['', '1', '7', '42', '305', 'xii', '12-14', '2019', '٤٥']
+TAILS = ['', ' ', '\n', ' Chapter 3', ' see also', '  ']
+
+def generate_lines(count, seed=42):
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        parts = [rng.choice(['', ' ', '  ', ' ']), rng.choice(NUMBERINGS)]
+        parts.append(rng.choice([' ', '', '  ']))
+        parts.append(rng.choice(HEADINGS))
+        parts.append(rng.choice(LEADERS))
+        parts.append(rng.choice(PAGES))
+        parts.append(rng.choice(TAILS))
+        lines.append(''.join(parts))
+    return lines
+
+def extracted_lines(folder=os.path.join('output', 'extracted_content'), limit=700):
+    lines = []
+    for text_file in glob.glob(os.path.join(folder, '*.txt')):
+        with open(text_file, 'r', encoding='utf-8') as f:
+            lines.extend(f.read().splitlines()[:limit])
+    return lines
+
+def call(parser, line, next_line):
+    try:
+        return parser(line, next_line)
+    except Exception as e:  # the original raises on some inputs; so must the new parser
+        return type(e).__name__
+
+def check_equivalence(lines):
+    mismatches = []
+    for i, line in enumerate(lines):
+        next_line = lines[i + 1] if i + 1 < len(lines) else None
+        for candidate_next in (None, next_line):
+            expected = call(legacy_parse_toc_line, line, candidate_next)
+            actual = call(parse_toc_line, line, candidate_next)
+            if expected != actual:
+                mismatches.append((line, candidate_next, expected, actual))
+    return mismatches
+
+def benchmark(lines, repeat=3):
+    pairs = [(line, lines[i + 1] if i + 1 < len(lines) else None) for i, line in enumerate(lines)]
+
+    def run(parser):
+        for line, next_line in pairs:
+            call(parser, line, next_line)
+
+    results = {}
+    for name, parser in (('legacy', legacy_parse_toc_line), ('compiled', parse_toc_line)):
+        results[name] = min(timeit.repeat(lambda: run(parser), number=1, repeat=repeat))
+    return results
+
+if __name__ == "__main__":
+    lines = generate_lines(100_000) + extracted_lines()
+    print(f"Checking {len(lines)} lines...")
+    mismatches = check_equivalence(lines)
+    for line, next_line, expected, actual in mismatches[:20]:
+        print(f"MISMATCH {line!r} + {next_line!r}: {expected!r} != {actual!r}")
+    print(f"{len(mismatches)} mismatches")
+
+    timings = benchmark(lines)
+    for name, seconds in timings.items():
+        print(f"{name:>8}: {seconds:.3f}s  ({len(lines) / seconds:,.0f} lines/sec)")
+    print(f"speedup: {timings['legacy'] / timings['compiled']:.2f}x")
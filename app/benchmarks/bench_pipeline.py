@@ -0,0 +1,175 @@
+"""
+Stage-by-stage benchmark of the TOC pipeline on the synthetic corpus (works offline).
+
+Generates the corpus with benchmarks.synthetic_corpus (once, it is reused afterwards),
+then runs each stage and the full final_process_pdfs in a fresh process and reports
+documents/sec, pages/sec and the peak RSS of that process and its workers. Stages run in
+pipeline order on one output folder, so every stage sees its real input. Run from the
+app folder:
+
+    python -m benchmarks.bench_pipeline [--quick] [--json results.json]
+"""
+import argparse
+import contextlib
+import glob
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import time
+from collections import namedtuple
+import fitz  # PyMuPDF
+from rich.console import Console
+from rich.table import Table
+from benchmarks.synthetic_corpus import DEFAULT_CORPUS, generate_corpus
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+console = Console()
+
+StageResult = namedtuple('StageResult', ['stage', 'documents', 'pages', 'seconds', 'peak_rss_mb'])
+
+STAGES = ['process_pdfs', 'extract_text_from_pdf', 'process_txt_files_in_directory',
+          'Filter_from_2nd_method_1', 'Filter_Two_Points_2', 'Filter_Remove_Extra_Text_3', 'final_process_pdfs']
+
+def _txt_names(folder):
+    return [os.path.splitext(os.path.basename(path))[0] for path in glob.glob(os.path.join(folder, '*.txt'))]
+
+def run_stage(stage, data_folder, output_folder, page_counts, options):
+    """Run one stage; returns (documents, pages) it processed."""
+    from Filtering_Structuring_3 import filter_folders, run_filter_1, run_filter_2, run_filter_3
+    folders = filter_folders(output_folder)
+
+    if stage == 'process_pdfs':
+        from Fitz_TOC_Extractor_1 import process_pdfs
+        process_pdfs(data_folder, os.path.join(output_folder, '01'), options['header_height'], options['footer_height'],
+                     True, offset_mode=options['offset_mode'], workers=options['workers'])
+        return len(page_counts), sum(page_counts.values())
+
+    if stage == 'extract_text_from_pdf':
+        from Custom_TOC_Extractor_2 import extract_text_from_pdf
+        os.makedirs(folders['extracted'], exist_ok=True)
+        pages = 0
+        for name in page_counts:
+            result = extract_text_from_pdf(os.path.join(data_folder, f"{name}.pdf"), folders['extracted'],
+                                           lazy=options['lazy'], engine=options['engine'])
+            pages += result.pages_extracted
+        return len(page_counts), pages
+
+    if stage == 'final_process_pdfs':
+        from main import final_process_pdfs
+        full_output_folder = os.path.join(output_folder, 'full_run')
+        shutil.rmtree(full_output_folder, ignore_errors=True)
+        final_process_pdfs(data_folder, full_output_folder, options['header_height'], options['footer_height'], True,
+                           offset_mode=options['offset_mode'], workers=options['workers'],
+                           lazy_extraction=options['lazy'], text_engine=options['engine'])
+        return len(page_counts), sum(page_counts.values())
+
+    # Text stages: pages are those of the source PDFs of the files they read
+    if stage == 'process_txt_files_in_directory':
+        from Custom_TOC_Extractor_2 import process_txt_files_in_directory
+        input_folder = folders['extracted']
+        process_txt_files_in_directory(input_folder, folders['txt'])
+    else:
+        input_folder, runner = {
+            'Filter_from_2nd_method_1': (folders['txt'], run_filter_1),
+            'Filter_Two_Points_2': (folders['01'], run_filter_2),
+            'Filter_Remove_Extra_Text_3': (folders['02'], run_filter_3),
+        }[stage]
+        runner(folders)
+    names = _txt_names(input_folder)
+    return len(names), sum(page_counts.get(name, 0) for name in names)
+
+def peak_rss_mb():
+    """Peak RSS of this process and of its finished children, in MB (None where unsupported)."""
+    if resource is None:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def _stage_process(stage, data_folder, output_folder, page_counts, options, results):
+    try:
+        with open(os.devnull, 'w', encoding='utf-8') as devnull:
+            with contextlib.redirect_stdout(sys.stdout if options['verbose'] else devnull):
+                start = time.perf_counter()
+                documents, pages = run_stage(stage, data_folder, output_folder, page_counts, options)
+                seconds = time.perf_counter() - start
+        results.put(StageResult(stage, documents, pages, seconds, peak_rss_mb()))
+    except Exception as e:
+        results.put(f"{type(e).__name__}: {e}")
+
+def measure_stage(stage, data_folder, output_folder, page_counts, options):
+    """Run a stage in a freshly spawned process so its peak RSS is its own."""
+    context = mp.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_stage_process,
+                              args=(stage, data_folder, output_folder, page_counts, options, results))
+    process.start()
+    try:
+        result = results.get()
+    except KeyboardInterrupt:
+        process.terminate()
+        raise
+    process.join()
+    if not isinstance(result, StageResult):
+        raise RuntimeError(f"Stage {stage} failed: {result}")
+    return result
+
+def benchmark(corpus_folder, output_folder, documents=DEFAULT_CORPUS, stages=STAGES, **options):
+    options = {'header_height': 70, 'footer_height': 50, 'offset_mode': "sample", 'workers': None,
+               'lazy': True, 'engine': "pdfplumber", 'verbose': False, **options}
+
+    console.print(f"[cyan]Preparing {len(documents)} synthetic PDFs in {corpus_folder}...[/]")
+    # The benchmark folder only holds the selected documents, so every stage sees exactly these
+    data_folder = os.path.join(output_folder, 'data')
+    shutil.rmtree(output_folder, ignore_errors=True)
+    os.makedirs(data_folder)
+    page_counts = {}
+    for path in generate_corpus(corpus_folder, documents):
+        shutil.copy(path, data_folder)
+        with fitz.open(path) as doc:
+            page_counts[os.path.splitext(os.path.basename(path))[0]] = doc.page_count
+
+    results = []
+    for stage in stages:
+        console.print(f"[cyan]Running {stage}...[/]")
+        results.append(measure_stage(stage, data_folder, output_folder, page_counts, options))
+
+    table = Table(title=f"Pipeline benchmark: {len(page_counts)} PDFs, {sum(page_counts.values())} pages",
+                  show_header=True, header_style="bold magenta")
+    table.add_column("Stage", style="cyan", no_wrap=True)
+    for column in ("Docs", "Pages", "Seconds", "Docs/sec", "Pages/sec", "Peak RSS (MB)"):
+        table.add_column(column, justify="right")
+    for result in results:
+        rate = (lambda count: f"{count / result.seconds:,.1f}") if result.seconds else (lambda count: "-")
+        table.add_row(result.stage, str(result.documents), str(result.pages), f"{result.seconds:.2f}",
+                      rate(result.documents), rate(result.pages),
+                      f"{result.peak_rss_mb:.0f}" if result.peak_rss_mb is not None else "-")
+    console.print(table)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every pipeline stage on a synthetic PDF corpus.")
+    parser.add_argument('--corpus', default=os.path.join('output', 'benchmark_corpus'), help="Folder of the generated PDFs")
+    parser.add_argument('--output', default=os.path.join('output', 'benchmark_run'), help="Output folder of the runs (recreated)")
+    parser.add_argument('--quick', action='store_true', help="Skip the documents over 1,000 pages")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=STAGES)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--engine', default="pdfplumber")
+    parser.add_argument('--eager', action='store_true', help="Extract every page instead of stopping after the TOC")
+    parser.add_argument('--verbose', action='store_true', help="Show the output of the stages")
+    parser.add_argument('--json', help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    documents = [document for document in DEFAULT_CORPUS if not (args.quick and document.pages > 1000)]
+    results = benchmark(args.corpus, args.output, documents, args.stages, workers=args.workers,
+                        lazy=not args.eager, engine=args.engine, verbose=args.verbose)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump([result._asdict() for result in results], f, indent=2)
@@ -0,0 +1,61 @@
+"""
+TOC anchor selection: the shared single-pass locator versus the original per-phrase scans.
+
+Generates extracted texts whose TOC is preceded by a decoy: a "Contents" running header or
+body mention before a "CONTENTS" or "Table of Contents" title, or a back-matter Index.
+Reports how often each method starts at the real TOC title, then times both on the
+first 700 lines of a long text. Run from the app folder:
+
+    python -m benchmarks.bench_toc_anchor
+"""
+import random
+import timeit
+from utils.toc_anchor import TOC_PHRASES, best_anchor
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit", "sed", "do"]
+
+def legacy_anchor(text, phrases=TOC_PHRASES):
+    """Offset of the first phrase of the list found anywhere in text, as extract_toc_entries did."""
+    for phrase in phrases:
+        start = text.find(phrase)
+        if start != -1:
+            return start
+    return None
+
+def prose(rng, lines):
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(6, 12))) for _ in range(lines)]
+
+def generate_text(rng, decoy, title):
+    """(text, offset of the real TOC title) for one decoy layout."""
+    before = prose(rng, rng.randint(3, 30))
+    if decoy == 'running header':
+        before = ["Contents"] + before
+    elif decoy == 'mention':
+        before.insert(len(before) // 2, "the Contents of this book are " + ' '.join(prose(rng, 1)))
+    toc = [title] + [f"{index + 1} {' '.join(rng.choice(WORDS) for _ in range(3))} {'.' * 8} {index * 7 + 1}"
+                     for index in range(rng.randint(21, 40))]
+    after = prose(rng, 60)
+    if decoy == 'index':
+        after += ["Index"] + [f"{rng.choice(WORDS)}, {rng.randint(1, 300)}" for _ in range(40)]
+    text = '\n'.join(before) + '\n'
+    return text + '\n'.join(toc + after), len(text)
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    cases = [(decoy, title, *generate_text(rng, decoy, title))
+             for decoy in ('none', 'running header', 'mention', 'index')
+             for title in ("Table of Contents", "CONTENTS")
+             for _ in range(100)]
+    for decoy in ('none', 'running header', 'mention', 'index'):
+        selected = [case for case in cases if case[0] == decoy]
+        legacy = sum(legacy_anchor(text) == start for _, _, text, start in selected)
+        shared = sum(best_anchor(text).start == start for _, _, text, start in selected)
+        print(f"{decoy:>15}: real TOC found by per-phrase scans {legacy}/{len(selected)}, "
+              f"by the scored anchor {shared}/{len(selected)}")
+
+    # Timing on a 700-line text whose TOC title comes late and is the last phrase tried
+    text = '\n'.join(prose(rng, 600)) + '\n' + generate_text(rng, 'none', "CONTENTS")[0]
+    text = '\n'.join(text.split('\n')[:700])
+    for name, function in (('per-phrase scans', legacy_anchor), ('scored anchor', best_anchor)):
+        seconds = min(timeit.repeat(lambda: function(text), number=200, repeat=5)) / 200
+        print(f"{name:>16}: {seconds * 1e6:.1f} us per 700-line text")
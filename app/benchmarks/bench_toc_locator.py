@@ -0,0 +1,72 @@
+"""
+Text fallback of PDFs without bookmarks: extracting only the TOC pages found by
+utils.toc_locator versus extracting the whole document (and lazily, until the TOC is done).
+
+Generates the synthetic corpus (benchmarks.synthetic_corpus, reused afterwards) and, for
+every document without bookmarks, or every PDF without bookmarks below --folder, times the
+pdfplumber extraction each way on a freshly opened PDFSession (the located time includes
+the locator itself) and checks that the TOC built from the located pages is the one built
+from the full text. Run from the app folder:
+
+    python -m benchmarks.bench_toc_locator [--folder pdfs] [--repeat N]
+"""
+import argparse
+import glob
+import os
+import time
+from benchmarks.synthetic_corpus import DEFAULT_CORPUS, generate_corpus
+from utils.pdf_session import PDFSession
+from Custom_TOC_Extractor_2 import extract_toc_pages, build_toc_text_with_quality
+
+MODES = (('full', dict(lazy=False)), ('lazy', dict(lazy=True)), ('located', dict(lazy=True, locate=True)))
+
+def timed_extraction(pdf_path, options, repeat):
+    """(ExtractedPages, best seconds) of extract_toc_pages on a new session per run."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        with PDFSession(pdf_path) as session:
+            extracted = extract_toc_pages(session, engine="pdfplumber", **options)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    return extracted, best
+
+def toc_text(extracted):
+    return build_toc_text_with_quality('\n'.join(extracted.texts))[0]
+
+def documents_without_bookmarks(folder):
+    if folder is None:
+        paths = generate_corpus(os.path.join('output', 'benchmark_corpus'))
+        return [path for path, document in zip(paths, DEFAULT_CORPUS) if not document.bookmarks]
+    paths = []
+    for path in sorted(glob.glob(os.path.join(folder, '**', '*.pdf'), recursive=True)):
+        with PDFSession(path) as session:
+            if not session.doc.get_toc():
+                paths.append(path)
+    return paths
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--folder', help="PDFs to use instead of the synthetic corpus")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    totals = {name: 0.0 for name, _ in MODES}
+    same = 0
+    paths = documents_without_bookmarks(args.folder)
+    for path in paths:
+        results = {name: timed_extraction(path, options, args.repeat) for name, options in MODES}
+        for name, (_, seconds) in results.items():
+            totals[name] += seconds
+        located = results['located'][0]
+        matches = toc_text(located) == toc_text(results['full'][0])
+        same += matches
+        print(f"{os.path.basename(path)[:40]:>40}: "
+              + ", ".join(f"{name} {seconds * 1000:.0f} ms ({extracted.pages_extracted} pages)"
+                          for name, (extracted, seconds) in results.items())
+              + f", TOC pages from {located.first_page}, {'same TOC' if matches else 'TOC differs'}")
+
+    print(f"\n{len(paths)} documents, same TOC for {same}")
+    for name, seconds in totals.items():
+        speedup = '' if name == 'full' else f" ({totals['full'] / seconds:.1f}x faster than full)"
+        print(f"{name:>8}: {seconds:.2f} s{speedup}")
@@ -0,0 +1,94 @@
+"""
+Deterministic synthetic PDF corpus for the benchmarks, generated locally with fitz.
+
+Every document has a title page, optional TOC pages (dot leaders or numbered sections),
+body pages with a printed page number in the header or footer, and optionally bookmarks
+pointing at the chapter starts. Printed page 1 is the first body page, so the page offset
+equals the number of front matter pages.
+"""
+import os
+import random
+from collections import namedtuple
+import fitz  # PyMuPDF
+
+# toc_style: "dots" ("1 Title ........ 12"), "numbered" ("1.2 Title 12") or None for no TOC page
+# page_numbers: "header" or "footer"
+CorpusDocument = namedtuple('CorpusDocument', ['name', 'pages', 'bookmarks', 'toc_style', 'page_numbers'])
+
+DEFAULT_CORPUS = [
+    CorpusDocument('bm_dots_footer_10', 10, True, 'dots', 'footer'),
+    CorpusDocument('bm_numbered_header_60', 60, True, 'numbered', 'header'),
+    CorpusDocument('bm_notoc_footer_300', 300, True, None, 'footer'),
+    CorpusDocument('nobm_dots_footer_40', 40, False, 'dots', 'footer'),
+    CorpusDocument('nobm_numbered_header_150', 150, False, 'numbered', 'header'),
+    CorpusDocument('nobm_dots_header_1000', 1000, False, 'dots', 'header'),
+    CorpusDocument('bm_dots_footer_5000', 5000, True, 'dots', 'footer'),
+]
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "adipiscing", "elit",
+         "sed", "do", "eiusmod", "tempor", "incididunt", "ut", "labore", "magna"]
+TOPICS = ["Foundations", "Methods", "Analysis", "Results", "Design", "Practice", "Theory", "Review"]
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+TOC_LINES_PER_PAGE = 45
+BODY_LINES_PER_PAGE = 30
+
+def chapter_titles(document, rng):
+    """(title, printed start page) of every chapter; about one chapter per 10 body pages."""
+    count = max(3, min(document.pages // 10, 400))
+    body_pages = max(document.pages - 1 - toc_page_count(document, count), 1)
+    step = max(body_pages // count, 1)
+    return [(f"{rng.choice(TOPICS)} of {rng.choice(WORDS).title()} {rng.choice(WORDS)}", 1 + index * step)
+            for index in range(count)]
+
+def toc_page_count(document, chapter_count):
+    if not document.toc_style:
+        return 0
+    return -(-(chapter_count + 1) // TOC_LINES_PER_PAGE)
+
+def toc_line(index, title, page, style):
+    if style == 'dots':
+        return f"{index + 1} {title} {'.' * 12} {page}"
+    return f"{index // 3 + 1}.{index % 3 + 1} {title} {page}"
+
+def generate_document(document, path, seed=0):
+    rng = random.Random(f"{seed}:{document.name}")
+    chapters = chapter_titles(document, rng)
+    front_matter = 1 + toc_page_count(document, len(chapters))
+    chapter_starts = {start: title for title, start in chapters}
+
+    doc = fitz.open()
+    title_page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+    title_page.insert_text((72, 300), document.name.replace('_', ' ').title(), fontsize=24)
+
+    # TOC pages, the heading on the first one
+    toc_lines = (["Table of Contents" if document.toc_style == 'dots' else "Contents"]
+                 + [toc_line(index, title, start, document.toc_style) for index, (title, start) in enumerate(chapters)])
+    for first in range(0, len(toc_lines) if document.toc_style else 0, TOC_LINES_PER_PAGE):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        page.insert_text((72, 90), '\n'.join(toc_lines[first:first + TOC_LINES_PER_PAGE]), fontsize=10, lineheight=1.4)
+
+    # Body pages with the printed page number in the header or footer
+    number_y = 40 if document.page_numbers == 'header' else PAGE_HEIGHT - 25
+    for printed in range(1, document.pages - front_matter + 1):
+        page = doc.new_page(width=PAGE_WIDTH, height=PAGE_HEIGHT)
+        lines = [' '.join(rng.choice(WORDS) for _ in range(11)) for _ in range(BODY_LINES_PER_PAGE)]
+        if printed in chapter_starts:
+            lines[0] = chapter_starts[printed]
+        page.insert_text((72, 110), '\n'.join(lines), fontsize=10, lineheight=1.5)
+        page.insert_text((PAGE_WIDTH / 2, number_y), str(printed), fontsize=9)
+
+    if document.bookmarks:
+        doc.set_toc([[1, title, min(start + front_matter, doc.page_count)] for title, start in chapters])
+    doc.save(path, garbage=3, deflate=True)
+    doc.close()
+
+def generate_corpus(folder, documents=DEFAULT_CORPUS, seed=0):
+    """Write the corpus PDFs into folder (existing files are reused) and return their paths."""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for document in documents:
+        path = os.path.join(folder, f"{document.name}.pdf")
+        if not os.path.exists(path):
+            generate_document(document, path, seed)
+        paths.append(path)
+    return paths
@@ -1,141 +1,132 @@
 import os
-import re
-import shutil
-import glob
 from functools import partial
-import threading
-import multiprocessing as mp
 from rich.console import Console
 from rich.panel import Panel
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import as_completed
 from Fitz_TOC_Extractor_1 import process_pdfs as process_manual_toc
 # from custom_function_to_extract_pdf_2 import process_pdfs_in_directory as process_custom_toc
-from Custom_TOC_Extractor_2 import process_txt_files_in_directory, extract_text_from_pdf, progress_monitor
+from Custom_TOC_Extractor_2 import process_txt_files_in_directory, extract_text_from_pdf
 # from custom_function_to_extract_pdf_21 import process_txt_files_in_directory, extract_text_pages
 from Filtering_Structuring_3 import filtering_main_3
+from pipeline import PipelineConfig, run_pipeline, cache_config, STAGE_FOLDERS
+from utils.metrics import write_metrics, metrics_summary_table
+from utils.result_cache import ResultCache
+from utils.final_manifest import FinalManifest, FINAL_SOURCES, MANIFEST_FILE, materialize as materialize_final
+from utils.worker_pool import pool_for
+from utils.progress import board_for
+from utils.toc_quality import needs_text_fallback, needs_filters, MIN_BOOKMARK_TOC_LINES
 
 console = Console()
 
-def extract_text_from_failed_pdfs(failed_pdfs_folder, extracted_output_folder):
+def extract_text_from_failed_pdfs(pdf_files, extracted_output_folder, lazy=False, engine="pdfplumber", pool=None, progress="rich", locate=False, metrics=None, workers=None, recycle_after=None):
+    """
+    Extract the text of the given PDF paths in parallel, straight from where they are stored,
+    with the given text extraction engine ("pdfplumber" or "fitz").
+    With lazy=True each PDF is only extracted until its TOC can no longer change, with
+    locate=True only its TOC pages are extracted when utils.toc_locator finds them.
+    The PDFs run on the given WorkerPool, or on a new one of `workers` processes (default: one
+    per CPU) recycled after recycle_after PDFs; workers=1 extracts them one by one in this process.
+    progress is "rich" (aggregate bar), "json" (periodic status lines) or None.
+    The StageMetrics of every PDF are appended to the metrics list when given.
+    """
     os.makedirs(extracted_output_folder, exist_ok=True)
     
-    # Get list of PDF files
-    pdf_files = glob.glob(os.path.join(failed_pdfs_folder, '*.pdf'))
-    
     if not pdf_files:
         print("No PDF files found in the specified folder.")
         return
     
-    # Create a multiprocessing queue for progress updates
-    manager = mp.Manager()
-    progress_queue = manager.Queue()
-    
-    # Start the progress monitor in a separate thread
     total_pdfs = len(pdf_files)
-    progress_thread = threading.Thread(
-        target=progress_monitor, 
-        args=(progress_queue, total_pdfs)
-    )
-    progress_thread.start()
-    
-    print("\n", "#"*70)
-    print(f"\n**** Extracting text from {total_pdfs} PDFs using {mp.cpu_count()} processes ****\n")
+    names = [os.path.splitext(os.path.basename(pdf_file))[0] for pdf_file in pdf_files]
     
-    # Process PDFs in parallel using ProcessPoolExecutor
     extract_func = partial(extract_text_from_pdf, 
                          extracted_output_folder=extracted_output_folder,
-                         progress_queue=progress_queue)
+                         lazy=lazy,
+                         engine=engine,
+                         locate=locate)
     
     results = []
-    with ProcessPoolExecutor(max_workers=mp.cpu_count()) as executor:
-        # Submit all PDF processing jobs
-        future_to_pdf = {
-            executor.submit(extract_func, pdf_file): pdf_file 
-            for pdf_file in pdf_files
-        }
-        
-        # Collect results as they complete
-        for future in as_completed(future_to_pdf):
-            success, filename = future.result()
-            results.append((success, filename))
-    
-    # Wait for progress monitor to finish
-    progress_thread.join()
+    with pool_for(pool, workers, total_pdfs, recycle_after) as executor:
+        print("\n", "#"*70)
+        print(f"\n**** Extracting text from {total_pdfs} PDFs with {engine} using {executor.workers if executor else 1} processes ****\n")
+
+        # Workers write their page counts into the board's shared slots
+        with board_for(names, progress) as board:
+            slots = board.slots if board else [None] * total_pdfs
+            if executor is None:
+                completed = (extract_func(pdf_file, progress=slot) for pdf_file, slot in zip(pdf_files, slots))
+            else:
+                future_to_pdf = {
+                    executor.submit(extract_func, pdf_file, progress=slot): pdf_file
+                    for pdf_file, slot in zip(pdf_files, slots)
+                }
+                # Collect results as they complete
+                completed = (future.result() for future in as_completed(future_to_pdf))
+
+            for result in completed:
+                results.append(result)
+                if metrics is not None:
+                    metrics.extend(result.metrics)
     
     # Print summary
-    successful = sum(1 for success, _ in results if success)
+    successful = sum(1 for result in results if result.success)
     failed = total_pdfs - successful
     
     print("\n", "#"*70)
     print("\nProcessing Summary:")
     print(f"- Successfully processed: {successful} PDFs")
     print(f"- Failed to process: {failed} PDFs")
+    for result in sorted(results, key=lambda result: result.filename):
+        print(f"  {result.filename}: extracted {result.pages_extracted} of {result.total_pages} pages")
     print("#" * 70)
 
-def check_for_numbered_lines(toc_file):
-    """Check if there are at least 50 consecutive lines that contain numbers and not words."""
-    with open(toc_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-        
-    numbered_line_count = 0
-
-    for line in lines:
-        line = line.strip()
-        
-        # Use regex to check if line contains at least one digit and no letters
-        if re.search(r'\d', line) and not re.search(r'[a-zA-Z]', line):
-            numbered_line_count += 1
-
-            # If we hit 50 numbered lines, return True
-            if numbered_line_count >= 50:
-                return True
-        else:
-            numbered_line_count = 0  # Reset if line contains letters or no digits
-            
-    return False
-
-
-def create_final_output(output_folder):
-    # Define folder paths
-    folder_03 = os.path.join(output_folder, 'Filters_03', '03')
-    folder_02 = os.path.join(output_folder, '02')
-    folder_01 = os.path.join(output_folder, '01')
+def create_final_output(output_folder, names=None, materialize="link", manifest=None):
+    """
+    Pick the best TOC of every document (Filters_03/03, then 02, then 01), record it in the
+    final manifest and put it into Final_Output with the given materialize mode ("link",
+    "copy", or None to only record it). With names (file names without extension), only
+    those documents are handled. Saves and returns the manifest.
+    """
+    if manifest is None:
+        manifest = FinalManifest(output_folder)
     final_output_folder = os.path.join(output_folder, 'Final_Output')
-
-    # Create the final output folder if it doesn't exist
     os.makedirs(final_output_folder, exist_ok=True)
 
-    # Track the files already copied
-    copied_files = set()
-
-    # Step 1: Copy all files from folder_03
-    for file_name in os.listdir(folder_03):
-        src_file = os.path.join(folder_03, file_name)
-        dest_file = os.path.join(final_output_folder, file_name)
-        shutil.copy2(src_file, dest_file)
-        copied_files.add(file_name)
-
-    # Step 2: Copy only files from folder_02 not in folder_03
-    for file_name in os.listdir(folder_02):
-        if file_name not in copied_files:
-            src_file = os.path.join(folder_02, file_name)
-            dest_file = os.path.join(final_output_folder, file_name)
-            shutil.copy2(src_file, dest_file)
-            copied_files.add(file_name)
-
-    # Step 3: Copy only files from folder_01 not in folder_02 or folder_03
-    for file_name in os.listdir(folder_01):
-        if file_name not in copied_files:
-            src_file = os.path.join(folder_01, file_name)
-            dest_file = os.path.join(final_output_folder, file_name)
-            shutil.copy2(src_file, dest_file)
-
-    console.print(Panel("Output has been saved to the Final_output folder.", 
+    # One scan per stage folder; the first (best) stage holding a document's TOC wins
+    best = {}
+    for source in FINAL_SOURCES:
+        folder = os.path.join(output_folder, STAGE_FOLDERS[source])
+        if not os.path.isdir(folder):
+            continue
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                name, extension = os.path.splitext(entry.name)
+                if extension == '.txt' and (names is None or name in names):
+                    best.setdefault(name, (source, entry.path))
+
+    for name in (best if names is None else names):
+        if name in best:
+            source, source_path = best[name]
+            final_file = os.path.join(final_output_folder, f"{name}.txt")
+            manifest.record(name, source, materialize_final(source_path, final_file, materialize))
+        else:
+            manifest.record(name, None)
+    manifest.save()
+
+    console.print(Panel(_output_message(materialize is not None), 
                        style="bold green", 
                        subtitle="Process Complete"))
+    return manifest
+
+def _output_message(materialized):
+    if not materialized:
+        return f"The final TOCs are listed in {MANIFEST_FILE}."
+    return "Output has been saved to the Final_output folder."
+
+def _final_file(output_folder, pdf_filename):
+    return os.path.join(output_folder, 'Final_Output', f"{os.path.splitext(pdf_filename)[0]}.txt")
 
 # Main process function that orchestrates everything
-def final_process_pdfs(data_folder, output_folder, header_height=70, footer_height=50, remove_negative_pages=False):
+def final_process_pdfs(data_folder, output_folder, header_height=70, footer_height=50, remove_negative_pages=False, offset_mode="sample", workers=None, lazy_extraction=True, text_engine="pdfplumber", in_memory=False, persist_artifacts=False, cache_folder=None, cache_max_bytes=512 * 1024 * 1024, staged=False, pool=None, progress="rich", metrics_file=None, trace=None, materialize="link", locate_toc=False, recycle_after=None):
     """
     Process all PDFs, first trying the manual TOC extraction method.
     If the TOC extraction fails (No TOC, or N/A), or the TOC offset is zero, or the TOC has <=30 lines, 
@@ -146,17 +137,117 @@ def final_process_pdfs(data_folder, output_folder, header_height=70, footer_heig
     - remove_negative_pages: Boolean to remove TOC entries with negative page numbers.
     - header_height: Height of the header to extract text from.
     - footer_height: Height of the footer to extract text from.
+    - offset_mode: "sample" to estimate the page offset from a stratified sample of pages (scanning the rest when the
+      sample has no clear majority, so the offset is always the one of "full"), "full" to scan every page,
+      "segments" to scan every page and give front matter numbered on its own (e.g. in Roman numerals) its own offset.
+    - workers: Number of worker processes (default: one per CPU, 1 runs the manual TOC extractor serially).
+    - lazy_extraction: Stop extracting the text of a failed PDF once its TOC can no longer change.
+    - text_engine: Text extraction engine for the failed PDFs, "pdfplumber" or "fitz".
+    - in_memory: Only write Final_Output, not the intermediate files of every stage.
+    - persist_artifacts: With in_memory, still write the intermediate files of every stage for debugging.
+    - cache_folder: Folder of a persistent result cache; unchanged PDFs are served from it into Final_Output.
+    - cache_max_bytes: Size limit of the result cache, enforced by evicting least recently used entries.
+    - staged: Run each stage over the whole batch before the next one (the original folder-based flow).
+    - pool: A utils.worker_pool.WorkerPool to run on, e.g. one kept across calls; by default one
+      pool is started for this call and shared by all stages.
+    - recycle_after: Replace each worker process of the pool started for this call after this many
+      PDFs, which bounds the memory long batches leave in the workers (Python 3.11+).
+    - progress: "rich" for one aggregate progress bar with the slowest PDFs in flight, "json" for a
+      JSON status line every few seconds (headless runs), None for no progress output.
+    - metrics_file: Where the per-document, per-stage metrics (wall and CPU time, pages, lines, RSS
+      change of the process over the stage) are written as JSON lines; default metrics.jsonl in output_folder.
+    - trace: None (default) for no filter diagnostics, "suspicious" to write the decision trace of the
+      PDFs with no or a very short final TOC to output_folder/traces, "all" for every PDF. The staged
+      run writes the full traces to the Filters_03 log folders instead.
+    - materialize: How the final TOCs are put into Final_Output: "link" (default) hard-links the stage
+      file (copying where linking fails; a later run replaces stage files instead of rewriting them),
+      "copy" copies it, None leaves Final_Output alone and only records the stage file in
+      output_folder/final_manifest.json. In the pipeline run the final TOC is written to Final_Output
+      unless materialize is None and the stage files are persisted. Cache hits are copied to
+      Final_Output, or with None recorded as the cached file (valid until the cache evicts it).
+    - locate_toc: In the text fallback, only extract the TOC pages of a PDF found from its page
+      layout (utils.toc_locator), falling back to the whole PDF when none are found. Off by default,
+      as a TOC the locator cuts short can differ from the one of the full extraction.
+
+    By default every PDF goes through all stages on its own (pipeline.iter_tocs) and its final
+    TOC is written as soon as it is done; the final TOCs are the same as in the staged run.
     """
     # Create the output folder if it doesn't exist
     os.makedirs(output_folder, exist_ok=True)
+    os.makedirs(os.path.join(output_folder, 'Final_Output'), exist_ok=True)
+
+    config = PipelineConfig(header_height, footer_height, remove_negative_pages, offset_mode, lazy_extraction, text_engine, trace, locate_toc)
+    filenames = [filename for filename in os.listdir(data_folder) if filename.endswith(".pdf")]
+    manifest = FinalManifest(output_folder)
+
+    # Serve unchanged PDFs straight from the cache and only process the rest
+    cache = ResultCache(cache_folder, cache_max_bytes) if cache_folder else None
+    if cache:
+        cache_keys = {filename: cache.key_for(os.path.join(data_folder, filename), cache_config(config))
+                      for filename in filenames}
+        uncached = []
+        for filename in filenames:
+            name, key = os.path.splitext(filename)[0], cache_keys[filename]
+            final_file = _final_file(output_folder, filename)
+            if not cache.fetch(key, final_file, materialize):
+                uncached.append(filename)
+            elif cache.toc_path(key) is None:
+                manifest.record(name, None)
+            # Without materialize the manifest points at the cached TOC itself
+            else:
+                manifest.record(name, 'cache', final_file if materialize is not None else cache.toc_path(key))
+        filenames = uncached
+
+    failed = set()
+    with pool_for(pool, workers, len(filenames), recycle_after) as stage_pool:
+        if staged:
+            process_pdfs_in_folders(data_folder, output_folder, config, workers=workers, filenames=filenames, pool=stage_pool, progress=progress,
+                                    materialize=materialize, manifest=manifest, metrics_file=metrics_file,
+                                    recycle_after=recycle_after)
+        else:
+            persist = persist_artifacts or not in_memory
+            # Without persisted stage files the final TOC has to be written to Final_Output
+            materialized = materialize is not None or not persist
+            results = run_pipeline(data_folder, output_folder, config, workers=workers,
+                                   persist=persist, filenames=filenames, pool=stage_pool,
+                                   progress=progress, metrics_file=metrics_file,
+                                   manifest=manifest, materialize=materialized)
+            failed = {result.filename for result in results if result.error is not None}
+            console.print(Panel(_output_message(materialized),
+                               style="bold green",
+                               subtitle="Process Complete"))
+    manifest.save()
+
+    if cache:
+        # A failed PDF is not cached as having no TOC, so the next run tries it again
+        for filename in filenames:
+            if filename not in failed:
+                cache.store(cache_keys[filename], manifest.path_of(os.path.splitext(filename)[0]))
+        cache.save()
+        console.print(Panel(cache.summary(), style="bold cyan", subtitle="Result Cache"))
+
+def process_pdfs_in_folders(data_folder, output_folder, config, workers=None, filenames=None, pool=None, progress="rich", materialize="link", manifest=None, metrics_file=None, recycle_after=None):
+    """
+    Directory-based run: every stage reads its input from and writes its output to the
+    stage folders below output_folder, then create_final_output assembles Final_Output
+    (see its materialize and manifest). Only the given filenames are processed when set.
+    Both PDF stages run on pool when given, otherwise on pools of `workers` processes recycled
+    after recycle_after PDFs (workers=1 runs them in this process). Returns the final manifest.
+    The per-document, per-stage metrics are written as in run_pipeline, to metrics_file
+    (default: metrics.jsonl in output_folder).
+    """
+    header_height, footer_height, remove_negative_pages, offset_mode, lazy_extraction, text_engine, trace, locate_toc = config
+    if filenames is None:
+        filenames = [filename for filename in os.listdir(data_folder) if filename.endswith(".pdf")]
+    names = {os.path.splitext(filename)[0] for filename in filenames}
 
     # Output folder for manual TOC extractor (renamed to 01)
     manual_output_folder = os.path.join(output_folder, "01")
     os.makedirs(manual_output_folder, exist_ok=True)
 
-    # Temporary folder for PDFs with failed TOC extraction (renamed to 02)
-    failed_pdfs_folder = os.path.join(output_folder, "02")
-    os.makedirs(failed_pdfs_folder, exist_ok=True)
+    # Folder for the TOCs of PDFs with failed TOC extraction (renamed to 02)
+    failed_toc_folder = os.path.join(output_folder, "02")
+    os.makedirs(failed_toc_folder, exist_ok=True)
 
     # Folder for extracted text files from failed PDFs
     extracted_output_folder = os.path.join(output_folder, "extracted_content")
@@ -164,77 +255,65 @@ def final_process_pdfs(data_folder, output_folder, header_height=70, footer_heig
 
     # Use a set to avoid duplicates
     failed_pdfs = set()
+    records = []
 
-    def manual_toc_callback(pdf_name, toc_status, offset=0):
-        """Callback function to track failed TOC extraction results and zero offset cases."""
+    def manual_toc_callback(pdf_name, toc_status, offset=0, quality=None):
+        """Track failed TOC extractions, and weak TOCs from the quality of the saved TOC file."""
         if toc_status in ["N/A", "No TOC"]:
             print ('')
             failed_pdfs.add(pdf_name)
+        # New Condition 4: TOCs with line count <=25, or 50 consecutive numbered lines
+        elif quality is not None and needs_text_fallback(quality):
+            failed_pdfs.add(pdf_name)
+            if quality.line_count <= MIN_BOOKMARK_TOC_LINES:
+                print(f"\nAdded '{pdf_name}' to failed PDFs due to TOC line count <= 30.")
+            else:
+                print(f"\nAdded '{pdf_name}' to failed PDFs due to 50 consecutive numbered lines.")
 
     print("Processing PDFs with the manual TOC extractor...")
     
     # Run the manual TOC extractor and track failed PDFs
-    process_manual_toc(data_folder, manual_output_folder, header_height, footer_height, remove_negative_pages, callback=manual_toc_callback)
-
-    # New Condition 4: Check TOC text files for line count <=30
-    toc_text_files = glob.glob(os.path.join(manual_output_folder, '*.txt'))
-    for toc_file in toc_text_files:
-        try:
-            with open(toc_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-            line_count = len(lines)
-            if line_count <= 25:
-                # Extract the corresponding PDF filename
-                pdf_filename = os.path.splitext(os.path.basename(toc_file))[0] + '.pdf'
-                if pdf_filename not in failed_pdfs:
-                    failed_pdfs.add(pdf_filename)
-                    print(f"\nAdded '{pdf_filename}' to failed PDFs due to TOC line count <= 30.")
-            elif check_for_numbered_lines(toc_file):
-                pdf_filename = os.path.splitext(os.path.basename(toc_file))[0] + '.pdf'
-                if pdf_filename not in failed_pdfs:
-                    failed_pdfs.add(pdf_filename)
-                    print(f"\nAdded '{pdf_filename}' to failed PDFs due to 50 consecutive numbered lines.")
-        except Exception as e:
-            print(f"Error reading '{toc_file}': {e}")
-            # Optionally, add to failed_pdfs if TOC file can't be read
-            pdf_filename = os.path.splitext(os.path.basename(toc_file))[0] + '.pdf'
-            failed_pdfs.add(pdf_filename)
+    process_manual_toc(data_folder, manual_output_folder, header_height, footer_height, remove_negative_pages, callback=manual_toc_callback, offset_mode=offset_mode, workers=workers, filenames=filenames, pool=pool,
+                      metrics=records, recycle_after=recycle_after)
     
     second_script_ran = False
     if failed_pdfs:
         print(f"❌Found {len(failed_pdfs)} failed from first method:", ", ".join(failed_pdfs))
 
-        # Copy failed PDFs to the folder for custom processing (don't remove from data folder)
+        # Read the failed PDFs directly from the data folder (no copy into the 02 folder)
+        failed_pdf_paths = []
         for failed_pdf in failed_pdfs:
             original_pdf_path = os.path.join(data_folder, failed_pdf)
             if os.path.exists(original_pdf_path):
-                failed_pdf_copy_path = os.path.join(failed_pdfs_folder, failed_pdf)
-                shutil.copy2(original_pdf_path, failed_pdf_copy_path)
+                failed_pdf_paths.append(original_pdf_path)
             else:
                 print(f"Warning: '{failed_pdf}' not found in '{data_folder}'.")
 
         # Step 1: Extract content from the failed PDFs and save as text files
-        extract_text_from_failed_pdfs(failed_pdfs_folder, extracted_output_folder)
+        extract_text_from_failed_pdfs(failed_pdf_paths, extracted_output_folder, lazy=lazy_extraction, engine=text_engine, pool=pool, progress=progress,
+                                      locate=locate_toc, metrics=records, workers=workers,
+                                      recycle_after=recycle_after)
 
         # Step 2: Process the extracted text files to generate TOC and save to the 02 folder
-        process_txt_files_in_directory(extracted_output_folder)
+        qualities = process_txt_files_in_directory(extracted_output_folder, failed_toc_folder, metrics=records)
+        short_tocs = [f"{name}.txt" for name, quality in qualities.items() if needs_filters(quality)]
         second_script_ran = True
-
-        # Cleanup: delete only the PDF files from the 02 folder
-        pdf_files_in_failed_folder = glob.glob(os.path.join(failed_pdfs_folder, '*.pdf'))
-        for pdf_file in pdf_files_in_failed_folder:
-            try:
-                os.remove(pdf_file)
-            except Exception as e:
-                print(f"Error deleting '{pdf_file}': {e}")
     else:
         print("All PDFs processed successfully with the manual TOC extractor.")
     
     if second_script_ran:
         print("\nRunning the Filtering_Structuring_3 script...")
-        filtering_main_3()
-    
-    create_final_output(output_folder)
+        filtering_main_3(output_folder, trace=bool(trace), short_tocs=short_tocs, metrics=records)
+
+    # Only this run's documents (the filter folders can hold earlier ones), in input order as in the pipeline run
+    order = {filename: index for index, filename in enumerate(filenames)}
+    records = [record for record in records if record.document in order]
+    records.sort(key=lambda record: order[record.document])
+    write_metrics(metrics_file or os.path.join(output_folder, 'metrics.jsonl'), records)
+    if records:
+        console.print(metrics_summary_table(records))
+
+    return create_final_output(output_folder, names, materialize=materialize, manifest=manifest)
 
 # Example usage
 if __name__ == "__main__":
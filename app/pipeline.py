@@ -0,0 +1,369 @@
+"""
+Per-document pipeline: every PDF flows through the manual TOC extractor, the text fallback
+and the Filters_03 stages as Python objects, and its final TOC is available as soon as that
+one PDF is done (iter_tocs streams them). The routing between stages is the same as in the
+staged run (main.process_pdfs_in_folders), so the final TOC is byte-identical to it.
+Intermediate artifacts are written to their usual folders only when persisting.
+"""
+import io
+import os
+from collections import namedtuple
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from functools import partial
+from rich.console import Console
+from rich.table import Table
+from rich import box
+from Fitz_TOC_Extractor_1 import build_toc, format_toc
+from Custom_TOC_Extractor_2 import extract_toc_pages, build_toc_text_with_quality, TOC_LINE_BUDGET
+from utils.pdf_session import PDFSession
+from utils.worker_pool import pool_for
+from utils.progress import board_for
+from utils.metrics import MetricsRecorder, write_metrics, metrics_summary_table, line_count
+from utils.trace import trace_for
+from utils.final_manifest import FINAL_SOURCES, replacing
+from utils.extracted_text import write_extracted_text
+from utils.toc_quality import read_lines, text_quality, needs_text_fallback, needs_filters
+from utils.Filters_03 import Filter_from_2nd_method_1 as filter_1
+from utils.Filters_03 import Filter_Two_Points_2 as filter_2
+from utils.Filters_03 import Filter_Remove_Extra_Text_3 as filter_3
+
+console = Console()
+
+# Bump whenever a change to any stage can change the final TOCs; it is part of the result cache key
+PIPELINE_VERSION = 1
+
+# Options of a pipeline run, with the same defaults as final_process_pdfs
+# (trace is one of utils.trace.TRACE_MODES and does not affect the TOCs; locate_toc extracts
+# only the TOC pages found by utils.toc_locator in the text fallback)
+PipelineConfig = namedtuple(
+    'PipelineConfig',
+    ['header_height', 'footer_height', 'remove_negative_pages', 'offset_mode', 'lazy_extraction', 'text_engine', 'trace',
+     'locate_toc'],
+    defaults=[70, 50, False, "sample", True, "pdfplumber", None, False]
+)
+
+# Outcome for one PDF: source is the output folder the final TOC comes from, None if there is no TOC.
+# entries are the lines of the final TOC, timings the seconds spent per stage (and 'total'),
+# metrics the utils.metrics.StageMetrics of every step that ran, trace the decision trace text
+# when config.trace selected this document (otherwise None), error the exception that stopped
+# the document ("Type: message", toc_status ERROR_STATUS), None when it went through.
+DocumentResult = namedtuple('DocumentResult', ['filename', 'toc_status', 'offset', 'source', 'final_text',
+                                               'path', 'entries', 'timings', 'metrics', 'trace', 'error'],
+                            defaults=[(), None, None])
+ERROR_STATUS = "Error"
+
+# Output folder of each stage, relative to the output folder
+STAGE_FOLDERS = {
+    '01': '01',
+    'extracted_content': 'extracted_content',
+    '02': '02',
+    'Filters_03/01': os.path.join('Filters_03', '01'),
+    'Filters_03/02': os.path.join('Filters_03', '02'),
+    'Filters_03/03': os.path.join('Filters_03', '03'),
+}
+
+def cache_config(config):
+    """Everything that affects a document's final TOC, as used in the result cache key."""
+    return {
+        'header_height': config.header_height,
+        'footer_height': config.footer_height,
+        'remove_negative_pages': config.remove_negative_pages,
+        'offset_mode': config.offset_mode,
+        'text_engine': config.text_engine,
+        'locate_toc': config.locate_toc,
+        'pipeline_version': PIPELINE_VERSION,
+    }
+
+# Documents whose final TOC has fewer lines than this are suspicious; trace="suspicious" keeps their traces
+SUSPICIOUS_MAX_LINES = 5
+
+def is_suspicious(source, final_text):
+    """Whether a document ended with no final TOC or a very short one."""
+    return source is None or line_count(final_text) < SUSPICIOUS_MAX_LINES
+
+def as_read_back(text):
+    """The text a file written with `text` returns when read back in text mode (universal newlines)."""
+    return io.StringIO(text, newline=None).read()
+
+class _Artifacts:
+    """Writes intermediate artifacts of one document when persisting, otherwise does nothing."""
+
+    def __init__(self, output_folder, name):
+        self.output_folder = output_folder
+        self.name = name
+
+    def write(self, stage, text):
+        if self.output_folder is None:
+            return
+        folder = os.path.join(self.output_folder, STAGE_FOLDERS[stage])
+        os.makedirs(folder, exist_ok=True)
+        with replacing(os.path.join(folder, f"{self.name}.txt")) as temp_path, \
+                open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def write_pages(self, stage, page_texts, first_page=0):
+        """Write a stage's page texts as extract_text_from_pdf does (joined, with a page index)."""
+        if self.output_folder is None:
+            return
+        folder = os.path.join(self.output_folder, STAGE_FOLDERS[stage])
+        os.makedirs(folder, exist_ok=True)
+        write_extracted_text(os.path.join(folder, f"{self.name}.txt"), page_texts, first_page)
+
+def _run_filter_2(text, trace):
+    trace.log("--- Filter_Two_Points_2 ---")
+    return ''.join(filter_2.process_lines(read_lines(text), trace))
+
+def _run_filter_3(text, trace):
+    trace.log("--- Filter_Remove_Extra_Text_3 ---")
+    processed_lines = filter_3.process_lines(read_lines(text), trace)
+    # Filter 3 keeps its input unchanged when it returns nothing
+    return ''.join(processed_lines) if processed_lines else text
+
+def failed_result(pdf_path, error, seconds=0.0):
+    """DocumentResult of a PDF that could not be processed; error is the exception."""
+    return DocumentResult(os.path.basename(pdf_path), ERROR_STATUS, None, None, None, pdf_path, [],
+                          {'total': seconds}, error=f"{type(error).__name__}: {error}")
+
+def process_document(pdf_path, config=PipelineConfig(), persist_folder=None, progress=None):
+    """
+    Run one PDF through every stage in memory and return its DocumentResult.
+    With persist_folder set, intermediate artifacts are also written below it.
+    progress is an optional utils.progress.ProgressSlot that gets this document's page counts.
+    A PDF that fails in any stage (e.g. it cannot be opened) gives a failed_result instead of
+    raising, so one bad PDF does not stop the batch.
+    """
+    start = time.perf_counter()
+    try:
+        return _process_document(pdf_path, config, persist_folder, progress)
+    except Exception as e:
+        return failed_result(pdf_path, e, time.perf_counter() - start)
+
+def _process_document(pdf_path, config, persist_folder, progress):
+    filename = os.path.basename(pdf_path)
+    name = os.path.splitext(filename)[0]
+    artifacts = _Artifacts(persist_folder, name)
+    metrics = MetricsRecorder(filename)
+    trace = trace_for(config.trace)
+    outputs = {}
+    timings = {}
+    start = stage_start = time.perf_counter()
+
+    def stage_done(stage):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage] = now - stage_start
+        stage_start = now
+
+    with PDFSession(pdf_path) as session:
+        # Stage 1: bookmarks adjusted by the printed page offset
+        toc_status, offset, toc = build_toc(session, config.header_height, config.footer_height,
+                                            config.remove_negative_pages, config.offset_mode, metrics)
+        needs_fallback = toc_status == "No TOC"
+        if not needs_fallback:
+            outputs['01'] = format_toc(toc)
+            artifacts.write('01', outputs['01'])
+            needs_fallback = needs_text_fallback(text_quality(outputs['01']))
+        trace.log("Stage 1: %s, offset %s, %d bookmarks; text fallback: %s", toc_status, offset, len(toc), needs_fallback)
+        stage_done('01')
+
+        # Stage 2: text fallback, reusing the already open document
+        if needs_fallback:
+            with metrics.stage('extract_text_from_pdf') as counters:
+                try:
+                    text_chunks, first_page, counters.pages, _ = extract_toc_pages(
+                        session, config.lazy_extraction, config.text_engine,
+                        on_progress=progress.update if progress else None, locate=config.locate_toc)
+                    extracted_text = '\n'.join(text_chunks)
+                    counters.lines = line_count(extracted_text)
+                except Exception as e:
+                    console.print(f"[red]Text extraction failed for {filename}: {e}[/]")
+                    extracted_text = None
+            stage_done('extracted_content')
+
+            if extracted_text is not None:
+                artifacts.write_pages('extracted_content', text_chunks, first_page)
+                extracted_text = as_read_back(extracted_text)
+                with metrics.stage('extract_toc_entries') as counters:
+                    outputs['02'], quality = build_toc_text_with_quality(extracted_text)
+                    counters.lines = min(line_count(extracted_text), TOC_LINE_BUDGET)
+                artifacts.write('02', outputs['02'])
+                trace.log("Stage 2: %d TOC lines from the extracted text", quality.line_count)
+                stage_done('02')
+
+                # Stage 3: Filters_03 for short fallback TOCs
+                if needs_filters(quality):
+                    with metrics.stage('Filter_from_2nd_method_1') as counters:
+                        trace.log("--- Filter_from_2nd_method_1 ---")
+                        outputs['Filters_03/01'] = filter_1.filter_document(extracted_text, trace)
+                        counters.lines = min(line_count(extracted_text), TOC_LINE_BUDGET)
+                    with metrics.stage('Filter_Two_Points_2') as counters:
+                        outputs['Filters_03/02'] = _run_filter_2(outputs['Filters_03/01'], trace)
+                        counters.lines = line_count(outputs['Filters_03/01'])
+                    with metrics.stage('Filter_Remove_Extra_Text_3') as counters:
+                        outputs['Filters_03/03'] = _run_filter_3(outputs['Filters_03/02'], trace)
+                        counters.lines = line_count(outputs['Filters_03/02'])
+                    for stage in ('Filters_03/01', 'Filters_03/02', 'Filters_03/03'):
+                        artifacts.write(stage, outputs[stage])
+                    stage_done('Filters_03')
+
+    timings['total'] = time.perf_counter() - start
+
+    # Same precedence as create_final_output: Filters_03/03, then 02, then 01
+    source = next((source for source in FINAL_SOURCES if source in outputs), None)
+    final_text = outputs.get(source)
+    trace_text = None
+    if trace and (config.trace == "all" or is_suspicious(source, final_text)):
+        trace.log("Final TOC from %s: %d lines", source, line_count(final_text))
+        trace_text = trace.text()
+    entries = final_text.splitlines() if final_text is not None else []
+    return DocumentResult(filename, toc_status, offset, source, final_text, pdf_path, entries, timings,
+                          metrics.records, trace_text)
+
+def _run_document(pdf_path, progress, config, persist_folder):
+    """process_document, with the document's progress slot marked running and then done or failed."""
+    if progress is None:
+        return process_document(pdf_path, config, persist_folder)
+    progress.start()
+    try:
+        result = process_document(pdf_path, config, persist_folder, progress)
+    except BaseException:
+        progress.finish(ok=False)
+        raise
+    progress.finish(ok=result.error is None)
+    return result
+
+def iter_tocs(pdf_paths, config=PipelineConfig(), workers=None, persist_folder=None, ordered=False, pool=None, progress=None):
+    """
+    Yield the DocumentResult of every PDF as soon as it is final, in completion order (input
+    order with ordered=True). Documents run on the given WorkerPool, or on a new pool of
+    `workers` processes (default: one per CPU, 1 runs them one by one in this process). At
+    most a few documents per worker are in flight, so results stream out of large batches.
+    Closing the generator cancels the documents that have not started yet.
+    progress is an optional utils.progress.ProgressBoard whose slots follow pdf_paths.
+    A document whose worker fails (e.g. a crashed process) is yielded as a failed_result.
+    """
+    pdf_paths = list(pdf_paths)
+    slots = progress.slots if progress else [None] * len(pdf_paths)
+    worker = partial(_run_document, config=config, persist_folder=persist_folder)
+    with pool_for(pool, workers, len(pdf_paths)) as executor:
+        if executor is None:
+            yield from map(worker, pdf_paths, slots)
+            return
+        if ordered:
+            futures = [_submit(executor, worker, pdf_path, slot) for pdf_path, slot in zip(pdf_paths, slots)]
+            try:
+                for pdf_path, future in zip(pdf_paths, futures):
+                    yield _result_of(future, pdf_path)
+            finally:
+                for future in futures:
+                    future.cancel()
+            return
+        pending = zip(pdf_paths, slots)
+        in_flight = {}
+        try:
+            while True:
+                for pdf_path, slot in pending:
+                    in_flight[_submit(executor, worker, pdf_path, slot)] = pdf_path
+                    if len(in_flight) >= executor.workers * 4:
+                        break
+                if not in_flight:
+                    return
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield _result_of(future, in_flight.pop(future))
+        finally:
+            # Only this call's documents are dropped; a shared pool keeps running
+            for future in in_flight:
+                future.cancel()
+
+def _submit(executor, worker, pdf_path, slot):
+    """executor.submit, or a future holding the error when the pool cannot take the task (e.g. it is broken)."""
+    try:
+        return executor.submit(worker, pdf_path, slot)
+    except Exception as e:
+        future = Future()
+        future.set_exception(e)
+        return future
+
+def _result_of(future, pdf_path):
+    """The DocumentResult of a finished future, or a failed_result when its worker failed."""
+    try:
+        return future.result()
+    except Exception as e:
+        return failed_result(pdf_path, e)
+
+def run_pipeline(data_folder, output_folder, config=PipelineConfig(), workers=None, persist=False, filenames=None, pool=None, progress="rich", metrics_file=None, manifest=None, materialize=True):
+    """
+    Run every PDF in data_folder (or only the given filenames) through iter_tocs, write each
+    final TOC to Final_Output as soon as it is final and print a results table. Returns the
+    DocumentResults in input order. progress is "rich", "json" or None (see utils.progress).
+    A PDF that fails is reported and left without a final TOC; the others go on.
+    Each final TOC is recorded in manifest (a utils.final_manifest.FinalManifest) when given.
+    With materialize=False and persist, Final_Output is not written: the manifest points at the
+    persisted stage file instead.
+    The per-document, per-stage metrics are written as JSON lines to metrics_file (default:
+    metrics.jsonl in output_folder) and summarized in a second table. Decision traces selected
+    by config.trace are written to the traces folder in output_folder.
+    """
+    final_output_folder = os.path.join(output_folder, 'Final_Output')
+    os.makedirs(final_output_folder, exist_ok=True)
+
+    if filenames is None:
+        filenames = [filename for filename in os.listdir(data_folder) if filename.endswith(".pdf")]
+    pdf_paths = [os.path.join(data_folder, filename) for filename in filenames]
+
+    results = {}
+    with board_for(filenames, progress, title="Processing PDFs") as board:
+        for result in iter_tocs(pdf_paths, config, workers, output_folder if persist else None, pool=pool, progress=board):
+            name = os.path.splitext(result.filename)[0]
+            if result.error is not None:
+                console.print(f"[red]Processing failed for {result.filename}: {result.error}[/]")
+            if result.final_text is None:
+                final_file = None
+            elif persist and not materialize:
+                final_file = os.path.join(output_folder, STAGE_FOLDERS[result.source], f"{name}.txt")
+            else:
+                final_file = os.path.join(final_output_folder, f"{name}.txt")
+                if os.path.lexists(final_file):
+                    os.remove(final_file)  # may be a hard link to a stage file of an earlier run
+                with open(final_file, 'w', encoding='utf-8') as f:
+                    f.write(result.final_text)
+            if manifest is not None:
+                manifest.record(name, result.source, final_file)
+            if result.trace is not None:
+                os.makedirs(os.path.join(output_folder, 'traces'), exist_ok=True)
+                trace_file = os.path.join(output_folder, 'traces', f"{name}.log")
+                with open(trace_file, 'w', encoding='utf-8') as f:
+                    f.write(result.trace)
+            results[result.path] = result
+    results = [results[pdf_path] for pdf_path in pdf_paths]
+
+    table = Table(
+        show_header=True,
+        header_style="bold cyan",
+        box=box.ROUNDED,
+        title="[bold yellow]Pipeline Results",
+        title_justify="center"
+    )
+    table.add_column("Index", style="dim", width=6, justify="right")
+    table.add_column("Filename", style="bold", width=40)
+    table.add_column("Stage 1", justify="center", width=12)
+    table.add_column("Final TOC from", justify="center", width=16)
+    table.add_column("Time", justify="right", width=8)
+    for index, result in enumerate(results, start=1):
+        if result.toc_status == "No TOC":
+            status = "[yellow]No TOC[/]"
+        elif result.error is not None:
+            status = "[red]Error[/]"
+        else:
+            status = f"[green]Offset: {result.offset}[/]" if result.offset is not None else "[blue]Offset: 0[/]"
+        table.add_row(str(index), result.filename, status, result.source or "[red]none[/]",
+                      f"{result.timings['total']:.2f}s")
+    console.print(table)
+
+    records = [record for result in results for record in result.metrics]
+    write_metrics(metrics_file or os.path.join(output_folder, 'metrics.jsonl'), records)
+    if records:
+        console.print(metrics_summary_table(records))
+    return results
@@ -0,0 +1,250 @@
+"""
+Local HTTP extraction service: POST a PDF, get its TOC back as JSON.
+
+PDFs are processed by pipeline.process_document on a pool of worker processes that are
+started and warmed up (fitz, pdfplumber and the extractors imported) before the server
+accepts requests. At most workers + queue_size requests are admitted at once; the rest
+are rejected with 503 so callers can back off. When a worker process dies the pool is
+replaced and the request retried once. Run from the app folder:
+
+    python server.py --port 8765
+
+Endpoints:
+    POST /toc?filename=book.pdf   body: the PDF bytes       -> TOC JSON
+    GET  /stats                   request and latency stats -> JSON
+    GET  /health                                            -> {"status": "ok"}
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import deque
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from pipeline import PipelineConfig
+from utils.worker_pool import WorkerPool, PRELOAD_MODULES
+from utils.metrics import percentile
+
+MAX_UPLOAD_BYTES = 200 * 1024 * 1024
+
+def extract_toc(pdf_bytes, filename, config):
+    """Worker task: run one uploaded PDF through the pipeline and return the JSON-ready result."""
+    from pipeline import process_document
+    with tempfile.TemporaryDirectory() as scratch_folder:
+        pdf_path = os.path.join(scratch_folder, 'upload.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(pdf_bytes)
+        result = process_document(pdf_path, config)
+    if result.error is not None:
+        raise RuntimeError(result.error)
+    return {
+        'filename': filename,
+        'toc_status': result.toc_status,
+        'offset': result.offset,
+        'source': result.source,
+        'entries': result.entries,
+        'timings': result.timings,
+    }
+
+class LatencyStats:
+    """Counters plus the latencies of the last `window` requests, safe to update from handler threads."""
+
+    def __init__(self, window=1000):
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=window)
+        self.queue_waits = deque(maxlen=window)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.pool_restarts = 0
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def record(self, latency, queue_wait, ok=True):
+        """Finish a request started with begin()."""
+        with self.lock:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            self.queue_waits.append(queue_wait)
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def restart(self):
+        with self.lock:
+            self.pool_restarts += 1
+
+    def snapshot(self):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            queue_waits = sorted(self.queue_waits)
+            summary = {'completed': self.completed, 'failed': self.failed, 'rejected': self.rejected,
+                       'in_flight': self.in_flight, 'pool_restarts': self.pool_restarts}
+        for name, values in (('latency', latencies), ('queue_wait', queue_waits)):
+            summary[name] = {f"p{int(fraction * 100)}": percentile(values, fraction) for fraction in (0.5, 0.95, 0.99)}
+            summary[name]['max'] = values[-1] if values else None
+        return summary
+
+class TOCServer(ThreadingHTTPServer):
+    """HTTP server owning the warm worker pool, the admission limit and the stats."""
+
+    daemon_threads = True
+
+    def __init__(self, address, workers=None, queue_size=16, config=PipelineConfig(), recycle_after=None):
+        # Bind first, so a port in use fails before any worker process is started
+        # (a failed bind calls server_close, which then has no pool to shut down)
+        self.pool = None
+        super().__init__(address, TOCRequestHandler)
+        try:
+            self.pool = self._new_pool(workers, recycle_after)
+        except BaseException:
+            super().server_close()
+            raise
+        self.pool_lock = threading.Lock()
+        self.workers = self.pool.workers
+        self.recycle_after = recycle_after
+        self.config = config
+        self.slots = threading.BoundedSemaphore(self.workers + queue_size)
+        self.stats = LatencyStats()
+
+    @staticmethod
+    def _new_pool(workers, recycle_after):
+        return WorkerPool(workers, recycle_after, PRELOAD_MODULES + ('pipeline',)).warm()
+
+    def extract(self, pdf_bytes, filename):
+        """
+        Run extract_toc on the pool. A worker that dies breaks the whole pool, so a broken
+        pool is replaced (once, by whichever request finds it first) and the task retried once.
+        """
+        pool = self.pool
+        try:
+            return pool.submit(extract_toc, pdf_bytes, filename, self.config).result()
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            return self.pool.submit(extract_toc, pdf_bytes, filename, self.config).result()
+
+    def _replace_pool(self, broken_pool):
+        with self.pool_lock:
+            if self.pool is not broken_pool:
+                return  # another request replaced it already
+            self.pool = self._new_pool(self.workers, self.recycle_after)
+            self.stats.restart()
+        broken_pool.shutdown(cancel_futures=True)
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+
+class TOCRequestHandler(BaseHTTPRequestHandler):
+
+    def send_json(self, status, payload, headers=()):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self.send_json(200, {'status': 'ok'})
+        elif path == '/stats':
+            stats = self.server.stats.snapshot()
+            stats['workers'] = self.server.workers
+            self.send_json(200, stats)
+        else:
+            self.send_json(404, {'error': f"Unknown path {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/toc':
+            self.send_json(404, {'error': f"Unknown path {url.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if not 0 < length <= MAX_UPLOAD_BYTES:
+            self.send_json(413 if length else 400, {'error': f"Expected a PDF body of 1 to {MAX_UPLOAD_BYTES} bytes"})
+            return
+        filename = parse_qs(url.query).get('filename', ['upload.pdf'])[0]
+
+        server = self.server
+        # Admit before reading the body, so a full server does not buffer uploads it will reject
+        if not server.slots.acquire(blocking=False):
+            server.stats.reject()
+            # The unread body is still on the socket, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json(503, {'error': "Server busy, retry later"},
+                           headers=[('Retry-After', '1'), ('Connection', 'close')])
+            return
+        error = None
+        try:
+            pdf_bytes = self.rfile.read(length)
+            server.stats.begin()
+            start = time.perf_counter()
+            try:
+                result = server.extract(pdf_bytes, filename)
+            except Exception as e:
+                error = e
+        finally:
+            # Released before answering, so the server is idle again once the caller has its reply
+            server.slots.release()
+
+        if error is not None:
+            server.stats.record(time.perf_counter() - start, 0.0, ok=False)
+            self.send_json(500, {'error': f"{type(error).__name__}: {error}"})
+            return
+
+        latency = time.perf_counter() - start
+        # Whatever the request did not spend in the worker it spent waiting for one
+        queue_wait = max(latency - result['timings']['total'], 0.0)
+        server.stats.record(latency, queue_wait)
+        result['latency'] = latency
+        self.send_json(200, result)
+
+    def log_message(self, format, *args):
+        pass
+
+def request_toc(pdf_path, url="http://127.0.0.1:8765", timeout=300):
+    """Client helper: upload a PDF to a running server and return the decoded JSON response."""
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    filename = urllib.request.quote(os.path.basename(pdf_path))
+    request = urllib.request.Request(f"{url}/toc?filename={filename}", data=pdf_bytes,
+                                     headers={'Content-Type': 'application/pdf'}, method='POST')
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve TOC extraction over HTTP.")
+    parser.add_argument('--host', default="127.0.0.1")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument('--queue-size', type=int, default=16, help="Requests allowed to wait for a worker")
+    parser.add_argument('--recycle-after', type=int, default=None, help="Replace each worker after this many PDFs")
+    parser.add_argument('--remove-negative-pages', action='store_true')
+    args = parser.parse_args()
+
+    config = PipelineConfig(remove_negative_pages=args.remove_negative_pages)
+    server = TOCServer((args.host, args.port), args.workers, args.queue_size, config, args.recycle_after)
+    print(f"Serving TOC extraction on http://{args.host}:{args.port} with {server.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,49 @@
+"""Final_Output hard links keep their TOC when a later staged run rewrites the stage files."""
+import json
+import os
+from benchmarks.synthetic_corpus import CorpusDocument, generate_corpus
+from main import final_process_pdfs
+from utils.final_manifest import MANIFEST_FILE, replacing
+
+FIRST = CorpusDocument('nobm_dots_footer_40', 40, False, 'dots', 'footer')
+SECOND = CorpusDocument('nobm_numbered_header_20', 20, False, 'numbered', 'header')
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+def test_later_run_keeps_linked_final_output(tmp_path):
+    first_data, second_data = str(tmp_path / 'first'), str(tmp_path / 'second')
+    output_folder = str(tmp_path / 'output')
+    generate_corpus(first_data, [FIRST])
+    generate_corpus(second_data, [SECOND])
+
+    final_process_pdfs(first_data, output_folder, staged=True, workers=1, progress=None, materialize="link")
+    with open(os.path.join(output_folder, MANIFEST_FILE), encoding='utf-8') as f:
+        assert json.load(f)['documents'][FIRST.name]['source'] == 'Filters_03/03'
+    final_file = os.path.join(output_folder, 'Final_Output', f"{FIRST.name}.txt")
+    stage_file = os.path.join(output_folder, 'Filters_03', '03', f"{FIRST.name}.txt")
+    assert os.path.samefile(final_file, stage_file)
+    final_toc = read(final_file)
+
+    # The text stages run over every file in their folders, so the second run rewrites the
+    # first document's stage files too; here from a changed extracted text
+    text_file = os.path.join(output_folder, 'extracted_content', f"{FIRST.name}.txt")
+    text = read(text_file)
+    assert 'Design of' in text
+    with open(text_file, 'w', encoding='utf-8') as f:
+        f.write(text.replace('Design of', 'Redesign of'))
+    final_process_pdfs(second_data, output_folder, staged=True, workers=1, progress=None, materialize="link")
+
+    assert read(stage_file) != final_toc
+    assert read(final_file) == final_toc
+
+def test_replacing_leaves_links_alone(tmp_path):
+    path, link = str(tmp_path / 'stage.txt'), str(tmp_path / 'final.txt')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("old\n")
+    os.link(path, link)
+    with replacing(path) as temp_path, open(temp_path, 'w', encoding='utf-8') as f:
+        f.write("new\n")
+    assert read(path) == "new\n" and read(link) == "old\n"
+    assert sorted(os.listdir(tmp_path)) == ["final.txt", "stage.txt"]
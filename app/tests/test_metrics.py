@@ -0,0 +1,57 @@
+"""Per-document metrics: the staged run records the same stages as the pipeline run."""
+import json
+import os
+import pytest
+from benchmarks.synthetic_corpus import CorpusDocument, generate_corpus
+from main import final_process_pdfs
+from utils.metrics import MetricsRecorder
+
+# Bookmarks with a short TOC and no bookmarks: every stage, Filters_03 included, runs for one of them
+CORPUS = [
+    CorpusDocument('bm_dots_footer_10', 10, True, 'dots', 'footer'),
+    CorpusDocument('nobm_dots_footer_40', 40, False, 'dots', 'footer'),
+]
+
+def read_metrics(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+@pytest.fixture(scope='module')
+def metrics_by_run(tmp_path_factory):
+    data_folder = str(tmp_path_factory.mktemp('data'))
+    generate_corpus(data_folder, CORPUS)
+    metrics = {}
+    for staged in (True, False):
+        output_folder = str(tmp_path_factory.mktemp('staged' if staged else 'pipeline'))
+        final_process_pdfs(data_folder, output_folder, workers=1, staged=staged, progress=None)
+        metrics[staged] = read_metrics(os.path.join(output_folder, 'metrics.jsonl'))
+    return metrics
+
+def test_staged_run_writes_document_records(metrics_by_run):
+    documents = {record['document'] for record in metrics_by_run[True]}
+    assert documents == {f"{document.name}.pdf" for document in CORPUS}
+    stages = {record['stage'] for record in metrics_by_run[True]}
+    assert {'extract_pdf_toc', 'extract_text_from_pdf', 'extract_toc_entries', 'Filter_Remove_Extra_Text_3'} <= stages
+
+def test_staged_records_match_pipeline(metrics_by_run):
+    def counts(records):
+        return sorted((record['document'], record['stage'], record['pages'], record['lines']) for record in records)
+    assert counts(metrics_by_run[True]) == counts(metrics_by_run[False])
+
+def test_rss_is_measured_per_stage(metrics_by_run):
+    for records in metrics_by_run.values():
+        assert all(isinstance(record['rss_delta_mb'], float) for record in records)
+        assert not any('peak_rss_mb' in key for record in records for key in record)
+
+def test_rss_delta_covers_only_the_stage():
+    recorder = MetricsRecorder('book.pdf')
+    with recorder.stage('allocate'):
+        block = bytearray(64 * 1024 * 1024)
+        block[::4096] = b'x' * len(block[::4096])
+    with recorder.stage('idle'):
+        pass
+    allocate, idle = recorder.records
+    assert allocate.rss_delta_mb > 32
+    # A lifetime peak would still show the 64 MB here
+    assert abs(idle.rss_delta_mb) < 16
+    del block
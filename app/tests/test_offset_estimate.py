@@ -0,0 +1,43 @@
+"""estimate_offset: mode="sample" must agree with mode="full" when the sample has no clear majority."""
+from collections import Counter
+import fitz  # PyMuPDF
+import pytest
+from Fitz_TOC_Extractor_1 import estimate_offset, sample_page_order
+
+PAGE_COUNT = 100
+FULL_OFFSET = 5
+
+def offset_of(page_num):
+    """Offset printed on a page: FULL_OFFSET on the front and back pages the sample skips,
+    and a mix on the body where FULL_OFFSET is the rarest offset and none has a majority."""
+    body = sample_page_order(PAGE_COUNT)
+    if page_num not in body:
+        return FULL_OFFSET
+    return (0, 0, FULL_OFFSET, 10, 20, 10, 20)[page_num % 7]
+
+@pytest.fixture
+def disputed_pdf(tmp_path):
+    path = tmp_path / "disputed.pdf"
+    doc = fitz.open()
+    for page_num in range(PAGE_COUNT):
+        page = doc.new_page(width=595, height=842)
+        page.insert_text((72, 400), "lorem ipsum dolor sit amet", fontsize=10)
+        page.insert_text((297, 830), str(page_num + 1 + offset_of(page_num)), fontsize=9)
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+def test_sampled_majority_disagrees_with_full():
+    # The document is only a regression case if the sampled pages alone favour another offset
+    body = Counter(offset_of(page_num) for page_num in sample_page_order(PAGE_COUNT))
+    everything = Counter(offset_of(page_num) for page_num in range(PAGE_COUNT))
+    assert body.most_common(1)[0][0] != FULL_OFFSET
+    assert everything.most_common(1)[0][0] == FULL_OFFSET
+
+def test_sample_falls_back_to_full_scan(disputed_pdf):
+    full = estimate_offset(disputed_pdf, mode="full")
+    sampled = estimate_offset(disputed_pdf, mode="sample")
+    assert full.offset == FULL_OFFSET
+    assert sampled.offset == full.offset
+    assert sampled.confidence == full.confidence
+    assert sampled.pages_inspected == PAGE_COUNT
@@ -0,0 +1,20 @@
+"""apply_offset_map: the single pass gives the TOC of a bisect per bookmark."""
+import pytest
+from Fitz_TOC_Extractor_1 import OffsetSegment, apply_offset_map
+from benchmarks.bench_offset_map import generate_segments, generate_toc, legacy_apply_offset_map
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('segment_count', [1, 2, 5])
+@pytest.mark.parametrize('backwards', [0.0, 0.1, 0.5])
+@pytest.mark.parametrize('remove_negative_pages', [False, True])
+def test_matches_bisect(seed, segment_count, backwards, remove_negative_pages):
+    toc = generate_toc(300, seed, backwards)
+    segments = generate_segments(segment_count, max(page for _, _, page in toc), seed)
+    assert (apply_offset_map(toc, segments, remove_negative_pages)
+            == legacy_apply_offset_map(toc, segments, remove_negative_pages))
+
+def test_entry_going_back_to_front_matter():
+    segments = [OffsetSegment(1, 0, True), OffsetSegment(10, 9, False)]
+    toc = [(1, "Preface", 3), (1, "Chapter 1", 10), (1, "Chapter 2", 20), (2, "Foreword", 5), (1, "Chapter 3", 30)]
+    assert apply_offset_map(toc, segments) == [
+        (1, "Preface", "iii"), (1, "Chapter 1", 1), (1, "Chapter 2", 11), (2, "Foreword", "v"), (1, "Chapter 3", 21)]
@@ -0,0 +1,41 @@
+"""parse_toc_line (line classes + compiled patterns) against the original first-match-wins loop."""
+import re
+import pytest
+from Custom_TOC_Extractor_2 import TOC_LINE_PATTERNS, parse_toc_line
+from benchmarks.bench_parse_toc_line import call, generate_lines, legacy_parse_toc_line
+
+# Lines written for each pattern in turn (7 to 10 are shadowed by 4 and 6, which match them first)
+PATTERN_LINES = [
+    ' 12  Glossary ... 7',
+    'IV Methods of Analysis 42',
+    '3. Introduction ... 42  ',
+    'Lorem ipsum dolor ... 305',
+    '(a) Index . . . 305 Chapter 3',
+    '  Notes on 1984 .. 42 ',
+    '\xa03.Notes on 19847  ',
+    'Chapter 7 ..... 12',
+    'PART 2: Beginnings 17',
+    'PART 3 The Middle.....88',
+    'Appendix B ....12',
+]
+# Lines no pattern matches, alone or joined with the next line
+NEGATIVE_LINES = ['', '   ', 'Introduction', 'Getting Started', '.....', 'xii', 'Contents', 'Part One: Beginnings']
+NEXT_LINES = [None, '', 'Glossary 12', '   305', 'see also', '..... 7']
+
+LINES = PATTERN_LINES + NEGATIVE_LINES + generate_lines(300, seed=7)
+
+def first_pattern(line):
+    return next((index for index, pattern in enumerate(TOC_LINE_PATTERNS) if re.match(pattern, line)), None)
+
+def test_pattern_lines_cover_every_reachable_pattern():
+    assert {first_pattern(line) for line in PATTERN_LINES} == set(range(7))
+
+@pytest.mark.parametrize('line', LINES)
+@pytest.mark.parametrize('next_line', NEXT_LINES)
+def test_matches_legacy_loop(line, next_line):
+    assert call(parse_toc_line, line, next_line) == call(legacy_parse_toc_line, line, next_line)
+
+@pytest.mark.parametrize('line', NEGATIVE_LINES)
+def test_negative_lines(line):
+    assert parse_toc_line(line) is None
+    assert legacy_parse_toc_line(line) is None
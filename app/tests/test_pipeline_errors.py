@@ -0,0 +1,45 @@
+"""One PDF that fails does not stop the pipeline run: it is reported and the others go on."""
+import os
+from concurrent.futures import Future
+import pytest
+from benchmarks.synthetic_corpus import CorpusDocument, generate_corpus
+from pipeline import ERROR_STATUS, iter_tocs, process_document, run_pipeline, _result_of
+
+GOOD = CorpusDocument('bm_dots_footer_10', 10, True, 'dots', 'footer')
+
+@pytest.fixture
+def data_folder(tmp_path):
+    folder = tmp_path / 'data'
+    generate_corpus(str(folder), [GOOD])
+    (folder / 'broken.pdf').write_bytes(b'not a pdf at all')
+    return str(folder)
+
+def test_process_document_returns_failed_result(data_folder):
+    result = process_document(os.path.join(data_folder, 'broken.pdf'))
+    assert result.toc_status == ERROR_STATUS
+    assert result.source is None and result.final_text is None
+    assert result.error
+    assert 'total' in result.timings
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_goes_on_after_failed_pdf(data_folder, tmp_path, workers):
+    output_folder = str(tmp_path / f'output_{workers}')
+    filenames = ['broken.pdf', f"{GOOD.name}.pdf"]
+    results = run_pipeline(data_folder, output_folder, workers=workers, filenames=filenames, progress=None)
+    broken, good = results
+    assert broken.error is not None and broken.toc_status == ERROR_STATUS
+    assert good.error is None and good.final_text
+    assert os.path.exists(os.path.join(output_folder, 'Final_Output', f"{GOOD.name}.txt"))
+
+def test_ordered_stream_goes_on_after_failed_pdf(data_folder):
+    paths = [os.path.join(data_folder, name) for name in ('broken.pdf', f"{GOOD.name}.pdf")]
+    results = list(iter_tocs(paths, workers=2, ordered=True))
+    assert [result.path for result in results] == paths
+    assert results[0].error is not None and results[1].error is None
+
+def test_failed_worker_gives_failed_result():
+    future = Future()
+    future.set_exception(RuntimeError("worker died"))
+    result = _result_of(future, 'lost.pdf')
+    assert result.filename == 'lost.pdf'
+    assert result.error == "RuntimeError: worker died"
@@ -0,0 +1,49 @@
+"""Result cache hits in final_process_pdfs: stale final TOCs are removed, materialize is honoured."""
+import json
+import os
+import fitz  # PyMuPDF
+from benchmarks.synthetic_corpus import CorpusDocument, generate_corpus
+from main import final_process_pdfs
+from pipeline import PipelineConfig, cache_config
+from utils.final_manifest import MANIFEST_FILE, FinalManifest
+from utils.result_cache import ResultCache
+
+def test_cached_no_toc_removes_stale_final_file(tmp_path):
+    data_folder, output_folder, cache_folder = (str(tmp_path / name) for name in ('data', 'output', 'cache'))
+    os.makedirs(data_folder)
+    pdf_path = os.path.join(data_folder, 'book.pdf')
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "no table of contents here")
+    doc.save(pdf_path)
+    doc.close()
+
+    # The cache says the PDF has no TOC; Final_Output still holds the TOC of an earlier run
+    cache = ResultCache(cache_folder)
+    cache.store(cache.key_for(pdf_path, cache_config(PipelineConfig())))
+    cache.save()
+    final_file = os.path.join(output_folder, 'Final_Output', 'book.txt')
+    os.makedirs(os.path.dirname(final_file))
+    with open(final_file, 'w', encoding='utf-8') as f:
+        f.write("Chapter 1 ... 1\n")
+
+    final_process_pdfs(data_folder, output_folder, cache_folder=cache_folder, progress=None)
+
+    assert not os.path.exists(final_file)
+    with open(os.path.join(output_folder, MANIFEST_FILE), encoding='utf-8') as f:
+        assert 'book' not in json.load(f)['documents']
+
+def test_cache_hit_without_materialize_leaves_final_output_alone(tmp_path):
+    data_folder, cache_folder = str(tmp_path / 'data'), str(tmp_path / 'cache')
+    generate_corpus(data_folder, [CorpusDocument('bm_dots_footer_10', 10, True, 'dots', 'footer')])
+    first, second = (str(tmp_path / name) for name in ('first', 'second'))
+    final_process_pdfs(data_folder, first, cache_folder=cache_folder, progress=None)
+    final_process_pdfs(data_folder, second, cache_folder=cache_folder, progress=None, materialize=None)
+
+    assert not os.path.exists(os.path.join(second, 'Final_Output', 'bm_dots_footer_10.txt'))
+    manifest = FinalManifest(second)
+    assert manifest.documents['bm_dots_footer_10']['source'] == 'cache'
+    cached_file = manifest.path_of('bm_dots_footer_10')
+    assert os.path.samefile(os.path.dirname(cached_file), cache_folder)
+    with open(cached_file, encoding='utf-8') as cached, \
+            open(os.path.join(first, 'Final_Output', 'bm_dots_footer_10.txt'), encoding='utf-8') as final:
+        assert cached.read() == final.read()
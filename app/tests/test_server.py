@@ -0,0 +1,97 @@
+"""TOCServer: admission, slot release, binding and recovery from a crashed worker."""
+import http.client
+import json
+import os
+import signal
+import socket
+import threading
+import pytest
+import server as server_module
+from benchmarks.synthetic_corpus import CorpusDocument, generate_corpus
+from server import TOCServer
+
+@pytest.fixture
+def server():
+    server = TOCServer(('127.0.0.1', 0), workers=1, queue_size=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture(scope='module')
+def pdf_bytes(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('pdfs')
+    path, = generate_corpus(str(folder), [CorpusDocument('bm_dots_footer_10', 10, True, 'dots', 'footer')])
+    with open(path, 'rb') as f:
+        return f.read()
+
+def post_toc(server, body):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=60)
+    try:
+        connection.request('POST', '/toc?filename=book.pdf', body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+    finally:
+        connection.close()
+
+def assert_idle(server):
+    # Every slot is back: all of them can be taken without blocking
+    slots = server.workers
+    assert all(server.slots.acquire(blocking=False) for _ in range(slots))
+    for _ in range(slots):
+        server.slots.release()
+    assert server.stats.snapshot()['in_flight'] == 0
+
+def test_busy_server_rejects_without_reading_body(server):
+    # Hold the only slot, as a request being processed would
+    assert server.slots.acquire(blocking=False)
+    try:
+        connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+        # Announce a body but never send it: reading it first would block until the timeout
+        connection.putrequest('POST', '/toc?filename=book.pdf')
+        connection.putheader('Content-Length', '100000')
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 503
+        assert response.getheader('Connection') == 'close'
+        assert response.getheader('Retry-After') == '1'
+        assert 'busy' in json.loads(response.read())['error']
+        connection.close()
+    finally:
+        server.slots.release()
+    assert server.stats.snapshot()['rejected'] == 1
+
+def test_slot_released_after_success(server, pdf_bytes):
+    status, payload = post_toc(server, pdf_bytes)
+    assert status == 200
+    assert payload['filename'] == 'book.pdf' and payload['entries']
+    assert_idle(server)
+    assert server.stats.snapshot()['completed'] == 1
+
+def test_slot_released_after_error(server):
+    status, payload = post_toc(server, b'not a pdf')
+    assert status == 500
+    assert payload['error']
+    assert_idle(server)
+    assert server.stats.snapshot()['failed'] == 1
+
+def test_crashed_worker_pool_is_replaced(server, pdf_bytes):
+    broken_pool = server.pool
+    for pid in list(broken_pool.executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    status, _ = post_toc(server, pdf_bytes)
+    assert status == 200
+    assert server.pool is not broken_pool
+    assert server.stats.snapshot()['pool_restarts'] == 1
+    assert post_toc(server, pdf_bytes)[0] == 200
+
+def test_port_in_use_starts_no_workers(monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("worker pool started before the port was bound")
+    monkeypatch.setattr(server_module, 'WorkerPool', no_pool)
+    with socket.socket() as taken:
+        taken.bind(('127.0.0.1', 0))
+        taken.listen()
+        with pytest.raises(OSError):
+            TOCServer(taken.getsockname(), workers=1)
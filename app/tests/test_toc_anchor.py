@@ -0,0 +1,34 @@
+"""best_anchor: the TOC title wins over the TOC's own entry for itself, as before the scoring."""
+from utils.toc_anchor import best_anchor
+from Custom_TOC_Extractor_2 import extract_toc_entries
+
+# Layout of python_tutorial.pdf: the title, front matter entries numbered in Roman numerals,
+# then the TOC's entry for itself and the body entries
+TITLE_AND_SELF_ENTRY = '\n'.join([
+    "in this tutorial, please notify us at contact@example.com",
+    "iv",
+    "Python Tutorial",
+    "Table of Contents",
+    "About the Tutorial ........................................ i",
+    "Audience .................................................. i",
+    "Prerequisites ............................................. i",
+    "Copyright & Disclaimer .................................... i",
+    "Table of Contents ......................................... ii",
+    "PYTHON BASICS ............................................. 1",
+    *(f"{number}. Python - Topic {number} ........................ {number * 3}" for number in range(1, 30)),
+])
+
+def test_title_wins_over_self_entry():
+    anchor = best_anchor(TITLE_AND_SELF_ENTRY)
+    assert TITLE_AND_SELF_ENTRY[anchor.start:].startswith("Table of Contents\nAbout the Tutorial")
+
+def test_self_entry_is_kept():
+    # The Roman numbered entries do not parse, so the TOC's entry for itself comes first
+    headings = [entry['heading'] for entry in extract_toc_entries(TITLE_AND_SELF_ENTRY)]
+    assert headings[0].startswith("Table of Contents")
+    assert headings[1] == "PYTHON BASICS"
+
+def test_body_mention_still_loses():
+    text = "As the Contents show, this is prose.\nMore prose here.\n" + TITLE_AND_SELF_ENTRY
+    anchor = best_anchor(text)
+    assert text[anchor.start:].startswith("Table of Contents\nAbout the Tutorial")
@@ -0,0 +1,31 @@
+"""TOCScanner: the line count kept page by page is the one of splitting the joined pages."""
+import random
+import pytest
+from Custom_TOC_Extractor_2 import TOCScanner
+
+PIECES = ['lorem', 'ipsum dolor', '', ' ', '\n', '\r', '\r\n', '\n\n', '\x0c', ' ', '1.2 Title ...... 12']
+
+def random_pages(seed, count=40):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(PIECES) for _ in range(rng.randrange(0, 8))) for _ in range(count)]
+
+@pytest.mark.parametrize('seed', range(50))
+def test_line_count_matches_splitlines(seed):
+    scanner = TOCScanner(line_budget=10 ** 9)
+    pages = random_pages(seed)
+    for index, page in enumerate(pages, start=1):
+        scanner.feed(page)
+        assert scanner.line_count == len('\n'.join(pages[:index]).splitlines())
+
+@pytest.mark.parametrize('pages', [[''], ['', ''], ['a\r', 'b'], ['a\r', ''], ['a\n', ''], ['\n'], ['a', '\r\nb']])
+def test_line_count_edge_cases(pages):
+    scanner = TOCScanner(line_budget=10 ** 9)
+    for page in pages:
+        scanner.feed(page)
+    assert scanner.line_count == len('\n'.join(pages).splitlines())
+
+def test_budget_stops_extraction():
+    scanner = TOCScanner(line_budget=5)
+    assert not scanner.feed('one\ntwo')
+    assert not scanner.feed('three\nfour')
+    assert scanner.feed('five')
@@ -0,0 +1,41 @@
+"""Worker pools of final_process_pdfs: workers=1 starts none, recycle_after reaches every pool."""
+import pytest
+import utils.worker_pool as worker_pool
+from benchmarks.synthetic_corpus import CorpusDocument, generate_corpus
+from main import final_process_pdfs
+
+# Without bookmarks, so the text fallback stage runs too
+CORPUS = [
+    CorpusDocument('nobm_dots_footer_40', 40, False, 'dots', 'footer'),
+    CorpusDocument('nobm_numbered_header_20', 20, False, 'numbered', 'header'),
+]
+
+@pytest.fixture
+def data_folder(tmp_path):
+    folder = str(tmp_path / 'data')
+    generate_corpus(folder, CORPUS)
+    return folder
+
+@pytest.fixture
+def started_pools(monkeypatch):
+    """(workers, recycle_after) of every WorkerPool started."""
+    started = []
+
+    class RecordingPool(worker_pool.WorkerPool):
+        def __init__(self, workers=None, recycle_after=None, *args, **kwargs):
+            super().__init__(workers, recycle_after, *args, **kwargs)
+            started.append((self.workers, self.recycle_after))
+
+    monkeypatch.setattr(worker_pool, 'WorkerPool', RecordingPool)
+    return started
+
+@pytest.mark.parametrize('staged', [True, False])
+def test_single_worker_starts_no_pool(data_folder, tmp_path, started_pools, staged):
+    final_process_pdfs(data_folder, str(tmp_path / 'output'), workers=1, staged=staged, progress=None)
+    assert started_pools == []
+
+@pytest.mark.parametrize('staged', [True, False])
+def test_recycle_after_reaches_pool(data_folder, tmp_path, started_pools, staged):
+    final_process_pdfs(data_folder, str(tmp_path / 'output'), workers=2, staged=staged, progress=None,
+                       recycle_after=5)
+    assert started_pools and all(pool == (2, 5) for pool in started_pools)
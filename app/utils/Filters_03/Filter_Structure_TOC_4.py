@@ -1,5 +1,10 @@
 import os
 import re
+import sys
+if not __package__:
+    # Run as a standalone script: make the app folder importable
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.toc_anchor import best_anchor  # noqa: E402
 
 # Define paths
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -7,18 +12,12 @@ INPUT_FOLDER = os.path.join(ROOT_DIR, 'Output', 'Filters_03', '03')
 OUTPUT_FOLDER = os.path.join(ROOT_DIR, 'Output', 'Filters_03', '04')
 
 def extract_clean_toc(text):
-    toc_start_phrases = ["Table of Contents", "Contents", "CONTENTS", "Index"]
-    toc_start = None
-    for phrase in toc_start_phrases:
-        match = re.search(phrase, text)
-        if match:
-            toc_start = match.end()
-            break
-    
-    if toc_start is None:
+    toc_start_phrases = ("Table of Contents", "Contents", "CONTENTS", "Index")
+    anchor = best_anchor(text, toc_start_phrases)
+    if anchor is None:
         return "No TOC found."
     
-    toc_text = text[toc_start:]
+    toc_text = text[anchor.end:]
     
     chapter_pattern = re.compile(
         r'^(Chapter \d+|Lecture \d+|Module[-\d]+|PART \d+|[IVXLCDM]+\.|\d+:\s*.+|\d+(\.\d+)*(\.0)?)',
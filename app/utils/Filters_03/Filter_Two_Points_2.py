@@ -1,5 +1,11 @@
 import os
 import re
+import sys
+if not __package__:
+    # Run as a standalone script (Filtering_Structuring_3 subprocess mode): make the app folder importable
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.trace import NULL_TRACE, DecisionTrace  # noqa: E402
+from utils.metrics import MetricsRecorder  # noqa: E402
 
 # Define paths
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
@@ -67,10 +73,18 @@ def contains_reset_keyword(line):
     pattern = r'\b(' + '|'.join(reset_keywords) + r')\b'
     return bool(re.search(pattern, line, re.IGNORECASE))
 
-def process_file(file_path, log_file):
+def process_file(file_path, trace=NULL_TRACE, counters=None):
+    """Filter one TOC file; its line count is set on counters (utils.metrics.StageCounters) when given."""
     with open(file_path, 'r', encoding='utf-8') as f:
-        lines = f.readlines()[:1000]
+        lines = f.readlines()
+    if counters is not None:
+        counters.lines = len(lines)
 
+    return process_lines(lines, trace)
+
+def process_lines(lines, trace=NULL_TRACE):
+    """Filter the lines of a TOC file, recording every decision in trace (a utils.trace.DecisionTrace)."""
+    lines = lines[:1000]
     processed_lines = []
     i = 0
     consecutive_dotted_lines = 0
@@ -83,7 +97,7 @@ def process_file(file_path, log_file):
 
         # Check for TOC phrase
         if not toc_found and re.search(r'\b(Table of Contents|Contents)\b', line, re.IGNORECASE):
-            log_file.write(f"TOC phrase found at line {i+1}: {line}\n")
+            trace.log("TOC phrase found at line %d: %s", i+1, line)
             toc_found = True
             skip_lines_after_toc = 5
             processed_lines.append(line + '\n')  # Add TOC line to output
@@ -92,7 +106,7 @@ def process_file(file_path, log_file):
 
         # Skip lines after the TOC phrase
         if skip_lines_after_toc > 0:
-            log_file.write(f"Skipping line {i+1} after TOC (counter not applied): {line}\n")
+            trace.log("Skipping line %d after TOC (counter not applied): %s", i+1, line)
             processed_lines.append(line + '\n')  # Add skipped lines to output
             skip_lines_after_toc -= 1
             i += 1
@@ -100,11 +114,11 @@ def process_file(file_path, log_file):
 
         # Skip lines that are only symbols or only decimal numbers
         if is_only_symbols(line):
-            log_file.write(f"Skipped line (only symbols): {line}\n")
+            trace.log("Skipped line (only symbols): %s", line)
             i += 1
             continue
         if is_only_decimal_numbers(line):
-            log_file.write(f"Skipped line (only decimal numbers): {line}\n")
+            trace.log("Skipped line (only decimal numbers): %s", line)
             i += 1
             continue
 
@@ -114,12 +128,12 @@ def process_file(file_path, log_file):
             consecutive_dotted_lines = 0
 
         if consecutive_dotted_lines >= 5:
-            log_file.write(f"Consecutive lines with dots detected starting from line {i - 4}.\n")
+            trace.log("Consecutive lines with dots detected starting from line %d.", i - 4)
 
             while i < len(lines):
                 dotted_line = re.sub(r'[\u25CB\s]+', ' ', lines[i].strip())
                 if not contains_dots_sequence(dotted_line):
-                    log_file.write(f"Non-dotted line encountered below dotted lines: {dotted_line}\n")
+                    trace.log("Non-dotted line encountered below dotted lines: %s", dotted_line)
                 else:
                     processed_lines.append(dotted_line + '\n')
                 i += 1
@@ -128,7 +142,7 @@ def process_file(file_path, log_file):
 
         # **New condition: Check for reset keywords**
         if contains_reset_keyword(line):
-            log_file.write(f"Reset keyword found at line {i+1}: {line}\n")
+            trace.log("Reset keyword found at line %d: %s", i+1, line)
             processed_lines.append(line + '\n')
             i += 1
             continue
@@ -140,7 +154,7 @@ def process_file(file_path, log_file):
 
         non_numbering_counter = 0
         sequence_lines = []
-        log_file.write(f"Starting counter at line {i+1}: {line} -------> counter {non_numbering_counter}\n")
+        trace.log("Starting counter at line %d: %s -------> counter %d", i+1, line, non_numbering_counter)
 
         while i < len(lines):
             current_line_original = lines[i].strip()
@@ -148,7 +162,7 @@ def process_file(file_path, log_file):
 
             # **Check for reset keywords within sequence**
             if contains_reset_keyword(current_line):
-                log_file.write(f"Reset keyword found within sequence at line {i+1}: {current_line}\n")
+                trace.log("Reset keyword found within sequence at line %d: %s", i+1, current_line)
                 processed_lines.append(current_line + '\n')
                 i += 1
                 break
@@ -157,42 +171,47 @@ def process_file(file_path, log_file):
                 break
 
             if is_only_symbols(current_line):
-                log_file.write(f"Skipped line within sequence (only symbols): {current_line}\n")
+                trace.log("Skipped line within sequence (only symbols): %s", current_line)
                 i += 1
                 continue
             if is_only_decimal_numbers(current_line):
-                log_file.write(f"Skipped line within sequence (only decimal numbers): {current_line}\n")
+                trace.log("Skipped line within sequence (only decimal numbers): %s", current_line)
                 i += 1
                 continue
 
             sequence_lines.append(current_line + '\n')
             non_numbering_counter += 1
-            log_file.write(f"Continuing counter at line {i+1}: {current_line} -------> counter {non_numbering_counter}\n")
+            trace.log("Continuing counter at line %d: %s -------> counter %d", i+1, current_line, non_numbering_counter)
             i += 1
 
         if non_numbering_counter >= 5:
             total_words = sum(len(re.findall(r'\w+', l)) for l in sequence_lines)  # noqa: E741
             average_words = total_words / non_numbering_counter
-            log_file.write(f"Non-numbered block identified (Average words: {average_words}):\n{''.join(sequence_lines)}\n")
+            trace.log("Non-numbered block of %d lines identified (Average words: %s)", non_numbering_counter, average_words)
 
             if average_words < 6.8 and non_numbering_counter >= 50:
-                log_file.write("Block removed due to line count >= 50 with low average words.\n")
+                trace.log("Block removed due to line count >= 50 with low average words.")
                 continue
             elif average_words > 6.8:
-                log_file.write("Block removed due to high average words.\n")
+                trace.log("Block removed due to high average words.")
                 continue
             else:
-                log_file.write(f"Block kept:\n{''.join(sequence_lines)}\n")
+                trace.log("Block kept.")
                 processed_lines.extend(sequence_lines)
         else:
-            log_file.write(f"Block kept (less than 5 lines):\n{''.join(sequence_lines)}\n")
+            trace.log("Block of %d lines kept (less than 5 lines).", non_numbering_counter)
             processed_lines.extend(sequence_lines)
 
     return processed_lines
 
-def process_folder(input_folder, output_folder, log_folder):
+def process_folder(input_folder, output_folder, log_folder, trace=False, metrics=None):
+    """
+    Filter every TOC file; with trace=True each file's decisions are written to log_folder.
+    The StageMetrics of every file, named after its PDF, are appended to the metrics list when given.
+    """
     os.makedirs(output_folder, exist_ok=True)
-    os.makedirs(log_folder, exist_ok=True)
+    if trace:
+        os.makedirs(log_folder, exist_ok=True)
 
     processed_files = []
 
@@ -200,18 +219,25 @@ def process_folder(input_folder, output_folder, log_folder):
         if filename.endswith('.txt'):
             input_file_path = os.path.join(input_folder, filename)
             output_file_path = os.path.join(output_folder, filename)
-            log_file_path = os.path.join(log_folder, f"{os.path.splitext(filename)[0]}.log")
-
-            with open(log_file_path, 'w', encoding='utf-8') as log_file:
-                processed_lines = process_file(input_file_path, log_file)
+            file_trace = DecisionTrace(capacity=None) if trace else NULL_TRACE
+            with MetricsRecorder(f"{os.path.splitext(filename)[0]}.pdf", metrics).stage('Filter_Two_Points_2') as counters:
+                processed_lines = process_file(input_file_path, file_trace, counters)
+            if trace:
+                file_trace.dump(os.path.join(log_folder, f"{os.path.splitext(filename)[0]}.log"))
 
             with open(output_file_path, 'w', encoding='utf-8') as f:
                 f.writelines(processed_lines)
 
             processed_files.append(filename)
 
+    return processed_files
+
+def format_summary(processed_files):
     if processed_files:
-        print(f"{len(processed_files)} files have been processed: {', '.join(processed_files)}")
+        return f"{len(processed_files)} files have been processed: {', '.join(processed_files)}"
+    return ""
 
 if __name__ == "__main__":
-    process_folder(INPUT_FOLDER, OUTPUT_FOLDER, LOG_FOLDER)
+    processed_files = process_folder(INPUT_FOLDER, OUTPUT_FOLDER, LOG_FOLDER)
+    if processed_files:
+        print(format_summary(processed_files))
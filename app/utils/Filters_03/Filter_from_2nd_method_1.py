@@ -1,32 +1,45 @@
 import glob
 import os
 import re
-import logging
+import sys
+if not __package__:
+    # Run as a standalone script (Filtering_Structuring_3 subprocess mode): make the app folder importable
+    sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from utils.trace import NULL_TRACE, DecisionTrace  # noqa: E402
+from utils.extracted_text import head_lines  # noqa: E402
+from utils.toc_anchor import anchor_pattern, best_anchor  # noqa: E402
+from utils.metrics import MetricsRecorder  # noqa: E402
 # Define paths relative to the project root directory
 ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
 TXT_DIRECTORY = os.path.join(ROOT_DIR, 'Output', '02')
 EXTRACTED_DIRECTORY = os.path.join(ROOT_DIR, 'Output', 'extracted_content')
 OUTPUT_DIR = os.path.join(ROOT_DIR, 'Output', 'Filters_03', '01')
-# Set up logging configuration to write to both console and log file
-LOG_FILE = os.path.join(OUTPUT_DIR, "toc_extraction.log")
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler(LOG_FILE, mode='w', encoding='utf-8')  # Write logs to a file only
-    ]
-)
-# Function to extract TOC entries
-def extract_toc_entries_clean(text_content):
-    toc_phrases = ["Table of Contents", "Contents", "CONTENTS"]
+LOG_FILE_NAME = "toc_extraction.log"
+# Only the first MAX_TEXT_LINES lines of the extracted text are searched for the TOC
+MAX_TEXT_LINES = 700
+
+# The TOC ends where LONG_LINES_TO_STOP of the next LONG_LINE_WINDOW lines have more than LONG_LINE_WORDS words
+LONG_LINE_WINDOW = 5
+LONG_LINES_TO_STOP = 3
+LONG_LINE_WORDS = 10
+_NUMBER_TOKEN = re.compile(r'^\d+(\.\d+)*$')
+# TOC titles this filter starts at: a joined line starting with one of them, in any case
+TOC_TITLE_PHRASES = ("Table of Contents", "Contents", "CONTENTS")
+_TOC_TITLE_PATTERN = anchor_pattern(TOC_TITLE_PHRASES, line_start=True, ignore_case=True)
+
+def count_valid_words(line):
+    """Number of alphanumeric or dotted-number (e.g. 1.2.3) tokens in a line."""
+    return sum(1 for token in line.split() if token.isalnum() or _NUMBER_TOKEN.match(token))
+
+# Function to extract TOC entries; decisions go to trace (a utils.trace.DecisionTrace) when enabled
+def extract_toc_entries_clean(text_content, trace=NULL_TRACE):
     # Compile regex patterns for exact or start-of-line matching
-    toc_patterns = [re.compile(rf'^{re.escape(phrase)}\b', re.IGNORECASE) for phrase in toc_phrases]
+    toc_patterns = [re.compile(rf'^{re.escape(phrase)}\b', re.IGNORECASE) for phrase in TOC_TITLE_PHRASES]
     
-    toc_start_index = None
     lines = text_content.split('\n')
-    lines = lines[:700]  # Limit to first 700 lines for efficiency
+    lines = lines[:MAX_TEXT_LINES]  # Limit to first 700 lines for efficiency
     
-    logging.info("Processing the first 700 lines of the text content.")
+    trace.log("Processing the first 700 lines of the text content.")
 
     # Step 1: Detect split TOC title lines and combine them
     joined_lines = []
@@ -58,55 +71,63 @@ def extract_toc_entries_clean(text_content):
         # Normalize spaces in lines with symbols or redundant characters
         line = re.sub(r'[○\s]+', ' ', line)
         joined_lines.append(line)
-        logging.debug(f"Processed and combined line {i}: {line}")
         i += 1
 
-    logging.info("Finished joining split lines in the text content.")
+    trace.log("Finished joining split lines in the text content.")
 
-    # Step 2: Look for TOC start using enhanced matching
-    for i, line in enumerate(joined_lines):
-        line = line.strip()
-        logging.debug(f"Checking for TOC title at line {i}: {line}")
-        if any(pattern.match(line) for pattern in toc_patterns):
-            toc_start_index = i
-            logging.info(f"TOC start detected at line {i}: {line}")
-            break
-
-    if toc_start_index is None:
-        logging.warning("No TOC title found in the text.")
+    # Step 2: Look for the TOC start with the shared anchor locator (one pass, scored candidates)
+    joined_text = '\n'.join(joined_lines)
+    anchor = best_anchor(joined_text, TOC_TITLE_PHRASES, _TOC_TITLE_PATTERN)
+    if anchor is None:
+        trace.log("No TOC title found in the text.")
         return []
+    toc_start_index = joined_text.count('\n', 0, anchor.start)
+    trace.log("TOC start detected at line %d (score %.2f): %s", toc_start_index, anchor.score,
+              joined_lines[toc_start_index].strip())
 
     toc_lines = joined_lines[toc_start_index:]  # Start from the TOC title
-    toc_entries = []
+    toc_entries = take_toc_entries(toc_lines, trace)
 
-    def count_valid_words(line):
-        valid_words = [token for token in line.split() if token.isalnum() or re.match(r'^\d+(\.\d+)*$', token)]
-        logging.debug(f"Counted {len(valid_words)} valid words in line: {line}")
-        return len(valid_words)
+    trace.log("TOC extraction completed. %d entries found.", len(toc_entries))
+    return toc_entries
 
+def take_toc_entries(toc_lines, trace=NULL_TRACE):
+    """
+    TOC entries for toc_lines (starting at the TOC title), up to the first line where 3 of
+    the 5 lines from there on are long; those 5 lines are included.
+    """
+    toc_entries = []
+    # Rolling count of the long lines in toc_lines[i:i + LONG_LINE_WINDOW]; each line is counted once
+    is_long = []
+    long_lines_count = 0
     for i in range(len(toc_lines)):
         line = toc_lines[i].strip()
-        logging.debug(f"Processing line {i}: '{line}'")
-
-        next_five_lines = toc_lines[i:i + 5]
-        long_lines_count = sum(1 for l in next_five_lines if count_valid_words(l) > 10)
-        logging.debug(f"Next 5 lines from line {i}: {[l.strip() for l in next_five_lines]}")
-        logging.debug(f"Number of 'long' lines in the next 5: {long_lines_count}")
-
-        if long_lines_count >= 3:
-            logging.info(f"Condition met at line {i}: 3 out of 5 lines have more than 10 words.")
-            logging.info("Including the 5 lines that triggered the condition in the output.")
-            toc_entries.extend({'heading': l, 'page_number': None} for l in next_five_lines if l.strip())
-            logging.info("Stopping further processing.")
+
+        while len(is_long) < min(i + LONG_LINE_WINDOW, len(toc_lines)):
+            is_long.append(count_valid_words(toc_lines[len(is_long)]) > LONG_LINE_WORDS)
+            long_lines_count += is_long[-1]
+
+        if long_lines_count >= LONG_LINES_TO_STOP:
+            trace.log("Condition met at line %d: 3 out of 5 lines have more than 10 words; stopping.", i)
+            toc_entries.extend({'heading': l, 'page_number': None} for l in toc_lines[i:i + LONG_LINE_WINDOW] if l.strip())
             break
 
         if line:
             toc_entries.append({'heading': line, 'page_number': None})
-            logging.info(f"Added TOC entry: {line}")
+            trace.log("Added TOC entry: %s", line)
+        long_lines_count -= is_long[i]
 
-    logging.info(f"TOC extraction completed. {len(toc_entries)} entries found.")
     return toc_entries
 
+def filter_document(text_content, trace=NULL_TRACE):
+    """Return the cleaned TOC of a document's extracted text, one heading per line."""
+    return filter_lines(text_content.splitlines()[:MAX_TEXT_LINES], trace)
+
+def filter_lines(lines, trace=NULL_TRACE):
+    """filter_document for the first MAX_TEXT_LINES lines of the extracted text."""
+    toc_entries = extract_toc_entries_clean('\n'.join(lines), trace)
+    return ''.join(f"{entry['heading']}\n" for entry in toc_entries)
+
 def filter_files_by_line_count(folder_path, max_lines=20):
     filtered_files = []
     txt_files = glob.glob(os.path.join(folder_path, '*.txt'))
@@ -120,30 +141,51 @@ def filter_files_by_line_count(folder_path, max_lines=20):
 
     return filtered_files
 
-if __name__ == "__main__":
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-    filtered_files = filter_files_by_line_count(TXT_DIRECTORY, max_lines=20)
+def process_folder(txt_directory, extracted_directory, output_dir, max_lines=20, trace=False, file_names=None, metrics=None):
+    """
+    Re-run the TOC extraction on the full extracted text of every document whose
+    second-method TOC has at most max_lines lines. Returns the processed file names.
+    Callers that already know those documents pass their file names, so the TOC files in
+    txt_directory are not read to count their lines.
+    With trace=True the decisions for every file are written to LOG_FILE_NAME in output_dir.
+    The StageMetrics of every file, named after its PDF, are appended to the metrics list when given.
+    """
+    os.makedirs(output_dir, exist_ok=True)
 
     processed_files = []  # List to store processed file names
+    log_file = open(os.path.join(output_dir, LOG_FILE_NAME), 'w', encoding='utf-8') if trace else None
+    try:
+        filtered_files = file_names if file_names is not None else filter_files_by_line_count(txt_directory, max_lines=max_lines)
+
+        for file_name in filtered_files:
+            extracted_file_path = os.path.join(extracted_directory, file_name)
+            name = os.path.splitext(file_name)[0]
+
+            file_trace = DecisionTrace(capacity=None) if trace else NULL_TRACE
+            with MetricsRecorder(f"{name}.pdf", metrics).stage('Filter_from_2nd_method_1') as counters:
+                lines = head_lines(extracted_file_path, MAX_TEXT_LINES)
+                counters.lines = len(lines)
+                output_file_path = os.path.join(output_dir, f"{name}.txt")
+                with open(output_file_path, 'w', encoding='utf-8') as toc_file:
+                    toc_file.write(filter_lines(lines, file_trace))
+
+            if log_file:
+                log_file.write(f"=== {file_name} ===\n{file_trace.text()}")
+            processed_files.append(file_name)  # Add the file name to the list
+    finally:
+        if log_file:
+            log_file.close()
+
+    return processed_files
+
+def format_summary(processed_files):
+    if processed_files:
+        return f"{len(processed_files)} files have been processed: {', '.join(processed_files)}"
+    return ""
 
-    for file_name in filtered_files:
-        extracted_file_path = os.path.join(EXTRACTED_DIRECTORY, file_name)
-
-        with open(extracted_file_path, 'r', encoding='utf-8') as f:
-            text_content = f.read()
-        
-        text_content = '\n'.join(text_content.splitlines()[:700])
-
-        toc_entries = extract_toc_entries_clean(text_content)
-
-        output_file_path = os.path.join(OUTPUT_DIR, f"{os.path.splitext(file_name)[0]}.txt")
-        with open(output_file_path, 'w', encoding='utf-8') as toc_file:
-            for entry in toc_entries:
-                toc_file.write(f"{entry['heading']}\n")
-
-        processed_files.append(file_name)  # Add the file name to the list
+if __name__ == "__main__":
+    processed_files = process_folder(TXT_DIRECTORY, EXTRACTED_DIRECTORY, OUTPUT_DIR)
 
     # Print summary after processing all files
     if processed_files:
-        print(f"{len(processed_files)} files have been processed: {', '.join(processed_files)}")
\ No newline at end of file
+        print(format_summary(processed_files))
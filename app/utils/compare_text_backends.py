@@ -0,0 +1,86 @@
+"""
+Compare the text extraction engines of the fallback stage on the same corpus.
+
+For every engine this measures plain extraction throughput over all PDFs and then runs
+the full pipeline into its own output folder, so the TOCs in 02 and Final_Output can be
+compared against the first engine. Run from the app folder:
+
+    python -m utils.compare_text_backends
+"""
+import os
+import glob
+import shutil
+import filecmp
+import tempfile
+import time
+from rich.console import Console
+from rich.table import Table
+from main import final_process_pdfs
+from Custom_TOC_Extractor_2 import extract_text_from_pdf
+from utils.text_backends import TEXT_BACKENDS
+
+console = Console()
+
+def measure_throughput(pdf_files, engine):
+    """Extract every page of every PDF with the engine; returns (pages, seconds)."""
+    pages = 0
+    with tempfile.TemporaryDirectory() as scratch_folder:
+        start = time.perf_counter()
+        for pdf_file in pdf_files:
+            result = extract_text_from_pdf(pdf_file, scratch_folder, engine=engine)
+            pages += result.pages_extracted
+        elapsed = time.perf_counter() - start
+    return pages, elapsed
+
+def compare_folders(reference_folder, candidate_folder):
+    """Return (identical, different, missing) file names of candidate_folder against reference_folder."""
+    reference_files = {os.path.basename(path) for path in glob.glob(os.path.join(reference_folder, '*.txt'))}
+    candidate_files = {os.path.basename(path) for path in glob.glob(os.path.join(candidate_folder, '*.txt'))}
+    common = sorted(reference_files & candidate_files)
+    match, mismatch, errors = filecmp.cmpfiles(reference_folder, candidate_folder, common, shallow=False)
+    missing = sorted(reference_files ^ candidate_files)
+    return match, mismatch + errors, missing
+
+def compare_backends(data_folder, output_root, engines=None, header_height=70, footer_height=50, remove_negative_pages=True):
+    engines = list(engines or TEXT_BACKENDS)
+    pdf_files = sorted(glob.glob(os.path.join(data_folder, '*.pdf')))
+
+    throughput = {}
+    output_folders = {}
+    for engine in engines:
+        console.print(f"\n[bold cyan]Measuring {engine} on {len(pdf_files)} PDFs...[/]")
+        throughput[engine] = measure_throughput(pdf_files, engine)
+
+        # Each engine gets a fresh output folder so stale files cannot hide differences
+        output_folders[engine] = os.path.join(output_root, engine)
+        shutil.rmtree(output_folders[engine], ignore_errors=True)
+        final_process_pdfs(data_folder, output_folders[engine], header_height, footer_height,
+                           remove_negative_pages, text_engine=engine)
+
+    reference = engines[0]
+    table = Table(title=f"Text backend comparison (reference: {reference})", show_header=True, header_style="bold magenta")
+    table.add_column("Engine", style="cyan")
+    table.add_column("Pages", justify="right")
+    table.add_column("Seconds", justify="right")
+    table.add_column("Pages/sec", justify="right")
+    table.add_column("02 differs", justify="right")
+    table.add_column("Final_Output differs", justify="right")
+
+    for engine in engines:
+        pages, elapsed = throughput[engine]
+        row = [engine, str(pages), f"{elapsed:.2f}", f"{pages / elapsed:.1f}" if elapsed else "-"]
+        for subfolder in ('02', 'Final_Output'):
+            _, different, missing = compare_folders(os.path.join(output_folders[reference], subfolder),
+                                                    os.path.join(output_folders[engine], subfolder))
+            row.append(f"{len(different)} (+{len(missing)} missing)" if missing else str(len(different)))
+            for file_name in different + missing:
+                console.print(f"[yellow]{engine}[/] {subfolder}/{file_name} differs from {reference}")
+        table.add_row(*row)
+
+    console.print("\n")
+    console.print(table)
+
+if __name__ == "__main__":
+    data_folder = "./data"  # Folder containing PDF files
+    output_root = "./output/backend_comparison"  # One output folder per engine is created here
+    compare_backends(data_folder, output_root)
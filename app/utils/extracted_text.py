@@ -0,0 +1,140 @@
+"""
+Page-aware storage and bounded reads of the extracted text files in extracted_content.
+
+A document's extracted text is kept as two files: <name>.txt, its pages joined by newlines
+exactly as before (the flat view every folder-based stage reads), and <name>.index.json with
+one record per page: the physical page index, the byte range of its text in the .txt file,
+its first line number there, and its header and footer lines. ExtractedText reads single
+pages or page ranges through those records without loading the rest of the document, and
+maps a line of the flat text back to the page it came from. head_lines() reads only the
+first lines of a file, which is all the TOC stages keep.
+"""
+import bisect
+import itertools
+import json
+import os
+from collections import namedtuple
+
+INDEX_SUFFIX = '.index.json'
+
+# page: 0-based physical page; start/end: byte range of the page text in the .txt file;
+# line: number of its first line there; header/footer: its first and last non-empty line
+# (where running headers, footers and printed page numbers end up), '' for a blank page
+PageRecord = namedtuple('PageRecord', ['page', 'start', 'end', 'line', 'header', 'footer'])
+
+def index_path_for(text_path):
+    return os.path.splitext(text_path)[0] + INDEX_SUFFIX
+
+def _edge_lines(page_text):
+    lines = [line.strip() for line in page_text.split('\n') if line.strip()]
+    return (lines[0], lines[-1]) if lines else ('', '')
+
+def write_extracted_text(text_path, page_texts, first_page=0):
+    """Write the pages (from 0-based page first_page on) joined by newlines to text_path, plus their page records."""
+    records, chunks = [], []
+    offset = line = 0
+    for page, page_text in enumerate(page_texts, start=first_page):
+        if chunks:  # the newline joining this page to the previous one
+            chunks.append(b'\n')
+            offset += 1
+            line += 1
+        encoded = page_text.encode('utf-8')
+        records.append(PageRecord(page, offset, offset + len(encoded), line, *_edge_lines(page_text)))
+        chunks.append(encoded)
+        offset += len(encoded)
+        line += encoded.count(b'\n')
+
+    with open(text_path, 'wb') as f:
+        f.writelines(chunks)
+    with open(index_path_for(text_path), 'w', encoding='utf-8') as f:
+        json.dump({'size': offset, 'fields': PageRecord._fields, 'pages': [list(record) for record in records]},
+                  f, ensure_ascii=False)
+
+def load_index(text_path):
+    """The PageRecords of an extracted text file, or None when they are missing or older than the file."""
+    try:
+        with open(index_path_for(text_path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get('size') != os.path.getsize(text_path) or index.get('fields') != list(PageRecord._fields):
+        return None
+    return [PageRecord(*record) for record in index['pages']]
+
+class ExtractedText:
+    """
+    An extracted text file read through its page records. Raises ValueError when the file
+    has no up-to-date records (e.g. it was written by an older version).
+    """
+
+    def __init__(self, text_path):
+        self.text_path = text_path
+        self.pages = load_index(text_path)
+        if self.pages is None:
+            raise ValueError(f"No up-to-date page index for '{text_path}'")
+        self._page_lines = [record.line for record in self.pages]
+
+    def __len__(self):
+        return len(self.pages)
+
+    def _read_span(self, start, end):
+        with open(self.text_path, 'rb') as f:
+            f.seek(start)
+            return f.read(end - start).decode('utf-8')
+
+    def page_text(self, index):
+        """Text of the index-th page record (the physical page is its .page), as extract_pages returned it."""
+        record = self.pages[index]
+        return self._read_span(record.start, record.end)
+
+    def read_pages(self, first, last=None):
+        """Text of pages first..last (inclusive; last defaults to first), joined by newlines as in the file."""
+        last = first if last is None else min(last, len(self.pages) - 1)
+        if first < 0 or first > last:
+            return ''
+        return self._read_span(self.pages[first].start, self.pages[last].end)
+
+    def iter_pages(self, first=0, last=None):
+        """(PageRecord, text) for pages first..last, read one page at a time."""
+        last = len(self.pages) - 1 if last is None else min(last, len(self.pages) - 1)
+        with open(self.text_path, 'rb') as f:
+            for record in self.pages[first:last + 1]:
+                f.seek(record.start)
+                yield record, f.read(record.end - record.start).decode('utf-8')
+
+    def page_of_line(self, line):
+        """The PageRecord of the page that line (0-based, in the flat text) comes from."""
+        return self.pages[max(bisect.bisect_right(self._page_lines, line) - 1, 0)]
+
+    def flat_text(self):
+        """The whole text as the flat .txt view holds it (today's extracted_content format)."""
+        with open(self.text_path, 'r', encoding='utf-8', newline='') as f:
+            return f.read()
+
+def head_lines(text_path, count):
+    """
+    The first `count` lines of a text file, split like str.splitlines() on its whole text:
+    only as much of the file is read as those lines need.
+    """
+    with open(text_path, 'r', encoding='utf-8') as f:
+        return list(itertools.islice(itertools.chain.from_iterable(line.splitlines() for line in f), count))
+
+def read_pages(text_path, first, last=None):
+    """ExtractedText(text_path).read_pages(first, last)."""
+    return ExtractedText(text_path).read_pages(first, last)
+
+def read_lines(text_path, start, stop):
+    """
+    Lines start..stop-1 of the file, split on newlines only (as iterating it in binary does).
+    With page records the read starts at the page holding line `start`, otherwise the file is
+    streamed from the beginning.
+    """
+    pages = load_index(text_path)
+    offset = first_line = 0
+    if pages:
+        record = pages[max(bisect.bisect_right([page.line for page in pages], start) - 1, 0)]
+        offset, first_line = record.start, record.line
+    with open(text_path, 'rb') as f:
+        f.seek(offset)
+        lines = itertools.islice(f, start - first_line, stop - first_line)
+        return [line.decode('utf-8').rstrip('\n') for line in lines]
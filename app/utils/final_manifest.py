@@ -0,0 +1,89 @@
+"""
+Manifest of the final TOCs: for every document, the stage its final TOC comes from and the
+file that holds it, relative to the output folder. It is kept across runs (documents of a
+run replace their previous entries) and lets callers find the final TOCs without copying
+them into Final_Output. materialize() puts a final TOC into Final_Output when wanted, as a
+hard link to the stage file where the file system allows it. Stage files a final TOC can
+come from are written through replacing(), so a later run gives them a new file instead of
+rewriting the one a Final_Output link still shares.
+"""
+import json
+import os
+import shutil
+from contextlib import contextmanager
+
+MANIFEST_FILE = 'final_manifest.json'
+# Stages a final TOC can come from, best first (as create_final_output picks them)
+FINAL_SOURCES = ('Filters_03/03', '02', '01')
+# How final TOCs are put into Final_Output: hard link (copy where linking fails), copy, or not at all
+MATERIALIZE_MODES = ("link", "copy", None)
+
+class FinalManifest:
+    """The manifest of an output folder, loaded from its MANIFEST_FILE when there is one."""
+
+    def __init__(self, output_folder):
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, MANIFEST_FILE)
+        self.documents = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.documents = json.load(f).get('documents', {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable manifest '{self.path}': {e}")
+
+    def record(self, name, source, path=None):
+        """Set the final TOC of a document (file name without extension); source None drops it."""
+        if source is None:
+            self.documents.pop(name, None)
+            return
+        relative_path = os.path.relpath(path, self.output_folder).replace(os.sep, '/')
+        self.documents[name] = {'source': source, 'path': relative_path}
+
+    def path_of(self, name):
+        """Path of a document's final TOC file, or None when it has none."""
+        entry = self.documents.get(name)
+        if entry is None:
+            return None
+        return os.path.join(self.output_folder, *entry['path'].split('/'))
+
+    def save(self):
+        """Write the manifest; it is replaced atomically so an interrupted run keeps the old one."""
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'documents': dict(sorted(self.documents.items()))}, f, indent=1)
+        os.replace(temp_path, self.path)
+
+@contextmanager
+def replacing(path):
+    """
+    Yield a temporary path to write the new content of path to; it then replaces path in one
+    step. Hard links to the old file (e.g. in Final_Output) keep the old content.
+    """
+    temp_path = path + '.tmp'
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def materialize(source_path, final_file, mode="link"):
+    """
+    Put the TOC at source_path into final_file with the given mode (see MATERIALIZE_MODES)
+    and return the path that now holds the final TOC.
+    A hard link shares the stage file; stage files are written through replacing(), so a
+    later run does not change it.
+    """
+    if mode is None:
+        return source_path
+    if os.path.lexists(final_file):
+        os.remove(final_file)
+    if mode == "link":
+        try:
+            os.link(source_path, final_file)
+            return final_file
+        except OSError:
+            pass  # e.g. another device or a file system without hard links
+    shutil.copy2(source_path, final_file)
+    return final_file
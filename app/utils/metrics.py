@@ -0,0 +1,111 @@
+"""
+Per-document, per-stage metrics of a pipeline run.
+
+Every stage of a document is measured with MetricsRecorder.stage(): wall time, CPU time of
+the process running it, pages read, lines processed and how much the resident memory (RSS)
+of that process changed over the stage. The RSS is sampled from /proc/self/statm when the
+stage starts and ends, so it belongs to the stage alone (a process-lifetime peak such as
+ru_maxrss would repeat the heaviest earlier stage in every later one); memory taken and
+given back within the stage does not show. Where /proc is not available it is None.
+write_metrics saves one JSON line per document per stage, and metrics_summary_table renders
+p50/p95/p99 per stage for the whole corpus.
+"""
+import json
+import os
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from rich.table import Table
+from rich import box
+
+StageMetrics = namedtuple('StageMetrics', ['document', 'stage', 'wall', 'cpu', 'pages', 'lines', 'rss_delta_mb'])
+
+def current_rss_mb():
+    """Resident set size of this process now, in MB (None where /proc/self/statm is unavailable)."""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+def line_count(text):
+    """Lines of a text as a stage reports them (a last line without a newline counts)."""
+    return text.count('\n') + (not text.endswith('\n')) if text else 0
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(fraction * len(sorted_values)), len(sorted_values) - 1)]
+
+class StageCounters:
+    """What a stage reports about its work while it runs."""
+
+    def __init__(self):
+        self.pages = 0
+        self.lines = 0
+
+class MetricsRecorder:
+    """Collects the StageMetrics of one document, into the given records list when there is one."""
+
+    def __init__(self, document, records=None):
+        self.document = document
+        self.records = [] if records is None else records
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the block as stage `name`; the block sets pages/lines on the yielded counters."""
+        counters = StageCounters()
+        rss = current_rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield counters
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            rss_delta = None if rss is None else current_rss_mb() - rss
+            self.records.append(StageMetrics(self.document, name, wall, cpu, counters.pages, counters.lines,
+                                             rss_delta))
+
+def write_metrics(path, records):
+    """Write StageMetrics as JSON lines."""
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record._asdict()) + '\n')
+
+def summarize_metrics(records):
+    """Per stage, in first-seen order: document count, totals and p50/p95/p99 of wall and CPU time."""
+    by_stage = {}
+    for record in records:
+        by_stage.setdefault(record.stage, []).append(record)
+    summary = {}
+    for stage, stage_records in by_stage.items():
+        walls = sorted(record.wall for record in stage_records)
+        cpus = sorted(record.cpu for record in stage_records)
+        summary[stage] = {
+            'documents': len(stage_records),
+            'pages': sum(record.pages for record in stage_records),
+            'lines': sum(record.lines for record in stage_records),
+            'wall_total': sum(walls),
+            'cpu_total': sum(cpus),
+            **{f"wall_p{int(fraction * 100)}": percentile(walls, fraction) for fraction in (0.5, 0.95, 0.99)},
+            'cpu_p50': percentile(cpus, 0.5),
+        }
+    return summary
+
+def metrics_summary_table(records, title="Stage Metrics"):
+    """A rich table of summarize_metrics, one row per stage."""
+    table = Table(
+        show_header=True,
+        header_style="bold cyan",
+        box=box.ROUNDED,
+        title=f"[bold yellow]{title}",
+        title_justify="center"
+    )
+    table.add_column("Stage", style="bold", no_wrap=True)
+    for column in ("Docs", "Pages", "Lines", "Total s", "p50 ms", "p95 ms", "p99 ms", "CPU p50"):
+        table.add_column(column, justify="right")
+    for stage, stats in summarize_metrics(records).items():
+        table.add_row(stage, str(stats['documents']), str(stats['pages']), str(stats['lines']),
+                      f"{stats['wall_total']:.2f}",
+                      *(f"{stats[key] * 1000:.1f}" for key in ('wall_p50', 'wall_p95', 'wall_p99', 'cpu_p50')))
+    return table
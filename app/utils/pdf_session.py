@@ -0,0 +1,61 @@
+import os
+from contextlib import contextmanager
+import fitz  # PyMuPDF
+import pdfplumber
+
+class PDFSession:
+    """
+    One open PDF shared by every stage of the pipeline.
+    The fitz document and the pdfplumber document are each opened at most once,
+    the first time a stage asks for them, so pdfplumber is only paid for when the
+    fallback actually runs.
+    """
+
+    def __init__(self, pdf_path):
+        self.pdf_path = pdf_path
+        self.filename = os.path.basename(pdf_path)
+        self.name = os.path.splitext(self.filename)[0]
+        self._doc = None
+        self._plumber = None
+
+    @property
+    def doc(self):
+        if self._doc is None:
+            self._doc = fitz.open(self.pdf_path)
+        return self._doc
+
+    @property
+    def plumber(self):
+        if self._plumber is None:
+            self._plumber = pdfplumber.open(self.pdf_path)
+        return self._plumber
+
+    @property
+    def page_count(self):
+        return len(self.doc)
+
+    def close(self):
+        if self._plumber is not None:
+            self._plumber.close()
+            self._plumber = None
+        if self._doc is not None:
+            self._doc.close()
+            self._doc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+@contextmanager
+def session_for(pdf):
+    """
+    Yield a PDFSession for a path or an existing session.
+    Sessions created here are closed on exit, sessions passed in are left open for the caller.
+    """
+    if isinstance(pdf, PDFSession):
+        yield pdf
+    else:
+        with PDFSession(pdf) as session:
+            yield session
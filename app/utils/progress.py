@@ -0,0 +1,197 @@
+"""
+Progress reporting for batches of PDFs without a Manager queue.
+
+Every document gets a fixed-size slot in a small memory-mapped file. Workers write their
+page counts straight into their slot (a struct write, no IPC), and a monitor thread in the
+parent reads the whole table a few times per second. It shows one aggregate bar plus the
+slowest documents still in flight, or, in headless mode, writes a JSON status line every
+few seconds for log collectors. Slots are addressed by file path, so they work with any
+WorkerPool, including one started long before the batch.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from rich.console import Console, Group
+from rich.live import Live
+from rich.progress import Progress, TextColumn, BarColumn, TaskProgressColumn, TimeRemainingColumn
+from rich.table import Table
+from rich import box
+
+# started (epoch seconds), pages done, total pages, state
+_SLOT = struct.Struct('<dIIi')
+PENDING, RUNNING, DONE, FAILED = 0, 1, 2, 3
+
+class ProgressSlot:
+    """The progress of one document, written from whichever process works on it."""
+
+    def __init__(self, path, index):
+        self.path = path
+        self.index = index
+        self._map = None
+        self._started = 0.0
+        self._total_pages = 0
+
+    def __getstate__(self):
+        return {'path': self.path, 'index': self.index}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'], state['index'])
+
+    def _write(self, pages_done, state):
+        if self._map is None:
+            with open(self.path, 'r+b') as f:
+                self._map = mmap.mmap(f.fileno(), 0)
+        _SLOT.pack_into(self._map, self.index * _SLOT.size, self._started, pages_done, self._total_pages, state)
+
+    def start(self, total_pages=0):
+        self._started = time.time()
+        self._total_pages = total_pages
+        self._write(0, RUNNING)
+
+    def update(self, pages_done, total_pages=None):
+        if total_pages is not None:
+            self._total_pages = total_pages
+        self._write(pages_done, RUNNING)
+
+    def finish(self, ok=True, pages_done=None):
+        self._write(self._total_pages if pages_done is None else pages_done, DONE if ok else FAILED)
+        # Release the mapping so the board file can be removed (Windows) and workers hold nothing
+        self._map.close()
+        self._map = None
+
+class ProgressBoard:
+    """
+    Slot table for `names` plus its monitor. mode is "rich" for a live aggregate bar with the
+    top_n slowest documents in flight, or "json" for a status line every `interval` seconds
+    on `stream` (default stdout). Use as a context manager around the batch; slots[i] goes
+    to the worker processing names[i].
+    """
+
+    def __init__(self, names, mode="rich", interval=None, top_n=5, stream=None, title="Extracting text"):
+        if mode not in ("rich", "json"):
+            raise ValueError(f"Unknown progress mode {mode!r}, expected 'rich' or 'json'")
+        self.names = list(names)
+        self.mode = mode
+        self.interval = interval or (0.25 if mode == "rich" else 10.0)
+        self.top_n = top_n
+        self.stream = stream or sys.stdout
+        self.title = title
+        fd, self.path = tempfile.mkstemp(prefix='toc_progress_', suffix='.bin')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(bytes(_SLOT.size * max(len(self.names), 1)))
+        with open(self.path, 'r+b') as f:
+            self._map = mmap.mmap(f.fileno(), 0)
+        self.slots = [ProgressSlot(self.path, index) for index in range(len(self.names))]
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = time.time()
+
+    def snapshot(self):
+        """Aggregate counts and the top_n slowest running documents, as a JSON-ready dict."""
+        now = time.time()
+        counts = [0, 0, 0, 0]
+        pages_done = 0
+        running = []
+        for index, name in enumerate(self.names):
+            started, done, total, state = _SLOT.unpack_from(self._map, index * _SLOT.size)
+            counts[state] += 1
+            pages_done += done
+            if state == RUNNING:
+                running.append((now - started, name, done, total))
+        running.sort(reverse=True)
+        return {
+            'time': round(now, 3),
+            'elapsed': round(now - self._started, 3),
+            'total': len(self.names),
+            'pending': counts[PENDING],
+            'running': counts[RUNNING],
+            'done': counts[DONE],
+            'failed': counts[FAILED],
+            'pages_done': pages_done,
+            'slowest': [{'name': name, 'elapsed': round(elapsed, 1), 'pages_done': done, 'total_pages': total}
+                        for elapsed, name, done, total in running[:self.top_n]],
+        }
+
+    def _slowest_table(self, snapshot):
+        table = Table(box=box.SIMPLE, show_header=True, header_style="bold cyan",
+                      title=f"Slowest in flight ({snapshot['running']} running)", title_justify="left")
+        table.add_column("Filename", style="cyan", overflow="ellipsis", no_wrap=True, ratio=1)
+        table.add_column("Pages", justify="right", width=13)
+        table.add_column("Time", justify="right", width=8)
+        for doc in snapshot['slowest']:
+            pages = f"{doc['pages_done']}/{doc['total_pages']}" if doc['total_pages'] else "-"
+            table.add_row(doc['name'], pages, f"{doc['elapsed']:.0f}s")
+        return table
+
+    def _run_rich(self):
+        progress = Progress(
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(),
+            TimeRemainingColumn(),
+            expand=True,
+        )
+        task = progress.add_task(f"[cyan]{self.title}", total=len(self.names))
+        with Live(console=Console(), refresh_per_second=4, transient=False) as live:
+            while True:
+                stopping = self._stop.wait(self.interval)
+                snapshot = self.snapshot()
+                finished = snapshot['done'] + snapshot['failed']
+                description = f"[cyan]{self.title}[/] {finished}/{snapshot['total']} PDFs, {snapshot['pages_done']} pages"
+                if snapshot['failed']:
+                    description += f", [red]{snapshot['failed']} failed[/]"
+                progress.update(task, completed=finished, description=description)
+                live.update(Group(progress, self._slowest_table(snapshot)) if snapshot['running'] else progress)
+                if stopping:
+                    return
+
+    def _run_json(self):
+        while True:
+            stopping = self._stop.wait(self.interval)
+            snapshot = self.snapshot()
+            snapshot['final'] = stopping
+            self.stream.write(json.dumps(snapshot) + '\n')
+            self.stream.flush()
+            if stopping:
+                return
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run_rich if self.mode == "rich" else self._run_json, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the monitor after a last update and remove the slot file."""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self._map.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+@contextmanager
+def board_for(names, progress="rich", title="Extracting text"):
+    """
+    Yield a running ProgressBoard for names in the given mode ("rich" or "json"), stopped on
+    exit, or None when progress is None/False.
+    """
+    if not progress:
+        yield None
+        return
+    with ProgressBoard(names, mode=progress, title=title) as board:
+        yield board
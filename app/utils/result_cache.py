@@ -0,0 +1,132 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from utils.final_manifest import materialize
+
+class ResultCache:
+    """
+    Persistent cache of final TOC files, keyed by the SHA-256 of the PDF bytes plus the
+    extractor configuration. Entries are evicted least-recently-used first once the cached
+    files exceed max_bytes. Documents that produced no TOC are cached too, as entries
+    without a file.
+
+    The index also remembers (size, mtime) per PDF path, so unchanged files are not
+    re-hashed on every run.
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, cache_folder, max_bytes=512 * 1024 * 1024):
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(cache_folder, exist_ok=True)
+
+        self.entries = {}
+        self.file_digests = {}
+        index_path = os.path.join(cache_folder, self.INDEX_FILE)
+        if os.path.exists(index_path):
+            try:
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                self.entries = index.get('entries', {})
+                self.file_digests = index.get('files', {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable cache index '{index_path}': {e}")
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_folder, f"{key}.txt")
+
+    def file_digest(self, pdf_path):
+        """SHA-256 of the file contents, reused while the file's size and mtime are unchanged."""
+        stat = os.stat(pdf_path)
+        memo_key = os.path.abspath(pdf_path)
+        memo = self.file_digests.get(memo_key)
+        if memo and memo[0] == stat.st_size and memo[1] == stat.st_mtime_ns:
+            return memo[2]
+
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        self.file_digests[memo_key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def key_for(self, pdf_path, config):
+        """Cache key for a PDF under a configuration (a dict of everything that affects the output)."""
+        config_json = json.dumps(config, sort_keys=True)
+        return hashlib.sha256(f"{self.file_digest(pdf_path)}:{config_json}".encode('utf-8')).hexdigest()
+
+    def fetch(self, key, final_file, mode="copy"):
+        """
+        Serve a cached result: copy the cached TOC to final_file, or for documents without
+        a TOC remove a final_file left by an earlier run. Returns True on a hit.
+        With mode None (see final_manifest.MATERIALIZE_MODES) final_file is not written;
+        toc_path() gives the cached TOC instead.
+        """
+        entry = self.entries.get(key)
+        if entry is None or (entry['size'] is not None and not os.path.exists(self._entry_path(key))):
+            self.misses += 1
+            return False
+
+        if entry['size'] is not None:
+            # Copied for "link" too: cache entries are rewritten and evicted by later runs
+            if mode is not None:
+                materialize(self._entry_path(key), final_file, "copy")
+        elif os.path.lexists(final_file):
+            os.remove(final_file)
+        entry['last_used'] = time.time()
+        self.hits += 1
+        return True
+
+    def toc_path(self, key):
+        """The cached TOC file of a key, None when the document has no TOC (or is not cached)."""
+        entry = self.entries.get(key)
+        if entry is None or entry['size'] is None:
+            return None
+        return self._entry_path(key)
+
+    def store(self, key, final_file=None):
+        """Cache the final TOC file of a document, or the fact that it has none."""
+        size = None
+        if final_file is not None and os.path.exists(final_file):
+            shutil.copyfile(final_file, self._entry_path(key))
+            size = os.path.getsize(final_file)
+        self.entries[key] = {'size': size, 'last_used': time.time()}
+        self._evict()
+
+    @property
+    def total_bytes(self):
+        return sum(entry['size'] or 0 for entry in self.entries.values())
+
+    def _evict(self):
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        for key in sorted(self.entries, key=lambda key: self.entries[key]['last_used']):
+            if total <= self.max_bytes:
+                break
+            total -= self.entries[key]['size'] or 0
+            del self.entries[key]
+            if os.path.exists(self._entry_path(key)):
+                os.remove(self._entry_path(key))
+            self.evictions += 1
+
+    def save(self):
+        """Write the index; it is replaced atomically so an interrupted run keeps the old one."""
+        index_path = os.path.join(self.cache_folder, self.INDEX_FILE)
+        temp_path = index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self.entries, 'files': self.file_digests}, f)
+        os.replace(temp_path, index_path)
+
+    def summary(self):
+        total = self.hits + self.misses
+        hit_rate = f"{self.hits / total:.1%}" if total else "-"
+        return (f"Cache: {self.hits} hits, {self.misses} misses (hit rate {hit_rate}), "
+                f"{self.evictions} evicted, {len(self.entries)} entries, "
+                f"{self.total_bytes / 1024:.1f} KiB of {self.max_bytes / 1024:.0f} KiB")
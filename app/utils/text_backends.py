@@ -0,0 +1,48 @@
+class TextBackend:
+    """
+    Plain-text extraction engine used by the fallback stage.
+    Backends read from a PDFSession so the underlying document is only opened once.
+    """
+    name = None
+
+    def page_count(self, session):
+        raise NotImplementedError
+
+    def page_texts(self, session, pages=None):
+        """Yield the text of each page in order (only of the given 0-based page numbers when set)."""
+        raise NotImplementedError
+
+class PdfplumberBackend(TextBackend):
+    name = "pdfplumber"
+
+    def page_count(self, session):
+        return len(session.plumber.pages)
+
+    def page_texts(self, session, pages=None):
+        plumber_pages = session.plumber.pages
+        for page in plumber_pages if pages is None else (plumber_pages[page_number] for page_number in pages):
+            # Optimize text extraction settings
+            yield page.extract_text(x_tolerance=3, y_tolerance=3)
+
+class FitzBackend(TextBackend):
+    name = "fitz"
+
+    def page_count(self, session):
+        return len(session.doc)
+
+    def page_texts(self, session, pages=None):
+        for page in session.doc if pages is None else (session.doc[page_number] for page_number in pages):
+            # Reading order, without the trailing newline fitz adds after the last line
+            text = page.get_text("text", sort=True)
+            yield text[:-1] if text.endswith('\n') else text
+
+TEXT_BACKENDS = {backend.name: backend for backend in (PdfplumberBackend(), FitzBackend())}
+
+def get_backend(engine):
+    """Return the backend registered under the given engine name (or the backend itself)."""
+    if isinstance(engine, TextBackend):
+        return engine
+    try:
+        return TEXT_BACKENDS[engine]
+    except KeyError:
+        raise ValueError(f"Unknown text extraction engine '{engine}'. Available: {', '.join(TEXT_BACKENDS)}") from None
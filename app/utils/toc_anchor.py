@@ -0,0 +1,93 @@
+"""
+Shared locator of the TOC start ("anchor") in a document's text.
+
+All occurrences of the TOC title phrases are found in one regex pass (one alternation of
+the phrases, instead of one scan of the whole text per phrase). Each candidate is scored by
+the share of the ANCHOR_WINDOW lines after its line that end in a page number (Arabic, or a
+Roman front matter number after a dot leader), so a running header or a "Contents" mention in
+the body text loses to the real TOC title.
+
+best_anchor picks the first candidate, in text order, that scores at least MIN_ANCHOR_SCORE
+over a full window starting with a page-numbered line. Taking the first such candidate,
+rather than the highest score, keeps the TOC ahead of a back-of-book Index (whose lines end
+in page numbers too), and means the choice is final once that window has been read, which
+TOCScanner relies on to stop extraction early.
+Without such a candidate the highest score wins, ties going to the earlier phrase of the list
+and then to the earlier occurrence (with no page-numbered lines anywhere, that is the phrase
+the stages used to pick by trying them in order).
+"""
+import re
+from collections import namedtuple
+
+# Phrases that mark the start of a TOC, in order of preference
+TOC_PHRASES = ("Table of Contents", "Contents", "Index", "CONTENTS")
+# Lines after the anchor's line that are scored, and the share of them that must end in a page number
+ANCHOR_WINDOW = 20
+MIN_ANCHOR_SCORE = 0.5
+# One of the first ANCHOR_LEAD_LINES non-empty lines of the window must end in a page number too,
+# so a running header or a mention a few lines above the TOC does not take its window
+ANCHOR_LEAD_LINES = 3
+# A front matter page number in Roman numerals after a dot leader ("Preface ....... iv")
+_ROMAN_PAGE_NUMBER = re.compile(r'\.\s*[ivxlcdm]+$')
+
+# start/end: offsets of the phrase in the text; rank: index of the phrase in the phrase list;
+# score: share of the window ending in a page number; leads: whether the window starts with such a line;
+# complete: whether the full window was available
+TOCAnchor = namedtuple('TOCAnchor', ['start', 'end', 'phrase', 'rank', 'score', 'leads', 'complete'])
+
+def anchor_pattern(phrases=TOC_PHRASES, line_start=False, ignore_case=False):
+    """
+    One regex for all phrases; with line_start only phrases that begin a line (after an
+    optional space) followed by a word boundary count, as in Filter_from_2nd_method_1.
+    Longer phrases are tried first so "Table of Contents" is not reported as "Contents".
+    """
+    alternation = '|'.join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+    if line_start:
+        return re.compile(rf'^ ?(?P<phrase>{alternation})\b', re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    return re.compile(rf'(?P<phrase>{alternation})', re.IGNORECASE if ignore_case else 0)
+
+_DEFAULT_PATTERN = anchor_pattern()
+
+def _window_score(text, end):
+    """(score, leads, complete) for the ANCHOR_WINDOW lines after the line holding offset end."""
+    position = text.find('\n', end)
+    page_numbered = lines = non_empty = 0
+    leads = False
+    while position != -1 and lines < ANCHOR_WINDOW:
+        next_position = text.find('\n', position + 1)
+        line = text[position + 1:next_position] if next_position != -1 else text[position + 1:]
+        line = line.rstrip()
+        if line:
+            is_page_numbered = line[-1:].isdecimal() or _ROMAN_PAGE_NUMBER.search(line) is not None
+            page_numbered += is_page_numbered
+            non_empty += 1
+            if non_empty <= ANCHOR_LEAD_LINES and is_page_numbered:
+                leads = True
+        lines += 1
+        position = next_position
+    return page_numbered / ANCHOR_WINDOW, leads, lines == ANCHOR_WINDOW
+
+def find_anchors(text, phrases=TOC_PHRASES, pattern=None):
+    """Every TOC phrase occurrence in text, in text order, as scored TOCAnchors."""
+    pattern = pattern or (_DEFAULT_PATTERN if phrases == TOC_PHRASES else anchor_pattern(phrases))
+    folded = None if not pattern.flags & re.IGNORECASE else [phrase.casefold() for phrase in phrases]
+    anchors = []
+    for match in pattern.finditer(text):
+        phrase = match.group('phrase')
+        rank = folded.index(phrase.casefold()) if folded else phrases.index(phrase)
+        anchors.append(TOCAnchor(match.start('phrase'), match.end('phrase'), phrase, rank,
+                                 *_window_score(text, match.end())))
+    return anchors
+
+def qualifies(anchor):
+    return anchor.complete and anchor.leads and anchor.score >= MIN_ANCHOR_SCORE
+
+def best_anchor(text, phrases=TOC_PHRASES, pattern=None):
+    """The TOCAnchor all stages start the TOC at (see the module docstring), or None."""
+    anchors = find_anchors(text, phrases, pattern)
+    if not anchors:
+        return None
+    qualified = next((anchor for anchor in anchors if qualifies(anchor)), None)
+    if qualified is not None:
+        return qualified
+    return min(anchors, key=lambda anchor: (-anchor.score, anchor.rank, anchor.start))
@@ -0,0 +1,121 @@
+"""
+Layout-based locator of the TOC pages of a PDF, from the fitz words of its front pages.
+
+The text fallback only needs the pages of the TOC, and those almost always sit within the
+first TOC_SEARCH_PAGES pages. locate_toc_pages scores those pages with page.get_text("words")
+on the fitz document the session already has open, which is far cheaper than a full
+pdfplumber extraction, and returns the page range the fallback should extract (or None, in
+which case it extracts the document as before).
+
+Per page, over its visual rows (words grouped by baseline, as fitz may split a TOC entry
+into several lines when the page number is set apart):
+- entries: share of rows ending in a page number (Arabic or Roman), or starting with a
+  numbering ("1", "2.3", "IV.", "Chapter 4", "Part II"); TOCs without page numbers still
+  number their entries;
+- leaders: share of rows with a dot-leader run;
+- aligned: share of the page-numbered rows whose number ends in the page's right-hand column;
+- indented: share of rows starting at one of the page's three most used indentations;
+- heading: whether a row is a TOC title (utils.toc_anchor phrases).
+"""
+import re
+from collections import Counter, namedtuple
+from utils.toc_anchor import TOC_PHRASES
+
+# Front pages searched for the TOC title page; the TOC may run on past them
+TOC_SEARCH_PAGES = 30
+# Minimum score of a TOC page, and rows it needs to be scored at all
+MIN_TOC_PAGE_SCORE = 0.5
+MIN_TOC_PAGE_ROWS = 3
+# Share of entry rows at which the entries feature is full (TOC titles, parts and wrapped
+# headings take rows without a page number)
+FULL_ENTRY_SHARE = 0.3
+# Words whose baselines are this close (in points) are on the same row
+ROW_TOLERANCE = 3
+# Page numbers this close (in points) to the rightmost one form the right-hand column
+ALIGN_TOLERANCE = 12
+# Pages extracted after the TOC, so the TOC parsers still see where it ends
+TRAILING_PAGES = 1
+
+PageLayout = namedtuple('PageLayout', ['page', 'rows', 'entries', 'leaders', 'aligned', 'indented', 'heading'])
+
+_PAGE_NUMBER = re.compile(r'\d+|(?=[ivxlcdm])m{0,3}(cm|cd|d?c{0,3})(xc|xl|l?x{0,3})(ix|iv|v?i{0,3})', re.IGNORECASE)
+_NUMBERING = re.compile(r'(\d+(\.\d+)*|[IVXLC]+)[.:]?|chapter|part|section', re.IGNORECASE)
+_LEADER = re.compile(r'(\.\s?){3,}|[·•_]{3,}')
+_HEADING = re.compile('|'.join(re.escape(phrase) for phrase in TOC_PHRASES), re.IGNORECASE)
+
+def page_rows(page):
+    """The words of a fitz page from one get_text("words") call, as rows of (x0, x1, word), top to bottom."""
+    rows = []
+    for x0, _, x1, y1, word, *_ in sorted(page.get_text("words"), key=lambda word: word[3]):
+        if rows and y1 - rows[-1][0] <= ROW_TOLERANCE:
+            rows[-1][1].append((x0, x1, word))
+        else:
+            rows.append((y1, [(x0, x1, word)]))
+    return [sorted(words) for _, words in rows]
+
+def page_layout(page):
+    """PageLayout of a fitz page."""
+    rows = page_rows(page)
+    heading = any(_HEADING.search(' '.join(word for _, _, word in words)) for words in rows)
+    if len(rows) < MIN_TOC_PAGE_ROWS:
+        return PageLayout(page.number, len(rows), 0.0, 0.0, 0.0, 0.0, heading)
+
+    page_numbered = [words for words in rows if _PAGE_NUMBER.fullmatch(words[-1][2])]
+    entries = sum(1 for words in rows
+                  if len(words) > 1 and (_PAGE_NUMBER.fullmatch(words[-1][2]) or _NUMBERING.fullmatch(words[0][2])))
+    leaders = sum(1 for words in rows if any(_LEADER.search(word) for _, _, word in words))
+    right_edge = max((words[-1][1] for words in page_numbered), default=0)
+    aligned = sum(1 for words in page_numbered if right_edge - words[-1][1] <= ALIGN_TOLERANCE)
+    indents = Counter(round(words[0][0]) for words in rows)
+    indented = sum(count for _, count in indents.most_common(3))
+
+    count = len(rows)
+    # A single-number row is usually the printed page number, but several of them are the
+    # page numbers of a centred TOC, which sets them on rows of their own
+    single_numbers = sum(1 for words in page_numbered if len(words) == 1)
+    if single_numbers > 2:
+        entries += single_numbers
+    return PageLayout(page.number, count, entries / count, leaders / count,
+                      aligned / len(page_numbered) if page_numbered else 0.0, indented / count, heading)
+
+def layout_score(layout):
+    """0..1 score of a page as a TOC page."""
+    if layout.rows < MIN_TOC_PAGE_ROWS:
+        return 0.0
+    return (0.5 * min(layout.entries / FULL_ENTRY_SHARE, 1.0) + 0.2 * layout.leaders
+            + 0.15 * layout.aligned + 0.15 * layout.indented)
+
+def is_toc_page(layout):
+    return layout_score(layout) >= MIN_TOC_PAGE_SCORE
+
+def locate_toc_pages(doc, search_pages=TOC_SEARCH_PAGES):
+    """
+    (first, last) 0-based page range of the fitz document to extract for its TOC, or None
+    when no front page looks like a TOC title page. The range starts at the first page with
+    a TOC title that is a TOC page itself or followed by one, runs over the following TOC
+    pages, and includes TRAILING_PAGES more.
+    """
+    page_count = len(doc)
+    layouts = {}
+
+    def layout_of(page_number):
+        if page_number not in layouts:
+            layouts[page_number] = page_layout(doc[page_number])
+        return layouts[page_number]
+
+    first = None
+    for page_number in range(min(search_pages, page_count)):
+        if not layout_of(page_number).heading:
+            continue
+        if is_toc_page(layout_of(page_number)):
+            first = last = page_number
+        elif page_number + 1 < page_count and is_toc_page(layout_of(page_number + 1)):
+            first, last = page_number, page_number + 1
+        if first is not None:
+            break
+    if first is None:
+        return None
+
+    while last + 1 < page_count and is_toc_page(layout_of(last + 1)):
+        last += 1
+    return first, min(last + TRAILING_PAGES, page_count - 1)
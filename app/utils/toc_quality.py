@@ -0,0 +1,54 @@
+"""
+Quality signals of a TOC, computed in one pass over its text when a stage produces it.
+
+The routing between stages (text fallback for weak bookmark TOCs, Filters_03 for short
+fallback TOCs) is decided from these signals, so no stage output file is read back for it.
+Lines are counted the way readlines() counts them in the saved file.
+"""
+import io
+import re
+from collections import namedtuple
+
+# line_count: lines of the saved TOC; longest_numeric_run: most consecutive lines with digits
+# and no letters; numeric_lines: such lines in total; page_numbered_lines: lines ending in a digit
+TOCQuality = namedtuple('TOCQuality', ['line_count', 'longest_numeric_run', 'numeric_lines', 'page_numbered_lines'])
+
+# Bookmark TOCs with at most this many lines, or with a run of this many number-only lines, use the text fallback
+MIN_BOOKMARK_TOC_LINES = 25
+MAX_NUMERIC_RUN = 50
+# Fallback TOCs with at most this many lines are re-read by Filter_from_2nd_method_1
+FILTER_MAX_TOC_LINES = 20
+
+# At least one digit and no ASCII letter, like has_numbered_lines' two searches
+_NUMBER_ONLY_LINE = re.compile(r'[^a-zA-Z]*\d[^a-zA-Z]*')
+
+def read_lines(text):
+    """The lines readlines() returns for a file written with `text`."""
+    return io.StringIO(text, newline=None).readlines()
+
+def toc_quality(lines):
+    """TOCQuality of a TOC given as lines (e.g. from read_lines)."""
+    run = longest_run = numeric_lines = page_numbered_lines = 0
+    for line in lines:
+        if _NUMBER_ONLY_LINE.fullmatch(line):
+            run += 1
+            numeric_lines += 1
+            if run > longest_run:
+                longest_run = run
+        else:
+            run = 0
+        if line.rstrip()[-1:].isdecimal():
+            page_numbered_lines += 1
+    return TOCQuality(len(lines), longest_run, numeric_lines, page_numbered_lines)
+
+def text_quality(text):
+    """TOCQuality of a TOC as the text saved for it."""
+    return toc_quality(read_lines(text))
+
+def needs_text_fallback(quality):
+    """Whether a bookmark TOC is too weak to keep: too short, or a long run of bare numbers."""
+    return quality.line_count <= MIN_BOOKMARK_TOC_LINES or quality.longest_numeric_run >= MAX_NUMERIC_RUN
+
+def needs_filters(quality):
+    """Whether a fallback TOC is short enough to go through Filters_03."""
+    return quality.line_count <= FILTER_MAX_TOC_LINES
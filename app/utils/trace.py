@@ -0,0 +1,59 @@
+"""
+Opt-in decision traces for the filters.
+
+Filters report their per-line decisions with trace.log(message, *args), using %-style
+arguments like logging. NULL_TRACE, the default, ignores them without formatting anything.
+A DecisionTrace keeps the raw (message, args) records in a bounded ring buffer and only
+formats them when the trace is written, which the pipeline does only for the documents it
+flags as suspicious (or for every document with trace="all").
+"""
+from collections import deque
+
+# Records kept per document; older decisions are dropped first
+TRACE_CAPACITY = 2000
+# trace options of PipelineConfig / final_process_pdfs
+TRACE_MODES = (None, "suspicious", "all")
+
+class DecisionTrace:
+    """Ring buffer of one document's decisions; capacity=None keeps every record."""
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.records = deque(maxlen=capacity)
+        self.total = 0
+
+    def __bool__(self):
+        return True
+
+    def log(self, message, *args):
+        self.total += 1
+        self.records.append((message, args))
+
+    def lines(self):
+        """The formatted records, preceded by a note when older ones were dropped."""
+        dropped = self.total - len(self.records)
+        if dropped:
+            yield f"... {dropped} earlier records dropped ..."
+        for message, args in self.records:
+            yield message % args if args else message
+
+    def text(self):
+        return ''.join(f"{line}\n" for line in self.lines())
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.text())
+
+class _NullTrace:
+    """Disabled trace: log() does nothing and the trace is falsy, so callers can skip work with `if trace:`."""
+
+    def __bool__(self):
+        return False
+
+    def log(self, message, *args):
+        pass
+
+NULL_TRACE = _NullTrace()
+
+def trace_for(enabled, capacity=TRACE_CAPACITY):
+    """A new DecisionTrace when enabled, otherwise NULL_TRACE."""
+    return DecisionTrace(capacity) if enabled else NULL_TRACE
@@ -0,0 +1,85 @@
+import importlib
+import multiprocessing as mp
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+# Imported by every worker when it starts, so no task pays for them
+PRELOAD_MODULES = ('fitz', 'pdfplumber')
+
+def _preload(module_names):
+    for module_name in module_names:
+        importlib.import_module(module_name)
+
+def _ping(_):
+    return None
+
+class WorkerPool:
+    """
+    Long-lived pool of worker processes shared by every stage of the pipeline, so repeated
+    calls on small batches do not pay for starting processes and importing fitz/pdfplumber.
+
+    The processes are started on first use (or by warm()). With recycle_after set, every
+    worker is replaced after that many tasks, which bounds memory held by long-running workers.
+    """
+
+    def __init__(self, workers=None, recycle_after=None, preload=PRELOAD_MODULES):
+        self.workers = workers or mp.cpu_count()
+        self.recycle_after = recycle_after
+        self.preload = tuple(preload)
+        self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            options = {}
+            if self.recycle_after:
+                # Python 3.11+ only, so older interpreters still get a pool when recycling is off
+                options['max_tasks_per_child'] = self.recycle_after
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_preload,
+                initargs=(self.preload,),
+                **options,
+            )
+        return self._executor
+
+    def warm(self):
+        """Start every worker now instead of on the first tasks."""
+        list(self.executor.map(_ping, range(self.workers)))
+        return self
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    def map(self, fn, *iterables, chunksize=1):
+        return self.executor.map(fn, *iterables, chunksize=chunksize)
+
+    def shutdown(self, cancel_futures=False):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=cancel_futures)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown(cancel_futures=exc_type is not None)
+
+@contextmanager
+def pool_for(pool=None, workers=None, jobs=None, recycle_after=None):
+    """
+    Yield the given pool, or a new WorkerPool of `workers` processes (default: one per CPU,
+    at most one per job, each replaced after recycle_after tasks when set) that is shut down
+    on exit. Yields None when that is a single process, so the caller runs the jobs itself.
+    """
+    if pool is not None:
+        yield pool
+        return
+    workers = workers or mp.cpu_count()
+    if jobs is not None:
+        workers = min(workers, max(jobs, 1))
+    if workers <= 1:
+        yield None
+        return
+    with WorkerPool(workers, recycle_after) as new_pool:
+        yield new_pool